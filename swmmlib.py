@@ -3,3476 +3,5501 @@ import sys
 import os
 import copy
 import hashlib
+import json
+import functools
 import inspect
 import linecache
 import datetime
 import itertools
 import traceback, code
-import StringIO
-from operator import itemgetter
+import cPickle
+import gc
+import mmap
+import shutil
+import tempfile
+import heapq
+import marshal
+import array
+import atexit
+import contextlib
+try:
+    import numpy
+except ImportError:
+    numpy = None
+from operator import itemgetter, attrgetter
+from multiprocessing.pool import ThreadPool, ApplyResult
+from xml.etree import cElementTree
 from collections import OrderedDict
 
-# TODO : serialize supporting files in temp directory to prevent large files crowding memory
-
-def get_element_classes(inp_path=None, long_line_comment=False, require_support_files=False):
-
-    class ElementClass(object):
-        def __init__(self):
-            self.elements = []
-            self.name_field = 'Name'
-            self.desc_field = 'Description'
-            self.ordinal_field = None
-            self.md5_field = None
-            self.subclasses = {}
-            self.composite_class = None
-            self.composite_name = []
-            self.defaults = {}
-            self.inp_grouping = None
-            self.sort_by = [self.name_field]
-
-        def as_xml(self):
-            elements = self.get_elements()
-            if len(elements) > 0:
-                xml_str = '\t<' + self.section + '>\n'
-                for element in elements:
-                    xml_str += '\t\t<Element>\n'
-                    for parameter, value in element.items():
-                        if value is None:
-                            value = 'NULL'
-                        elif isinstance(value, str): 
-                            if re.search('Description', parameter):
-                                pass
-                                #value = value.encode('string-escape')
-                            else:
-                                value = value.replace("\n", "\\n")
-                            value = value.replace('&', '&amp;')
-                            value = value.replace('"', '&quot;')
-                            value = value.replace('<', '&lt;')
-                            value = value.replace('>', '&gt;')
-                            value = value.replace("'", '&apos;')
-                            value = value.replace("\x92", "'") # replace foot mark with apostrophe
-                            non_ascii = [ch for ch in value if ord(ch) >= 128]
-                            if len(non_ascii) != 0:
-                                exc = 'Non-ascii values ' + str(non_ascii) + ' in ' + section + \
-                                    ' for parameter ' + parameter + '.'
-                                raise Exception(exc)
-                        xml_str += '\t\t\t<' + parameter + '>' + str(value) + '</' + parameter + '>\n'
-                    xml_str += '\t\t</Element>\n'
-                xml_str += '\t</' + self.section + '>\n'
-                return xml_str
+def read_inp_sections(inp_path):
+    # walks the file once, yielding (label, start_lineno, lines) per section. line numbers count from 1
+    # and lines[0] is the label line itself. lines are read with universal newlines and the last line
+    # is newline-terminated, as linecache.getline would return them.
+    label = None
+    start_lineno = None
+    lines = []
+    with open(inp_path, 'rU') as f:
+        for lineno, line in enumerate(f, 1):
+            if line.lstrip()[:1] == '[':
+                if label is not None:
+                    yield label, start_lineno, lines
+                label = line
+                start_lineno = lineno
+                lines = []
+
+            if label is not None:
+                if '\xa0' in line:
+                    line = line.replace('\xa0', ' ')
+                lines.append(line)
+
+    if label is not None:
+        if not lines[-1].endswith('\n'):
+            lines[-1] += '\n'
+        yield label, start_lineno, lines
+
+def scan_inp_sections(inp_path, chunk_size=1 << 22, hasher=None):
+    # finds section labels without splitting the file into lines. returns a list of
+    # (label, start_lineno, end_lineno, start_offset, end_offset) with the same line numbering as
+    # read_inp_sections and byte offsets suitable for read_inp_section. if a hasher is supplied, it
+    # is updated with the file's contents along the way
+    label_pattern = re.compile('\n([ \t\f\v]*\[[^\r\n]*)')
+    # lone carriage returns also end a line under universal newlines
+    cr_label_pattern = re.compile('[\r\n]([ \t\f\v]*\[[^\r\n]*)')
+    labels = []
+    lineno = 1
+    block_offset = 0
+    last_char = ''
+    buf = ''
+    with open(inp_path, 'rb') as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if hasher is not None:
+                hasher.update(chunk)
+            buf += chunk
+            if chunk:
+                # only scan complete lines, the remainder is carried over to the next chunk
+                cut = buf.rfind('\n') + 1
+                if not cut:
+                    continue
             else:
-                return ''
-
-        def assign(self, subclass):
-            if self.elements:
-                if subclass.section not in self.subclasses.keys():
-                    raise Exception(subclass.section + " is not a valid subclass of " + self.section)
-                if subclass.desc_field == self.desc_field:
-                    sub_desc_field = subclass.section + 'Description'
-                else:
-                    sub_desc_field = subclass.desc_field
-
-                self.defaults = dict(self.defaults.items() + subclass.defaults.items())
-                subfields = subclass.fields.keys()
-                subfields.remove(subclass.name_field)
-
-                if not len(subclass.elements) and self.subclasses[subclass.section]:
-                    exc = "assign: There are no elements in " + subclass.inp_label + " to assign to " + self.inp_label
-                    raise Exception(exc)
-                else:
-                    for element in self.elements:
-                        name = element[self.name_field]
-                        subclass_has_element = False
-                        for subelement in subclass.elements:
-                            if subclass.section == 'Tags':
-                                tag_condition = subelement['TagType'] == self.tag_type
-                            else:
-                                tag_condition = True
-
-                            if name == subelement[subclass.name_field] and tag_condition:
-                                for field in subfields:
-                                    try:
-                                        element[field] = subelement[field]
-                                    except KeyError:
-                                        element[field] = subclass.defaults[field]
-
-                                if sub_desc_field:
-                                    element[sub_desc_field] = subelement[subclass.desc_field]
-                                subclass_has_element = True
-                                break
-
-                        if not subclass_has_element:
-                            if self.subclasses[subclass.section]:
-                                exc = "No entry in " + subclass.inp_label + " for " + name + " in " + self.inp_label
-                                raise Exception(exc)
-                            else:
-                                if not hasattr(subclass, 'defaults'):
-                                    exc = "There are no default elements for " + subclass.inp_label + \
-                                          " to assign to " + name + " in " + self.inp_label
-                                    raise Exception(exc)
-
-                                for field in subfields:
-                                    if field not in subclass.defaults.keys():
-                                        raise Exception(subclass.section + " is missing a default for the field " + field)
-                                    element[field] = subclass.defaults[field]
-
-                                if sub_desc_field:
-                                    element[sub_desc_field] = ''
-
-    class INPElementClass(ElementClass):
-        def __init__(self, start_lineno=None, end_lineno=None):
-            ElementClass.__init__(self)
-            self.inp_path = inp_path
-            self.pats = {'header'            : re.compile('^[\s]*\;\;'), 
-                         'blank_or_tag'      : re.compile('^([\s]*\[)|([\s]*$)'),
-                         'desc'              : re.compile('^[\s]*\;'),
-                         'adj_semicolons'    : re.compile('[ ;]*;'),
-                         'semicolon'         : re.compile(';'),
-                         'desc_whitespace'   : '; \t\n',
-                        }
-            if start_lineno is not None and end_lineno is not None:
-                self.long_line_comment = long_line_comment
-                self.require_support_files = require_support_files
-                self.start_lineno = start_lineno
-                self.end_lineno = end_lineno
-
-        def get_elements(self):
-            return self.elements
-
-        def add_elements(self, elements, ignore_fields=[]):
-            ignore_fields = ignore_fields + [self.desc_field, self.ordinal_field, self.name_field]
-            for element in elements:
-                e = dict((field, element[field]) for field in self.fields.keys())
-                
-                if all([e[name] is None for name in self.fields.keys() if name not in ignore_fields]):
+                cut = len(buf)
+
+            block = buf[:cut]
+            buf = buf[cut:]
+            lone_crs = block.count('\r') - block.count('\r\n')
+            if lone_crs:
+                pattern = cr_label_pattern
+                count_newlines = lambda text: text.count('\n') + text.count('\r') - text.count('\r\n')
+            else:
+                pattern = label_pattern
+                count_newlines = lambda text: text.count('\n')
+
+            pos = 0
+            for match in pattern.finditer('\n' + block):
+                line_start = match.start()
+                lineno += count_newlines(block[pos:line_start])
+                pos = line_start
+                labels.append((match.group(1), lineno, block_offset + line_start))
+
+            lineno += count_newlines(block[pos:])
+            block_offset += len(block)
+            if block:
+                last_char = block[-1]
+            if not chunk:
+                break
+
+    total_lines = lineno - 1 if last_char in ('\n', '\r', '') else lineno
+    sections = []
+    for i, (label, start_lineno, start_offset) in enumerate(labels):
+        if i + 1 < len(labels):
+            end_lineno, end_offset = labels[i + 1][1:]
+        else:
+            end_lineno, end_offset = total_lines + 1, block_offset
+        sections.append((label, start_lineno, end_lineno, start_offset, end_offset))
+
+    return sections
+
+def read_inp_section(inp_path, start_offset, end_offset):
+    # returns the lines between two offsets found by scan_inp_sections, normalized the same
+    # way as read_inp_sections
+    with open(inp_path, 'rb') as f:
+        f.seek(start_offset)
+        text = f.read(end_offset - start_offset)
+
+    if '\r' in text:
+        text = text.replace('\r\n', '\n').replace('\r', '\n')
+    if '\xa0' in text:
+        text = text.replace('\xa0', ' ')
+
+    lines = text.splitlines(True)
+    if lines and not lines[-1].endswith('\n'):
+        lines[-1] += '\n'
+    return lines
+
+def get_file_md5(path, chunk_size=1 << 22):
+    md5 = hashlib.md5()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), ''):
+            md5.update(chunk)
+    return md5.hexdigest()
+
+MD5_THREADS = 4
+md5_pool = None
+# the process the md5 pool was made in, a forked child doesn't have the pool's threads
+md5_pool_pid = None
+# md5 results of support files by absolute path, with the size and modification time they were hashed at
+file_md5s = {}
+
+def get_md5_pool():
+    global md5_pool, md5_pool_pid
+    if md5_pool_pid != os.getpid():
+        if md5_pool is not None:
+            # made in the parent, results that weren't ready when the process was forked never will be
+            for path, entry in file_md5s.items():
+                if not entry[2].ready():
+                    del file_md5s[path]
+        md5_pool = ThreadPool(MD5_THREADS)
+        md5_pool_pid = os.getpid()
+    return md5_pool
+
+def close_md5_pool():
+    global md5_pool, md5_pool_pid
+    if md5_pool is not None and md5_pool_pid == os.getpid():
+        md5_pool.close()
+        md5_pool.join()
+    md5_pool = md5_pool_pid = None
+
+atexit.register(close_md5_pool)
+
+def request_file_md5(path):
+    # starts hashing the file on the md5 pool and returns the result, see get_md5. the result is reused
+    # for as long as the file keeps its size and modification time, so unchanged files are hashed once.
+    # a file that failed to hash is hashed again
+    path = os.path.abspath(path)
+    stat = os.stat(path)
+    pool = get_md5_pool()
+    entry = file_md5s.get(path)
+    if entry is None or entry[:2] != (stat.st_size, stat.st_mtime) or (entry[2].ready() and not entry[2].successful()):
+        result = pool.apply_async(get_file_md5, (path, ))
+        result.path = path
+        entry = file_md5s[path] = (stat.st_size, stat.st_mtime, result)
+    return entry[2]
+
+def get_md5(md5):
+    # waits for an md5 requested with request_file_md5, other values are returned as they are
+    if isinstance(md5, ApplyResult):
+        if md5_pool_pid != os.getpid() and not md5.ready():
+            # requested before the process was forked
+            md5 = request_file_md5(md5.path)
+        try:
+            return md5.get()
+        except Exception:
+            entry = file_md5s.get(md5.path)
+            if entry is not None and entry[2] is md5:
+                del file_md5s[md5.path]
+            raise
+    return md5
+
+class SupportFileStore(object):
+    # support files kept in a directory by md5, hard-linked where possible and copied otherwise, so that
+    # models don't depend on where their files came from and only paths and digests are held in memory.
+    # without a store_dir the files go to a temp directory that is removed when the store is closed or
+    # collected. a hard-linked file still changes if the original is changed in place
+    def __init__(self, store_dir=None):
+        self.own_dir = store_dir is None
+        self.store_dir = tempfile.mkdtemp(prefix='swmmlib-') if store_dir is None else store_dir
+        if not os.path.isdir(self.store_dir):
+            os.makedirs(self.store_dir)
+        self.paths = {}
+
+    def add(self, path, md5):
+        # stores the file with the given md5 and returns the stored path
+        stored_path = os.path.join(self.store_dir, md5 + os.path.splitext(path)[1])
+        if not os.path.exists(stored_path):
+            tmp_path = stored_path + '.' + str(os.getpid()) + '.tmp'
+            try:
+                os.link(path, tmp_path)
+            except (AttributeError, OSError):
+                shutil.copyfile(path, tmp_path)
+            try:
+                os.rename(tmp_path, stored_path)
+            except OSError:
+                # stored by someone else sharing the directory in the meantime
+                os.remove(tmp_path)
+                if not os.path.exists(stored_path):
+                    raise
+        self.paths[md5] = stored_path
+        return stored_path
+
+    def get_path(self, md5):
+        return self.paths.get(md5)
+
+    def close(self):
+        if self.own_dir and self.store_dir is not None:
+            shutil.rmtree(self.store_dir, ignore_errors=True)
+            self.store_dir = None
+        self.paths = {}
+
+    def __del__(self):
+        try:
+            self.close()
+        except Exception:
+            pass
+
+def write_file_atomically(path, data, mode='wb', ignore_errors=True):
+    # writes data, a string or an iterable of strings written as they're generated, to a temp file next to
+    # path and renames it into place so that readers never see a partial file and a failure leaves the old
+    # one alone. returns False if the file couldn't be written, or raises the error without ignore_errors
+    tmp_path = path + '.' + str(os.getpid()) + '.tmp'
+    try:
+        with open(tmp_path, mode) as f:
+            if isinstance(data, str):
+                f.write(data)
+            else:
+                f.writelines(data)
+        if os.name == 'nt' and os.path.exists(path):
+            os.remove(path)
+        os.rename(tmp_path, path)
+    except:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        if ignore_errors and isinstance(sys.exc_info()[1], (IOError, OSError)):
+            return False
+        raise
+    return True
+
+@contextlib.contextmanager
+def gc_paused():
+    # keeps the collector from running while many containers are created, it would walk them all again and
+    # again without finding anything to free
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+INP_INDEX_VERSION = 1
+
+def get_index_path(inp_path):
+    return inp_path + '.idx'
+
+def build_inp_index(inp_path):
+    # scans the *.inp and saves its section offsets in a sidecar index. the index is still returned
+    # if the sidecar can't be written, e.g. when the *.inp is in a read-only directory
+    stat = os.stat(inp_path)
+    md5 = hashlib.md5()
+    sections = scan_inp_sections(inp_path, hasher=md5)
+    index = {'version'  : INP_INDEX_VERSION,
+             'size'     : stat.st_size,
+             'mtime'    : stat.st_mtime,
+             'md5'      : md5.hexdigest(),
+             'sections' : sections}
+
+    # labels are stored as latin-1 so that any bytes survive the round trip through json
+    json_sections = [[section[0].decode('latin-1')] + list(section[1:]) for section in sections]
+    write_file_atomically(get_index_path(inp_path), json.dumps(dict(index, sections=json_sections), separators=(',', ':')))
+
+    return index
+
+def load_inp_index(inp_path):
+    # returns the sidecar index of the *.inp, or None if there is none or it no longer matches the file
+    try:
+        with open(get_index_path(inp_path), 'rb') as f:
+            index = json.load(f)
+
+        stat = os.stat(inp_path)
+        if index['version'] != INP_INDEX_VERSION or index['size'] != stat.st_size or index['mtime'] != stat.st_mtime:
+            return None
+
+        index['md5'] = str(index['md5'])
+        index['sections'] = [tuple([section[0].encode('latin-1')] + section[1:]) for section in index['sections']]
+        with open(inp_path, 'rb') as f:
+            for label, start_lineno, end_lineno, start_offset, end_offset in index['sections']:
+                f.seek(start_offset)
+                if f.read(len(label)) != label:
+                    return None
+    except (IOError, OSError, ValueError, KeyError, TypeError, AttributeError):
+        return None
+
+    return index
+
+def get_inp_index(inp_path):
+    return load_inp_index(inp_path) or build_inp_index(inp_path)
+
+INP_CACHE_VERSION = 5
+
+def get_cache_key(inp_md5, inp_path, options):
+    return hashlib.md5(repr((INP_CACHE_VERSION, marshal.version, inp_md5, inp_path, options))).hexdigest()
+
+def get_cache_path(cache_dir, key):
+    return os.path.join(cache_dir, key + '.cache')
+
+def load_cache_entry(cache_dir, key):
+    # returns the cached entry, or None if there is none or a support file it was parsed with has changed
+    cache_path = get_cache_path(cache_dir, key)
+    try:
+        with open(cache_path, 'rb') as f:
+            data = f.read()
+        # loads is much faster than load on a file
+        entry = cPickle.loads(data)
+        current_md5s = [(request_file_md5(filepath), md5) for filepath, md5 in entry['files'].items()]
+        for current_md5, md5 in current_md5s:
+            if get_md5(current_md5) != md5:
+                return None
+    except Exception:
+        return None
+
+    try:
+        os.utime(cache_path, None) # mark as recently used
+    except OSError:
+        pass
+    return entry
+
+def pack_elements(elements, fields):
+    # the values of a section's elements as marshalled rows, see unpack_elements. the keys of the dicts are
+    # stored once for each order they're in, with the section's fields first as the parser adds them, so that
+    # dicts built by adding keys are rebuilt in the order they iterate in. one whose keys were deleted and
+    # added again may iterate in another order after it's rebuilt, it's equal all the same. records are stored
+    # by the keys of their class. None if an element is neither or a value can't be marshalled
+    fields = list(fields)
+    field_set = set(fields)
+    layouts = []
+    layout_numbers = {}
+    numbers = []
+    rows = []
+    extras = {}
+    for i, element in enumerate(elements):
+        if type(element) is dict:
+            keys = tuple(element)
+            number = layout_numbers.get(keys)
+            if number is None:
+                order = tuple([field for field in fields if field in element] + [key for key in keys if key not in field_set])
+                number = layout_numbers[keys] = len(layouts)
+                layouts.append((order, ))
+            rows.append(tuple(map(element.__getitem__, layouts[number][0])))
+        elif isinstance(element, Record):
+            cls = type(element)
+            number = layout_numbers.get(cls)
+            if number is None:
+                number = layout_numbers[cls] = len(layouts)
+                layouts.append((cls.record_keys, cls.composite_key, cls.composite_keys, cls.composite_position))
+            try:
+                rows.append(tuple(element._values()))
+            except AttributeError:
+                # some of the slots were deleted
+                return None
+            if element.extra is not None:
+                extras[i] = element.extra
+        else:
+            return None
+        numbers.append(number)
+    try:
+        return marshal.dumps((layouts, numbers if len(layouts) > 1 else None, rows, extras), 2)
+    except ValueError:
+        return None
+
+def unpack_elements(packed):
+    layouts, numbers, rows, extras = marshal.loads(packed)
+    if numbers is None:
+        if len(layouts[0]) == 1:
+            keys = layouts[0][0]
+            return [dict(itertools.izip(keys, row)) for row in rows]
+        numbers = itertools.repeat(0, len(rows))
+    record_classes = [get_record_class(*layout) if len(layout) > 1 else None for layout in layouts]
+    elements = [dict(itertools.izip(layouts[number][0], row)) if record_classes[number] is None else
+                record_classes[number](row) for number, row in itertools.izip(numbers, rows)]
+    for i, extra in extras.items():
+        elements[i].extra = extra
+    return elements
+
+def save_cache_entry(cache_dir, key, entry, cache_size):
+    try:
+        if not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir)
+    except OSError:
+        return
+    if write_file_atomically(get_cache_path(cache_dir, key), cPickle.dumps(entry, cPickle.HIGHEST_PROTOCOL)):
+        evict_cache_entries(cache_dir, cache_size)
+
+def evict_cache_entries(cache_dir, cache_size):
+    # removes the least recently used entries until the cache fits in cache_size bytes
+    entries = []
+    for filename in os.listdir(cache_dir):
+        if filename.endswith('.cache'):
+            cache_path = os.path.join(cache_dir, filename)
+            try:
+                stat = os.stat(cache_path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, cache_path))
+
+    total_size = sum(size for mtime, size, cache_path in entries)
+    for mtime, size, cache_path in sorted(entries):
+        if total_size <= cache_size:
+            break
+        try:
+            os.remove(cache_path)
+        except OSError:
+            pass
+        total_size -= size
+
+
+class RowDecoder(object):
+    # a section's schema compiled for converting split lines into elements. empty values are left as is.
+    # text values are interned, so that a name is one string however many sections refer to it and
+    # comparing names compares pointers. interned strings are freed once nothing refers to them
+    def __init__(self, fields, composite_name=None):
+        self.fieldnames = tuple(fields.keys())
+        self.converters = tuple(intern if converter is str else converter for converter in fields.values())
+        self.composite_name = tuple(composite_name or [])
+        if len(self.composite_name) > 1:
+            self.get_composite_values = itemgetter(*self.composite_name)
+        else:
+            self.get_composite_values = lambda params: tuple(params[name] for name in self.composite_name)
+
+    def convert(self, values):
+        return [converter(value) if value else value for converter, value in zip(self.converters, values)]
+
+    def decode(self, values):
+        return dict(zip(self.fieldnames, self.convert(values)))
+
+    def get_name(self, params):
+        return ':'.join(map(str, self.get_composite_values(params)))
+
+class Record(object):
+    # a compact element that behaves like the dict it stands in for. the keys a section's elements have in
+    # common are slots of a class generated for them, see get_record_class, other keys go to extra. a
+    # composite name isn't stored, it's joined from its parts when it's read until one of them changes. the
+    # keys are in the order the dict had, the composite name in its place among them. a section's records
+    # take about a third of the memory its dicts do, but they're slower to make and to read
+    __slots__ = ('extra', )
+    record_keys = ()
+    slot_names = {}
+    composite_key = None
+    composite_keys = ()
+    composite_position = None
+    __hash__ = None
+
+    def __getattr__(self, name):
+        # only reached for a deleted slot, so that reading the slots directly fails as a dict lookup would
+        if name in self.__slots__:
+            raise DeletedSlotError(self.record_keys[self.__slots__.index(name)])
+        raise AttributeError(name)
+
+    def __getitem__(self, key):
+        slot = self.slot_names.get(key)
+        if slot is not None:
+            try:
+                return getattr(self, slot)
+            except AttributeError:
+                raise KeyError(key)
+        if self.extra is not None and key in self.extra:
+            value = self.extra[key]
+            if value is deleted:
+                raise KeyError(key)
+            return value
+        if key == self.composite_key and key is not None:
+            return ':'.join([str(self[name]) for name in self.composite_keys])
+        raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        if key in self.composite_keys:
+            self.keep_composite_name()
+        slot = self.slot_names.get(key)
+        if slot is not None:
+            setattr(self, slot, value)
+        else:
+            if self.extra is None:
+                self.extra = {}
+            self.extra[key] = value
+
+    def __delitem__(self, key):
+        if key not in self:
+            raise KeyError(key)
+        if key in self.composite_keys:
+            self.keep_composite_name()
+        slot = self.slot_names.get(key)
+        if slot is not None:
+            delattr(self, slot)
+        elif key == self.composite_key:
+            # marked as deleted, there's nothing stored to remove
+            self[key] = deleted
+        else:
+            del self.extra[key]
+
+    def __contains__(self, key):
+        slot = self.slot_names.get(key)
+        if slot is not None:
+            return hasattr(self, slot)
+        if self.extra is not None and key in self.extra:
+            return self.extra[key] is not deleted
+        return key == self.composite_key and key is not None
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def keep_composite_name(self):
+        # stores the composite name as it is, as a dict would keep it when its parts change
+        if self.extra is None or self.composite_key not in self.extra:
+            self[self.composite_key] = self[self.composite_key]
+
+    def items(self):
+        try:
+            items = zip(self.record_keys, self._values())
+        except AttributeError:
+            # some of the slots were deleted
+            items = [(key, getattr(self, slot)) for key, slot in zip(self.record_keys, self.__slots__)
+                     if hasattr(self, slot)]
+        if not self.extra and self.composite_key is None:
+            return items
+        extra = self.extra.items() if self.extra else []
+        if self.composite_key is not None:
+            # joined or kept in extra
+            extra = [item for item in extra if item[0] != self.composite_key]
+            if self.composite_key in self:
+                items.insert(self.composite_position, (self.composite_key, self[self.composite_key]))
+        items.extend(item for item in extra if item[1] is not deleted)
+        return items
+
+    def keys(self):
+        return [key for key, value in self.items()]
+
+    def values(self):
+        return [value for key, value in self.items()]
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self.items())
+
+    def copy(self):
+        return to_record(self, self.composite_key, self.composite_keys)
+
+    def __eq__(self, other):
+        if isinstance(other, (dict, Record)):
+            return dict(self.items()) == dict(other.items())
+        return NotImplemented
+
+    def __ne__(self, other):
+        equal = self.__eq__(other)
+        return equal if equal is NotImplemented else not equal
+
+    def __repr__(self):
+        return repr(dict(self.items()))
+
+    def __reduce__(self):
+        # generated classes can't be pickled by name, records are rebuilt from their keys
+        try:
+            if self.extra and deleted in self.extra.values():
+                raise AttributeError
+            return make_record, (self.record_keys, self._values(), self.extra, self.composite_key, self.composite_keys,
+                                 self.composite_position)
+        except AttributeError:
+            return to_record, (dict(self.items()), )
+
+class DeletedSlotError(KeyError, AttributeError):
+    pass
+
+# marks a composite name deleted from a record
+deleted = object()
+
+record_classes = {}
+
+def get_record_class(keys, composite_key=None, composite_keys=(), composite_position=None):
+    # the record class with a slot for each of the keys, in their order, and the composite name at
+    # composite_position among them, last by default. its __init__ and _values are generated to move the
+    # values in and out of the slots in one statement
+    class_key = (tuple(keys), composite_key, tuple(composite_keys), composite_position)
+    cls = record_classes.get(class_key)
+    if cls is None:
+        keys = tuple(keys)
+        slots = tuple('_' + str(i) for i in range(len(keys)))
+        if composite_key is not None and composite_position is None:
+            composite_position = len(keys)
+        namespace = {'__slots__'          : slots,
+                     'record_keys'        : keys,
+                     'slot_names'         : dict(zip(keys, slots)),
+                     'composite_key'      : composite_key,
+                     'composite_keys'     : tuple(composite_keys),
+                     'composite_position' : composite_position}
+        source = 'def __init__(self, values, extra=None):\n'
+        if slots:
+            source += '    ' + ''.join('self.' + slot + ', ' for slot in slots) + '= values\n'
+        source += '    self.extra = extra\n'
+        source += 'def _values(self):\n'
+        source += '    return [' + ', '.join('self.' + slot for slot in slots) + ']\n'
+        exec source in namespace
+        cls = type('Record', (Record, ), namespace)
+        record_classes[class_key] = cls
+    return cls
+
+def make_record(keys, values, extra=None, composite_key=None, composite_keys=(), composite_position=None):
+    return get_record_class(keys, composite_key, composite_keys, composite_position)(values, extra)
+
+def to_record(element, composite_key=None, composite_keys=()):
+    # a record of a dict or a record. all keys become slots, except for composite_key if its value is
+    # joined from the values of composite_keys
+    if composite_key is not None:
+        try:
+            if element[composite_key] != ':'.join([str(element[name]) for name in composite_keys]):
+                composite_key = None
+        except KeyError:
+            composite_key = None
+    if composite_key is None and isinstance(element, dict):
+        return get_record_class(element.keys())(element.values())
+
+    items = element.items()
+    position = None
+    if composite_key is not None:
+        position = [key for key, value in items].index(composite_key)
+        del items[position]
+    return get_record_class([key for key, value in items], composite_key, composite_keys, position)([value for key, value in items])
+
+def get_field_values(elements, field):
+    # the values of a field of the elements, None for those without it. when the elements are records of one
+    # class with a slot for the field, the slot is read without a call to get for each
+    classes = set(map(type, elements))
+    if len(classes) == 1:
+        slot = getattr(classes.pop(), 'slot_names', {}).get(field)
+        if slot is not None:
+            try:
+                return map(attrgetter(slot), elements)
+            except AttributeError:
+                pass
+    return [element.get(field) for element in elements]
+
+def get_row_getter(names, elements=None):
+    # a function giving the values of names for an element as a tuple. records read them from their slots
+    # with one call where their class has a slot for each name, instead of a call to __getitem__ for each.
+    # when elements is a list of one class, the function for that class is returned without a lookup by class
+    names = tuple(names)
+    def get_class_getter(cls):
+        slot_names = getattr(cls, 'slot_names', {})
+        if not names:
+            return lambda element: ()
+        if all(name in slot_names for name in names):
+            getter = attrgetter(*[slot_names[name] for name in names])
+        else:
+            getter = itemgetter(*names)
+        if len(names) == 1:
+            return lambda element: (getter(element), )
+        return getter
+
+    if isinstance(elements, list):
+        classes = set(map(type, elements))
+        if len(classes) == 1:
+            return get_class_getter(classes.pop())
+
+    getters = {}
+    def get_row(element):
+        getter = getters.get(type(element))
+        if getter is None:
+            getter = getters[type(element)] = get_class_getter(type(element))
+        return getter(element)
+    return get_row
+
+row_decoders = {}
+
+def get_row_decoder(fields, composite_name=None):
+    key = (tuple(fields.items()), tuple(composite_name or []))
+    if key not in row_decoders:
+        row_decoders[key] = RowDecoder(fields, composite_name)
+    return row_decoders[key]
+
+# xml escapes, applied in one pass. a foot mark becomes an apostrophe and descriptions keep their newlines
+xml_escapes = {'\n' : '\\n', '&' : '&amp;', '"' : '&quot;', '<' : '&lt;', '>' : '&gt;', "'" : '&apos;', '\x92' : "'"}
+xml_escape_pat = re.compile('[\n&"<>\'\x92]')
+xml_desc_escape_pat = re.compile('[&"<>\'\x92]')
+non_ascii_pat = re.compile('[\x80-\xff]')
+
+def escape_xml_char(match):
+    return xml_escapes[match.group()]
+
+def get_reference_types(reference, element):
+    # the element types a reference field of element can name. a reference is a type, a list of types or
+    # (field, {value : type}, default) for fields whose type depends on another field
+    if isinstance(reference, tuple):
+        field, types, default = reference
+        reference = types.get(element.get(field), default)
+    if reference is None:
+        return []
+    return reference if isinstance(reference, list) else [reference]
+
+class ElementClass(object):
+    def __init__(self):
+        self.elements = []
+        self.name_field = 'Name'
+        self.desc_field = 'Description'
+        self.ordinal_field = None
+        self.md5_field = None
+        self.subclasses = {}
+        self.composite_class = None
+        self.composite_name = []
+        self.defaults = {}
+        self.inp_grouping = None
+        self.sort_by = [self.name_field]
+        self.index = None
+        # the fields that name elements of other sections by element type (e.g. 'Node'), the fields that
+        # name this section's elements, and the reference fields whose elements are deleted with what they
+        # refer to, other than name fields. see ElementClasses.rename and delete
+        self.references = {}
+        self.defines = {}
+        self.deleted_with = []
+        self.reference_index = None
+
+    def inp_lines(self, **kwargs):
+        return list(self.iter_inp_lines(**kwargs))
+
+    def get_index(self):
+        # the elements by name, the first entry of a name wins, or None for sections without names. the
+        # index is kept until the element list is replaced or changes length, add_elements adds to it and
+        # ElementClasses.rename and delete update it. elements replaced or renamed in place otherwise aren't
+        # noticed, lookup checks what it finds
+        elements = self.get_elements()
+        if not self.name_field:
+            return None
+        if self.index is None or self.index[0] is not elements or self.index[1] != len(elements):
+            self.index = (elements, 0, {}, [], {}, set())
+            self.extend_index(0)
+        return self.index[2]
+
+    def lookup(self, element_name, refresh=False):
+        # the element of that name, or KeyError. a hit is checked to still be in the list at its position
+        # under that name, a miss is only checked against the names the elements have with refresh. the
+        # index is built again if either is stale
+        index = self.get_index()
+        if index is None:
+            raise Exception("The elements of " + self.section + " have no names.")
+        elements, length, index, names, positions, duplicates = self.index
+        position = positions.get(element_name)
+        if position is not None:
+            element = elements[position]
+            if element is index[element_name] and element.get(self.name_field) == element_name:
+                return element
+        elif not refresh or element_name not in get_field_values(elements, self.name_field):
+            raise KeyError(element_name)
+        self.index = None
+        return self.get_index()[element_name]
+
+    def get_reference_index(self, refresh=False):
+        # (element, field, element type) by the names the reference and defining fields hold, or None for
+        # sections without them. kept until the element list is replaced or changes length, like the index,
+        # ElementClasses.rename and delete update it. fields edited in place otherwise aren't noticed, refresh
+        # builds it again
+        elements = self.get_elements()
+        if not self.references and not self.defines:
+            return None
+        if refresh or self.reference_index is None or self.reference_index[0] is not elements or \
+                self.reference_index[1] != len(elements):
+            with gc_paused():
+                self.reference_index = (elements, len(elements), self.build_reference_index(elements))
+        return self.reference_index[2]
+
+    def delete_from_reference_index(self, deleted, length):
+        # takes elements deleted from the list, which was length long before, out of the reference index
+        if self.reference_index is None:
+            return
+        elements, indexed_length, index = self.reference_index
+        if elements is not self.get_elements() or indexed_length != length:
+            self.reference_index = None
+            return
+        deleted_ids = set(map(id, deleted))
+        fields = self.defines.keys() + self.references.keys()
+        for element in deleted:
+            for field in fields:
+                entries = index.get(element.get(field))
+                if entries:
+                    kept = [entry for entry in entries if id(entry[0]) not in deleted_ids]
+                    if kept:
+                        index[element.get(field)] = kept
+                    else:
+                        del index[element.get(field)]
+        self.reference_index = (elements, len(elements), index)
+
+    def build_reference_index(self, elements):
+        index = {}
+        fields = self.defines.items() + self.references.items()
+        typed_fields = [(field, reference) for field, reference in fields if isinstance(reference, str)]
+        other_fields = [(field, reference) for field, reference in fields if not isinstance(reference, str)]
+        for element in elements:
+            get = element.get
+            for field, element_type in typed_fields:
+                name = get(field)
+                if name is not None and name != '*':
+                    index.setdefault(name, []).append((element, field, element_type))
+            for field, reference in other_fields:
+                name = get(field)
+                if name is not None and name != '*':
+                    for element_type in get_reference_types(reference, element):
+                        index.setdefault(name, []).append((element, field, element_type))
+        return index
+
+    def get_defined_names(self):
+        # the names of the elements the section defines, by element type
+        elements = self.get_elements()
+        return dict((element_type, set(get_field_values(elements, field)))
+                    for field, element_type in self.defines.items())
+
+    def extend_index(self, start):
+        # indexes the elements from start on if the index is current up to there. the names are kept in the
+        # order they were indexed, see ElementClasses.get_name_index
+        if self.index is not None:
+            indexed_elements, length, index, names, positions, duplicates = self.index
+            elements = self.get_elements()
+            if indexed_elements is elements and length == start:
+                name_field = self.name_field
+                for i in xrange(start, len(elements)):
+                    element = elements[i]
+                    name = element[name_field]
+                    if name not in index:
+                        index[name] = element
+                        positions[name] = i
+                        names.append(name)
+                    else:
+                        duplicates.add(name)
+                self.index = (elements, len(elements), index, names, positions, duplicates)
+
+    def update_index(self, renamed=(), deleted=(), length=None):
+        # brings the index up to date with elements renamed in place, given as (element, old name), and
+        # elements deleted from the list, which was length long before. returns the names no longer
+        # indexed, or None if the index was dropped to be built again, as it is for a name more than one
+        # element had since the next of them can only be found by looking through the elements
+        if self.index is None:
+            return set()
+        elements, indexed_length, index, names, positions, duplicates = self.index
+        if elements is not self.get_elements() or indexed_length != (len(elements) if length is None else length):
+            self.index = None
+            return None
+        name_field = self.name_field
+        removed = set()
+        renamed_positions = []
+        for element, old in renamed:
+            if index.get(old) is not element or old in duplicates:
+                self.index = None
+                return None
+            del index[old]
+            renamed_positions.append((element, positions.pop(old)))
+            removed.add(old)
+        for element in deleted:
+            name = element[name_field]
+            if index.get(name) is element:
+                if name in duplicates:
+                    self.index = None
+                    return None
+                del index[name]
+                removed.add(name)
+        for element, position in renamed_positions:
+            name = element[name_field]
+            if name in index:
+                duplicates.add(name)
+                if positions[name] < position:
                     continue
+            else:
+                names.append(name)
+            index[name] = element
+            positions[name] = position
+            removed.discard(name)
+        if deleted:
+            # the elements after those deleted have moved, the first position of each name is found again
+            names_column = get_field_values(elements, name_field)
+            positions = dict(itertools.izip(reversed(names_column), xrange(len(names_column) - 1, -1, -1)))
+            # an element renamed in place since it was indexed
+            if positions.viewkeys() != index.viewkeys():
+                self.index = None
+                return None
+        self.index = (elements, len(elements), index, names, positions, duplicates)
+        return removed
+
+    def iter_xml(self):
+        # yields the section's xml one element at a time
+        elements = self.get_elements()
+        if not elements:
+            return
+
+        yield '\t<' + self.section + '>\n'
+        for element in elements:
+            xml = ['\t\t<Element>\n']
+            for parameter, value in element.items():
+                if value is None:
+                    value = 'NULL'
+                elif isinstance(value, str):
+                    if 'Description' in parameter:
+                        value = xml_desc_escape_pat.sub(escape_xml_char, value)
+                    else:
+                        value = xml_escape_pat.sub(escape_xml_char, value)
+                    if non_ascii_pat.search(value):
+                        non_ascii = [ch for ch in value if ord(ch) >= 128]
+                        exc = 'Non-ascii values ' + str(non_ascii) + ' in ' + self.section + \
+                            ' for parameter ' + parameter + '.'
+                        raise Exception(exc)
+                xml.extend(['\t\t\t<', parameter, '>', str(value), '</', parameter, '>\n'])
+            xml.append('\t\t</Element>\n')
+            yield ''.join(xml)
+        yield '\t</' + self.section + '>\n'
 
-                if self.name_field and self.name_field not in self.fields.keys():
-                    e[self.name_field] = element[self.name_field]
-
-                if self.ordinal_field and self.ordinal_field not in self.fields.keys():
-                    e[self.ordinal_field] = element[self.ordinal_field]
-
-                if self.desc_field:
-                    e[self.desc_field] = element[self.desc_field]
-
-                if self.md5_field:
-                    e[self.md5_field] = element[self.md5_field]
-
-                self.elements.append(e)
-
-        def get_elements(self):
-            return self.elements
-
-        def _ambiguous_line_exc(self, line):
-            msg =  ': Ambiguous line encountered. This section does not support unmarked end of line descriptions.'
-            return Exception(self.section + msg + '\n' + str(line))
-
-        def _unexpected_line_exc(self, line):
-            return Exception(self.section + ': Unexpected line format encountered.' + '\n' + str(line))
+    def as_xml(self):
+        return ''.join(self.iter_xml())
+
+    def assign(self, subclass):
+        if self.elements:
+            if subclass.section not in self.subclasses.keys():
+                raise Exception(subclass.section + " is not a valid subclass of " + self.section)
+            if subclass.desc_field == self.desc_field:
+                sub_desc_field = subclass.section + 'Description'
+            else:
+                sub_desc_field = subclass.desc_field
 
-        def _missing_file_exc(self, filepath):
-            return Exception('Cannot find support file ' + filepath + ' referenced in ' + self.section)
+            self.defaults = dict(self.defaults.items() + subclass.defaults.items())
+            self.references = dict(self.references.items() + [(field, reference) for field, reference
+                                   in subclass.references.items() if field != subclass.name_field])
+            subfields = subclass.fields.keys()
+            subfields.remove(subclass.name_field)
 
-        def getline(self, i):
-            if self.inp_path:
-                return re.sub('\\xa0', ' ', linecache.getline(self.inp_path, i))
+            if not len(subclass.elements) and self.subclasses[subclass.section]:
+                exc = "assign: There are no elements in " + subclass.inp_label + " to assign to " + self.inp_label
+                raise Exception(exc)
             else:
-                raise Exception("Can't retrieve line, no file identified.")
-
-        def parse(self):
-            element_desc = ''
-            past_header = False
-                
-            for i in range(self.start_lineno, self.end_lineno):
-                line = self.getline(i)
-                if (re.match(self.pats['header'], line) and not past_header) or re.match(self.pats['blank_or_tag'], line):
-                    continue
+                # index the subelements by name, or by (TagType, Name) for tags. the first entry wins
+                subelements_by_key = {}
+                if subclass.section == 'Tags':
+                    for subelement in subclass.elements:
+                        subelements_by_key.setdefault((subelement['TagType'], subelement[subclass.name_field]), subelement)
                 else:
-                    past_header = True
-                    if re.match(self.pats['desc'], line):
-                        desc = line.strip(self.pats['desc_whitespace'])
-                        element_desc = desc if not element_desc else '\n'.join([element_desc, desc])
-                        continue
-                    else:
-                        line_descs = {'marked' : '', 'unmarked' : ''}
+                    for subelement in subclass.elements:
+                        subelements_by_key.setdefault(subelement[subclass.name_field], subelement)
 
-                        if re.search(self.pats['semicolon'], line):
-                            line, line_descs['marked'] = re.split(self.pats['adj_semicolons'], line, maxsplit=1)
-                            line_descs['marked'] = line_descs['marked'].strip(self.pats['desc_whitespace'])
+                for element in self.elements:
+                    name = element[self.name_field]
+                    if subclass.section == 'Tags':
+                        subelement = subelements_by_key.get((self.tag_type, name))
+                    else:
+                        subelement = subelements_by_key.get(name)
 
-                        line, line_descs['unmarked'], file_md5 = self._parse_line(line)
+                    if subelement is not None:
+                        for field in subfields:
+                            try:
+                                element[field] = subelement[field]
+                            except KeyError:
+                                element[field] = subclass.defaults[field]
 
-                        if all(line_descs.values()):
-                            line_desc = ' ; '.join([line_descs['unmarked'], line_descs['marked']])
-                        elif line_descs['marked']:
-                            line_desc = line_descs['marked']
-                        elif line_descs['unmarked']:
-                            line_desc = line_descs['unmarked']
+                        if sub_desc_field:
+                            element[sub_desc_field] = subelement[subclass.desc_field]
+                    else:
+                        if self.subclasses[subclass.section]:
+                            exc = "No entry in " + subclass.inp_label + " for " + name + " in " + self.inp_label
+                            raise Exception(exc)
                         else:
-                            line_desc = ''
-
-                        if line_desc:
-                            element_desc = line_desc if not element_desc else '\n'.join([element_desc, line_desc])
+                            if not hasattr(subclass, 'defaults'):
+                                exc = "There are no default elements for " + subclass.inp_label + \
+                                      " to assign to " + name + " in " + self.inp_label
+                                raise Exception(exc)
 
-                        line = [self.fields.values()[j](value) if value else value for j, value in enumerate(line)]
-                        params = dict(zip(self.fields.keys(), line))
-                        if self.composite_name:
-                            params[self.name_field] = ':'.join([str(params[field]) for field in self.composite_name])
+                            for field in subfields:
+                                if field not in subclass.defaults.keys():
+                                    raise Exception(subclass.section + " is missing a default for the field " + field)
+                                element[field] = subclass.defaults[field]
+
+                            if sub_desc_field:
+                                element[sub_desc_field] = ''
+
+class INPElementClass(ElementClass):
+    pats = {'desc_whitespace' : '; \t\n'}
+
+    # parse options of the *.inp a section is read from, see set_options
+    inp_path = None
+    long_line_comment = False
+    require_support_files = False
+    columnar_timeseries = False
+    compact_elements = False
+    # the elements as stored in the cache, see pack_elements
+    packed_elements = None
+
+    def __init__(self, start_lineno=None, end_lineno=None, lines=None):
+        ElementClass.__init__(self)
+        self.lines = None
+        self.read_lines = None
+        if start_lineno is not None and end_lineno is not None:
+            # parsed when the elements are first needed, from lines or else from the file set_options names
+            self.defer_parse(start_lineno, end_lineno, lambda: lines)
+
+    def get_row_decoder(self, fields=None):
+        return get_row_decoder(self.fields if fields is None else fields, self.composite_name)
+
+    def set_options(self, inp_path=None, long_line_comment=False, require_support_files=False,
+                    columnar_timeseries=False, compact_elements=False):
+        self.inp_path = inp_path
+        self.long_line_comment = long_line_comment
+        self.require_support_files = require_support_files
+        self.columnar_timeseries = columnar_timeseries
+        self.compact_elements = compact_elements
+
+    @property
+    def elements(self):
+        if self.read_lines is not None or self.packed_elements is not None:
+            self.load()
+        return self._elements
+
+    @elements.setter
+    def elements(self, elements):
+        self._elements = elements
+        self.packed_elements = None
+
+    def defer_parse(self, start_lineno, end_lineno, read_lines):
+        # read_lines is called for the section's lines the first time the elements are needed
+        self.start_lineno = start_lineno
+        self.end_lineno = end_lineno
+        self.read_lines = read_lines
+
+    def load(self):
+        if self.packed_elements is not None:
+            # records are tracked by the collector, unlike dicts of plain values
+            with gc_paused():
+                self._elements = unpack_elements(self.packed_elements)
+            self.packed_elements = None
+        if self.read_lines is not None:
+            read_lines = self.read_lines
+            self.read_lines = None
+            try:
+                self.lines = read_lines()
+                self.parse()
+                if self.compact_elements:
+                    self.compact()
+            except:
+                self.elements = []
+                self.read_lines = read_lines
+                raise
+            finally:
+                self.lines = None
+
+    def get_elements(self):
+        return self.elements
+
+    def add_elements(self, elements, ignore_fields=[]):
+        ignore_fields = ignore_fields + [self.desc_field, self.ordinal_field, self.name_field]
+        fieldnames = self.fields.keys()
+        value_fields = [name for name in fieldnames if name not in ignore_fields]
+        extra_fields = [name for name in [self.name_field, self.ordinal_field] if name and name not in self.fields]
+        extra_fields += [name for name in [self.desc_field, self.md5_field] if name]
+        start = len(self.elements)
+        for element in elements:
+            e = dict((field, element[field]) for field in fieldnames)
+            
+            if all([e[name] is None for name in value_fields]):
+                continue
+
+            for name in extra_fields:
+                e[name] = element[name]
+
+            self.elements.append(e)
+
+        self.extend_index(start)
+
+    def get_elements(self):
+        return self.elements
+
+    def compact(self):
+        # replaces the elements with records, see compact_elements
+        self._elements = [self.compact_element(element) for element in self._elements]
+
+    def compact_element(self, element):
+        # the record of an element, composite names are joined when read. records are kept as they are
+        if isinstance(element, Record):
+            return element
+        if len(self.composite_name) > 1 and self.name_field:
+            return to_record(element, self.name_field, tuple(self.composite_name))
+        return to_record(element)
+
+    def append_parsed(self, element):
+        # parsed elements are made records as they're appended so that the section's dicts don't all exist
+        # at once
+        if self.compact_elements:
+            element = self.compact_element(element)
+        self.elements.append(element)
+
+    def _ambiguous_line_exc(self, line):
+        msg =  ': Ambiguous line encountered. This section does not support unmarked end of line descriptions.'
+        return Exception(self.section + msg + '\n' + str(line))
+
+    def _unexpected_line_exc(self, line):
+        return Exception(self.section + ': Unexpected line format encountered.' + '\n' + str(line))
+
+    def _missing_file_exc(self, filepath):
+        return Exception('Cannot find support file ' + filepath + ' referenced in ' + self.section)
+
+    def _resolve_file_md5s(self):
+        # support files are hashed on the md5 pool while the section is parsed, their md5s are filled in
+        # once it's done
+        for path, md5 in self.files.items():
+            self.files[path] = get_md5(md5)
+        for element in self._elements:
+            element[self.md5_field] = get_md5(element[self.md5_field])
+
+    def _find_support_file(self, file_name):
+        # full path of a support file named in the section, looked up next to the *.inp unless found as given
+        filepath = file_name.strip(' \t\n"\'')
+        for path in self.files:
+            if os.path.basename(path) == filepath:
+                return path
+        if not os.path.exists(filepath) and self.inp_path:
+            filepath = os.path.join(os.path.dirname(self.inp_path), filepath)
+        if not os.path.exists(filepath):
+            raise self._missing_file_exc(file_name)
+        return filepath
+
+    def _split_fields(self, line, num_fields):
+        # splits an unmarked end of line description off of a line with more than num_fields values
+        unmarked_desc = ''
+        if len(line) != num_fields:
+            if len(line) > num_fields and self.long_line_comment:
+                unmarked_desc = ' '.join(line[num_fields:]).strip()
+                line = line[:num_fields]
+            else:
+                raise self._unexpected_line_exc(line)
+        return line, unmarked_desc
+
+    def _parse_line(self, line):
+        # one value per field. sections with optional or variable fields override this
+        return self._split_fields(line.split(), len(self.fields))
+
+    def is_comment_or_blank(self, line):
+        # comment, blank and section tag lines, checked without the pattern machinery
+        stripped = line.lstrip()
+        return not stripped or stripped[0] in '[;'
+
+    def tokenize(self, parse_line=None, skip_all_headers=False):
+        # yields (fields, description, lineno) for each data line of the section. parse_line splits a
+        # line with its ; description removed into (fields, unmarked description). the description
+        # is made of the comment lines before the line, its unmarked description and its ; description
+        if parse_line is None:
+            parse_line = self._parse_line
+        desc_whitespace = self.pats['desc_whitespace']
+        element_desc = ''
+        past_header = False
+        for i in xrange(self.start_lineno, self.end_lineno):
+            line = self.getline(i)
+            stripped = line.lstrip()
+            if not stripped or stripped[0] == '[' or (stripped[:2] == ';;' and (skip_all_headers or not past_header)):
+                continue
+
+            past_header = True
+            if stripped[0] == ';':
+                desc = line.strip(desc_whitespace)
+                element_desc = desc if not element_desc else '\n'.join([element_desc, desc])
+                continue
+
+            marked_desc = ''
+            semicolon = line.find(';')
+            if semicolon != -1:
+                marked_desc = line[semicolon + 1:].strip(desc_whitespace)
+                line = line[:semicolon].rstrip(' ')
+
+            fields, unmarked_desc = parse_line(line)
+            if unmarked_desc and marked_desc:
+                line_desc = ' ; '.join([unmarked_desc, marked_desc])
+            else:
+                line_desc = marked_desc or unmarked_desc
 
-                        element_desc = element_desc.replace('\\n', '\n')
+            if line_desc:
+                element_desc = line_desc if not element_desc else '\n'.join([element_desc, line_desc])
 
-                        params[self.desc_field] = element_desc
-                        if hasattr(self, 'files'):
-                            params[self.md5_field] = file_md5
+            yield fields, element_desc, i
+            element_desc = ''
 
-                        self.elements.append(params)
-                        element_desc = ''
+    def getline(self, i):
+        if self.lines is not None:
+            return self.lines[i - self.start_lineno]
+        elif self.inp_path:
+            return re.sub('\\xa0', ' ', linecache.getline(self.inp_path, i))
+        else:
+            raise Exception("Can't retrieve line, no file identified.")
 
-        def inp_lines(self, elements=None, fieldnames=None, exclude_descs=False, eol_descs=False):
-            if elements is None:
-                elements = self.elements
+    def parse(self):
+        decoder = self.get_row_decoder()
+        for line, element_desc, lineno in self.tokenize():
+            params = decoder.decode(line)
+            if self.composite_name:
+                params[self.name_field] = decoder.get_name(params)
 
-            if fieldnames is None:
-                fieldnames = self.fields.keys()
+            params[self.desc_field] = element_desc.replace('\\n', '\n')
+            if hasattr(self, 'files'):
+                params[self.md5_field] = self._read_support_file(params)
 
-            sort_by = self.sort_by + [self.ordinal_field] if self.ordinal_field else self.sort_by
-            elements = sorted(elements, key=lambda x: tuple(x[name] for name in sort_by))
+            self.append_parsed(params)
 
-            if not elements:
-                return []
+        if hasattr(self, 'files'):
+            self._resolve_file_md5s()
 
-            field_widths = {}
-            data_widths = {}
-            field_separator = ' '*3
-            for name in fieldnames:
-                width = max([len(str(row[name])) for row in elements] + [len(name)])
-                field_widths[name] = width
-                data_widths[name] = width + len(field_separator)
-
-            field_fmt_strs = dict([(name, '{:<' + str(width) + '}') for name, width in field_widths.items()])
-            data_fmt_strs = dict([(name, '{:<' + str(width) + '}') for name, width in data_widths.items()])
-
-            section_exists = False
-            inp_lines = [self.inp_label]
-            fields_formatted = [field_fmt_strs[name].format(name) for name in fieldnames]
-            fields_formatted = ';;' + field_separator.join(fields_formatted)
-            inp_lines.append(fields_formatted)
-
-            divider = ['-'*field_widths[name] for name in fieldnames]
-            divider = ';;' + field_separator.join(divider)
-            inp_lines.append(divider)
-
-            prev_newline_field_value = None
-            for i, e in enumerate(elements):
-                if self.inp_grouping:
-                    if not i:
-                        prev_newline_field_value = e[self.inp_grouping]
-                    if e[self.inp_grouping] != prev_newline_field_value:
-                        inp_lines.append('')
-                    prev_newline_field_value = e[self.inp_grouping]
-
-                eol_description = ''
-                if self.desc_field and not exclude_descs:
-                    desc = e[self.desc_field]
-                    if desc:
-                        if not eol_descs:
-                            #desc = desc.decode('string-escape').split('\n')
-                            desc = desc.split('\n')
-                            inp_lines.extend(['; ' + line for line in desc])
-                        else:
-                            #desc = desc.encode('string-escape')
-                            desc = desc.replace('\n', '\\n') 
-                            eol_description = ' '*4 + '; ' + desc
-
-                formatted_row = []
-                for name in fieldnames:
-                    value = e[name]
-                    if value is None:
-                        value = ''
-                    elif isinstance(value, float):
-                        if value == int(value):
-                            value = int(value)
-                    value = str(value)
-                    if len(value) >= data_widths[name] - 1:
-                        value = value + '  '
-                    formatted_row.append(data_fmt_strs[name].format(value))
-                formatted_row[0] = formatted_row[0] + '  '
-                formatted_row = ''.join(formatted_row) + eol_description
-                inp_lines.append(formatted_row)
-
-            return inp_lines
-
-    class CompositeElementClass(ElementClass):
-        def __init__(self, **kwargs):
-            ElementClass.__init__(self)
-            #args, _, _, values = inspect.getargvalues(inspect.currentframe())
-            self.objects = kwargs
-            self.desc_field = None
-            desc_fields = []
-            self.fields = OrderedDict([])
-
-        def inp_lines(self, **kwargs):
-            return reduce(lambda x,y: x + ['', ''] + y, [obj.inp_lines(**kwargs) for obj in self.objects.values()], [])[2:]
-
-        def add_elements(self, elements):
-            shared_names = []
-            for i, obj in enumerate(self.objects.values()):
-                shared_names = list(set(shared_names) & set(obj.fields.keys())) if i else obj.fields.keys()
-
-            for name in self.objects.keys():
-                self.objects[name].add_elements(elements, ignore_fields=shared_names)
-
-        def get_elements(self):
-            fields = OrderedDict()
-            desc_fields = []
-            defaults = {}
-            for cls in self.objects.values():
-                for name, value in cls.defaults.items():
-                    if name not in defaults.keys():
-                        defaults[name] = value
-                if cls.desc_field in defaults.keys():
-                    raise Exception("Components of a composite class can't have identical description fields.")
-                defaults[cls.desc_field] = ''
-
-            self.name_field = None
-
-            def compose(total, next_cls):
-                if not total:
-                    total = copy.copy(next_cls.elements)
-                    self.name_field = next_cls.name_field
-                else:
-                    name_field = next_cls.name_field
-
-                    for next_el in next_cls.elements:
-                        total_has_element = False
-                        for existing_el in total:
-                            if next_el[next_cls.name_field] == existing_el[self.name_field]:
-                                fields = next_cls.fields.keys()
-                                if next_cls.name_field in fields:
-                                    fields.remove(next_cls.name_field)
-
-                                for field in fields:
-                                    if field in existing_el.keys():
-                                        existing_val = existing_el[field]
-                                        next_val = next_el[field]
-                                        if existing_val != next_val:
-                                            raise Exception("Cannot create composite element. ")
-
-                                    existing_el[field] = next_el[field]
-
-                                existing_el[next_cls.desc_field] = next_el[next_cls.desc_field]
-                                total_has_element = True
-                                break
+    def iter_inp_lines(self, elements=None, fieldnames=None, exclude_descs=False, eol_descs=False, presorted=False):
+        # yields the section's lines one at a time, so they can be written without building the section
+        if elements is None:
+            elements = self.elements
 
-                        if not total_has_element:
-                            name = next_el[next_cls.name_field]
-                            del next_el[next_cls.name_field]
-                            next_el[self.name_field] = name
-                            total.append(next_el)
+        if fieldnames is None:
+            fieldnames = self.fields.keys()
 
-                return total
+        if not presorted:
+            sort_by = self.sort_by + [self.ordinal_field] if self.ordinal_field else self.sort_by
+            elements = sorted(elements, key=get_row_getter(sort_by, elements))
+
+        if not elements:
+            return
+
+        # widths are found in one pass over the elements, which may be generated as they are read. the
+        # grouping and description are read with the fields, after them
+        grouped = bool(self.inp_grouping)
+        described = bool(self.desc_field and not exclude_descs)
+        get_row = get_row_getter(list(fieldnames) + [self.inp_grouping] * grouped + [self.desc_field] * described,
+                                 elements)
+        field_widths = dict((name, len(name)) for name in fieldnames)
+        field_separator = ' '*3
+        for row in elements:
+            for name, value in zip(fieldnames, get_row(row)):
+                width = len(str(value))
+                if width > field_widths[name]:
+                    field_widths[name] = width
+        data_widths = dict((name, width + len(field_separator)) for name, width in field_widths.items())
+
+        field_fmt_strs = dict([(name, '{:<' + str(width) + '}') for name, width in field_widths.items()])
+        data_fmt_strs = dict([(name, '{:<' + str(width) + '}') for name, width in data_widths.items()])
+
+        section_exists = False
+        yield self.inp_label
+        fields_formatted = [field_fmt_strs[name].format(name) for name in fieldnames]
+        fields_formatted = ';;' + field_separator.join(fields_formatted)
+        yield fields_formatted
+
+        divider = ['-'*field_widths[name] for name in fieldnames]
+        divider = ';;' + field_separator.join(divider)
+        yield divider
+
+        prev_newline_field_value = None
+        for i, e in enumerate(elements):
+            row = get_row(e)
+            if grouped:
+                newline_field_value = row[len(fieldnames)]
+                if not i:
+                    prev_newline_field_value = newline_field_value
+                if newline_field_value != prev_newline_field_value:
+                    yield ''
+                prev_newline_field_value = newline_field_value
+
+            eol_description = ''
+            if described:
+                desc = row[-1]
+                if desc:
+                    if not eol_descs:
+                        #desc = desc.decode('string-escape').split('\n')
+                        desc = desc.split('\n')
+                        for line in desc:
+                            yield '; ' + line
+                    else:
+                        #desc = desc.encode('string-escape')
+                        desc = desc.replace('\n', '\\n') 
+                        eol_description = ' '*4 + '; ' + desc
 
-            elements = reduce(compose, self.objects.values(), [])
-            
-            fieldnames = defaults.keys()
-            for element in elements:
-                element_fields = element.keys()
-                for fieldname in fieldnames:
-                    if fieldname not in element_fields:
-                        element[fieldname] = defaults[fieldname]
-
-            return elements
-
-    class ElementClasses(object):
-        def __init__(self):
-            self.classes_by_label = OrderedDict()
-            self.classes_by_name = OrderedDict()
-            self.inp_path = inp_path
-            self.meta_data = None
-            
-            self.objects = OrderedDict()
+            formatted_row = []
+            for name, value in zip(fieldnames, row):
+                if value is None:
+                    value = ''
+                elif isinstance(value, float):
+                    if value == int(value):
+                        value = int(value)
+                value = str(value)
+                if len(value) >= data_widths[name] - 1:
+                    value = value + '  '
+                formatted_row.append(data_fmt_strs[name].format(value))
+            formatted_row[0] = formatted_row[0] + '  '
+            formatted_row = ''.join(formatted_row) + eol_description
+            yield formatted_row
+
+class CompositeElementClass(ElementClass):
+    def __init__(self, **kwargs):
+        ElementClass.__init__(self)
+        #args, _, _, values = inspect.getargvalues(inspect.currentframe())
+        self.objects = kwargs
+        self.desc_field = None
+        desc_fields = []
+        self.fields = OrderedDict([])
+        self.composed = None
+        # the values the last composition copied into elements of the first component, see get_elements
+        self.copied = {}
+        self.references = dict(item for obj in kwargs.values() for item in obj.references.items())
+
+    def iter_inp_lines(self, **kwargs):
+        for i, obj in enumerate(self.objects.values()):
+            if i:
+                yield ''
+                yield ''
+            for line in obj.iter_inp_lines(**kwargs):
+                yield line
+
+    def add_elements(self, elements):
+        shared_names = []
+        for i, obj in enumerate(self.objects.values()):
+            shared_names = list(set(shared_names) & set(obj.fields.keys())) if i else obj.fields.keys()
+
+        for name in self.objects.keys():
+            self.objects[name].add_elements(elements, ignore_fields=shared_names)
+        self.invalidate()
+
+    def get_elements(self):
+        # the composition is kept until the element list of a component is replaced or changes length, or
+        # add_elements or invalidate drop it. elements of the components edited in place aren't noticed,
+        # invalidate has to be called for them. ElementClasses.rename renames composed elements with them
+        if self.composed is not None:
+            component_elements, elements = self.composed
+            if all(obj.elements is indexed_elements and len(indexed_elements) == length
+                   for obj, (indexed_elements, length) in zip(self.objects.values(), component_elements)):
+                return elements
+
+        fields = OrderedDict()
+        desc_fields = []
+        defaults = {}
+        for cls in self.objects.values():
+            for name, value in cls.defaults.items():
+                if name not in defaults.keys():
+                    defaults[name] = value
+            if cls.desc_field in defaults.keys():
+                raise Exception("Components of a composite class can't have identical description fields.")
+            defaults[cls.desc_field] = ''
+
+        self.name_field = None
+
+        # the elements of the first component take the fields of the others when they're composed. values
+        # an earlier composition copied are set back to their defaults first, in place so that the elements
+        # keep their key order. those edited since are kept and, like the fields of the first component,
+        # have to agree with what the other components have. they stay in copied, so that they're still
+        # known to be edited if the composition fails or they aren't copied again
+        components = self.objects.values()
+        first = components[0]
+        first_fields = set(first.fields.keys() + [first.name_field, first.desc_field])
+        edited = {}
+        for key, (element, value) in self.copied.items():
+            field = key[1]
+            if field in element and element[field] != value:
+                edited[key] = (element, value)
+                continue
+            if field not in element:
+                pass
+            elif field in defaults:
+                element[field] = defaults[field]
+            else:
+                del element[field]
+            del self.copied[key]
+        copied = {}
+
+        def compose(total, next_cls):
+            if not total:
+                total = copy.copy(next_cls.elements)
+                self.name_field = next_cls.name_field
+            else:
+                fields = next_cls.fields.keys()
+                if next_cls.name_field in fields:
+                    fields.remove(next_cls.name_field)
+
+                total_by_name = {}
+                for existing_el in total:
+                    total_by_name.setdefault(existing_el[self.name_field], existing_el)
+
+                for next_el in next_cls.elements:
+                    existing_el = total_by_name.get(next_el[next_cls.name_field])
+                    if existing_el is not None:
+                        for field in fields + [next_cls.desc_field]:
+                            key = (id(existing_el), field)
+                            if field in existing_el and (field in first_fields or key in copied or key in edited):
+                                existing_val = existing_el[field]
+                                next_val = next_el[field]
+                                if existing_val != next_val:
+                                    raise Exception("Cannot create composite element. ")
+
+                            existing_el[field] = next_el[field]
+                            if field not in first_fields:
+                                copied[key] = (existing_el, next_el[field])
+                    else:
+                        name = next_el[next_cls.name_field]
+                        del next_el[next_cls.name_field]
+                        next_el[self.name_field] = name
+                        total.append(next_el)
+                        total_by_name[name] = next_el
 
-        def get_files(self):
-            files = {}
-            for obj in self.objects.values():
-                if hasattr(obj, 'files'):
-                    for path, md5 in obj.files.items():
-                        files[path] = md5
-            return files
+            return total
 
-        def get_supported_classes(self, by_name=True):
-            return self.classes_by_name.keys() if by_name else self.classes_by_label.keys()
+        elements = reduce(compose, self.objects.values(), [])
+        
+        fieldnames = defaults.keys()
+        for element in elements:
+            for fieldname in fieldnames:
+                if fieldname not in element:
+                    element[fieldname] = defaults[fieldname]
+
+        self.composed = ([(obj.elements, len(obj.elements)) for obj in self.objects.values()], elements)
+        # the elements are kept with the values so that their ids aren't reused
+        edited.update(copied)
+        self.copied = edited
+        return elements
+
+    def invalidate(self):
+        self.composed = None
+
+class ElementClasses(object):
+    # section classes are registered once, when this module is imported
+    classes_by_label = OrderedDict()
+    classes_by_name = OrderedDict()
+
+    def __init__(self, inp_path=None, long_line_comment=False, require_support_files=False,
+                 columnar_timeseries=False, compact_elements=False):
+        self.inp_path = inp_path
+        self.long_line_comment = long_line_comment
+        self.require_support_files = require_support_files
+        self.columnar_timeseries = columnar_timeseries
+        self.compact_elements = compact_elements
+        self.meta_data = None
+        
+        self.objects = OrderedDict()
+        self.name_index = None
+
+    def compact(self):
+        # makes records of the elements of every section, those not loaded yet are compacted when they are.
+        # the components of composite classes are left as dicts, composing adds keys to their elements and a
+        # record can't give them in the order a dict would
+        self.compact_elements = True
+        for obj in self.objects.values():
+            if isinstance(obj, INPElementClass):
+                obj.compact_elements = True
+                if obj.read_lines is None and obj.packed_elements is None:
+                    obj.compact()
 
-        def add_meta_data(self, data):
-            self.meta_data = data
+    def get_files(self):
+        files = {}
+        for obj in self.objects.values():
+            if hasattr(obj, 'files'):
+                obj.load()
+                for path, md5 in obj.files.items():
+                    files[path] = md5
+        return files
 
+    def get_supported_classes(self, by_name=True):
+        return self.classes_by_name.keys() if by_name else self.classes_by_label.keys()
 
-        def get_inp_text(self, exclude_descs=False, eol_descs=False):
-            f = StringIO.StringIO('')
-            if self.meta_data:
-                meta_data = self.meta_data.split('\n') if isinstance(self.meta_data, str) else self.meta_data
-                data = [line if line.strip().startswith(';') else ';; ' + line for line in meta_data]
-                f.writelines('\n'.join(data) + '\n\n')
+    def add_meta_data(self, data):
+        self.meta_data = data
 
-            objs = filter(lambda x: x.get_elements(), self.objects.values())
-            for obj in sorted(objs, key=lambda x: self.classes_by_name.keys().index(x.section)):
-                f.write('\n'.join(obj.inp_lines(exclude_descs=exclude_descs, eol_descs=eol_descs)) + '\n'*3)
-            
-            return f.getvalue()
 
-        def write_inp(self, exclude_descs=False, eol_descs=False):
-            if not self.inp_path:
-                raise Exception("Can't write *.inp, no path defined.")
+    def iter_inp_text(self, exclude_descs=False, eol_descs=False):
+        # yields the *.inp one line at a time, section by section
+        if self.meta_data:
+            meta_data = self.meta_data.split('\n') if isinstance(self.meta_data, str) else self.meta_data
+            for line in meta_data:
+                yield (line if line.strip().startswith(';') else ';; ' + line) + '\n'
+            yield '\n'
 
-            inp_text = self.get_inp_text(exclude_descs=exclude_descs, eol_descs=eol_descs)
-            with open(self.inp_path, 'w') as f:
-                f.write(inp_text)
+        objs = filter(lambda x: x.get_elements(), self.objects.values())
+        for obj in sorted(objs, key=lambda x: self.classes_by_name.keys().index(x.section)):
+            has_lines = False
+            for line in obj.iter_inp_lines(exclude_descs=exclude_descs, eol_descs=eol_descs):
+                yield line + '\n'
+                has_lines = True
+            yield '\n\n' if has_lines else '\n\n\n'
 
-        def append(self, cls):
-            if issubclass(cls, INPElementClass):
-                min_lab = self.get_minimal_label(cls.inp_label)
-                self.classes_by_label[min_lab] = cls
+    def write_inp_text(self, f, exclude_descs=False, eol_descs=False):
+        f.writelines(self.iter_inp_text(exclude_descs=exclude_descs, eol_descs=eol_descs))
 
-            self.classes_by_name[cls.__name__] = cls
+    def get_inp_text(self, exclude_descs=False, eol_descs=False):
+        return ''.join(self.iter_inp_text(exclude_descs=exclude_descs, eol_descs=eol_descs))
 
-            return cls
+    def write_inp(self, exclude_descs=False, eol_descs=False):
+        if not self.inp_path:
+            raise Exception("Can't write *.inp, no path defined.")
 
-        def add_elements(self, name, elements, recognize_subclasses=False):
-            if name in self.objects.keys():
-                self.objects[name].add_elements(elements)
-                obj = self.objects[name]
-            else:
-                obj = self.classes_by_name[name]()
-                obj.add_elements(elements)
-                self.objects[name] = obj
-
-            if recognize_subclasses:
-                for subclass_name in obj.subclasses.keys():
-                    if subclass_name in self.objects.keys():
-                        self.objects[subclass_name].add_elements(elements)
-                    else:
-                        subclass = self.classes_by_name[subclass_name]()
-                        subclass.add_elements(elements)
-                        self.objects[subclass_name] = subclass
-                 
-        def get_object_names(self):
-            return self.objects.keys()
-
-        def get_minimal_label(self, label):
-            min_label_len = 5
-            lbl = label.strip().lower()
-            return lbl[:min(len(lbl), min_label_len)].strip(']')
-
-        def initialize_class(self, label, start_lineno, end_lineno):
-            min_label = self.get_minimal_label(label)
-            if min_label not in self.classes_by_label.keys():
-                raise Exception("Unrecognized INP label encountered: " + label.strip())
-            else:
-                cls = self.classes_by_label[min_label]
-                obj = cls(start_lineno, end_lineno)
-                self.objects[obj.section] = obj
-
-        def merge_subclasses(self):
-            subclasses_merged = []
-            for name, obj in self.objects.items():
-                if obj.subclasses:
-                    for subclass_name, is_required in obj.subclasses.items():
-                        if subclass_name not in self.objects.keys():
-                            if is_required:
-                                exc = "Cannot add subclass " + subclass_name + " to " + name + ". Subclass not found."
-                                raise Exception(exc)
-                            else:
-                                subclass = self.classes_by_name[subclass_name]()
-                        else:
-                            subclass = self.objects[subclass_name]
+        write_file_atomically(self.inp_path, self.iter_inp_text(exclude_descs=exclude_descs, eol_descs=eol_descs),
+                              mode='w', ignore_errors=False)
 
-                        self.objects[name].assign(subclass)
-                        subclasses_merged.append(subclass_name)
+    @classmethod
+    def append(cls, element_class):
+        if issubclass(element_class, INPElementClass):
+            min_lab = cls.get_minimal_label(element_class.inp_label)
+            cls.classes_by_label[min_lab] = element_class
 
-            for name in list(set(subclasses_merged)):
-                if name in self.objects.keys():
-                    del self.objects[name]
-        
-        def merge_composite_classes(self):
-            objs_merged = []
-            key = lambda obj: obj.composite_class
-            objs_sorted_by_composite_class = sorted(self.objects.values(), key=key)
-            for composite_name, objs in itertools.groupby(objs_sorted_by_composite_class, key):
-                if composite_name:
-                    if composite_name not in self.classes_by_name.keys():
-                        raise Exception("Unknown composite class " + composite_name)
-                    objs_to_combine = dict([(obj.section, obj) for obj in objs])
-                    self.objects[composite_name] = self.classes_by_name[composite_name](**objs_to_combine)
-                    objs_merged.extend(objs_to_combine.keys())
-
-            for name in objs_merged:
-                del self.objects[name]
+        cls.classes_by_name[element_class.__name__] = element_class
 
-        def get_all_objects(self):
-            return self.objects
+        return element_class
 
-        def get_elements(self, name):
-            return self.objects[name].get_elements()
+    def add_elements(self, name, elements, recognize_subclasses=False):
+        if name in self.objects.keys():
+            self.objects[name].add_elements(elements)
+            obj = self.objects[name]
+        else:
+            obj = self.classes_by_name[name]()
+            obj.add_elements(elements)
+            self.objects[name] = obj
+
+        if recognize_subclasses:
+            for subclass_name in obj.subclasses.keys():
+                if subclass_name in self.objects.keys():
+                    self.objects[subclass_name].add_elements(elements)
+                else:
+                    subclass = self.classes_by_name[subclass_name]()
+                    subclass.add_elements(elements)
+                    self.objects[subclass_name] = subclass
+             
+    def get_xml_converters(self, name):
+        # converters for the values as_xml writes for a class, including the fields of its subclasses
+        # and of the components of a composite class. the class's own fields take precedence
+        obj = self.classes_by_name[name]()
+        if isinstance(obj, CompositeElementClass):
+            objs = obj.objects.values()
+        else:
+            objs = [obj] + [self.classes_by_name[subclass_name]() for subclass_name in obj.subclasses]
+
+        converters = {}
+        for obj in reversed(objs):
+            converters.update(obj.fields)
+            if obj.ordinal_field:
+                converters[obj.ordinal_field] = int
+        return converters
+
+    def add_xml_elements(self, name, elements, merged_subclasses):
+        # merged subclass fields are added to the subclasses themselves, with the description they were
+        # merged under, so merge_subclasses can put them back
+        self.add_elements(name, elements)
+        obj = self.objects[name]
+        for subclass_name in merged_subclasses:
+            subclass = self.classes_by_name[subclass_name]()
+            sub_desc_field = subclass.section + 'Description' if subclass.desc_field == obj.desc_field \
+                             else subclass.desc_field
+            if subclass.desc_field and sub_desc_field != subclass.desc_field:
+                subelements = [dict(element, **{subclass.desc_field : element.get(sub_desc_field, '')})
+                               for element in elements]
+            else:
+                subelements = elements
+            self.add_elements(subclass_name, subelements)
+
+    def read_xml(self, xml, batch_size=1000):
+        # reads the output of as_xml from a path or file object incrementally. elements are added in
+        # batches and cleared as they are read, so no document tree is built. returns whether any
+        # section had its subclasses merged into it
+        subclasses_merged = False
+        name = None
+        section = None
+        converters = None
+        merged_subclasses = None
+        elements = []
+        depth = 0
+        for event, node in cElementTree.iterparse(xml, events=('start', 'end')):
+            if event == 'start':
+                depth += 1
+                if depth == 2:
+                    name = node.tag
+                    section = node
+                    if name not in self.classes_by_name:
+                        raise Exception("Unrecognized section in xml: " + name)
+                    converters = dict((field, converter) for field, converter in
+                                      self.get_xml_converters(name).items() if converter is not str)
+                    merged_subclasses = None
+                continue
+
+            depth -= 1
+            if depth == 2:
+                element = {}
+                for child in node:
+                    value = child.text or ''
+                    if value == 'NULL':
+                        value = None
+                    elif value and child.tag in converters:
+                        try:
+                            value = converters[child.tag](value)
+                        except ValueError:
+                            pass
+                    element[child.tag] = value
+                section.clear()
+
+                if merged_subclasses is None:
+                    obj = self.classes_by_name[name]()
+                    merged_subclasses = []
+                    for subclass_name in obj.subclasses:
+                        subfields = self.classes_by_name[subclass_name]().fields.keys()
+                        if any(field in element for field in subfields if field not in obj.fields):
+                            merged_subclasses.append(subclass_name)
+                    subclasses_merged = subclasses_merged or bool(merged_subclasses)
 
-    element_classes = ElementClasses()
+                elements.append(element)
+                if len(elements) >= batch_size:
+                    self.add_xml_elements(name, elements, merged_subclasses)
+                    elements = []
+            elif depth == 1:
+                if elements:
+                    self.add_xml_elements(name, elements, merged_subclasses)
+                    elements = []
+                node.clear()
 
-    @element_classes.append
-    class Notes(INPElementClass):
-        inp_label = '[TITLE]'
-        def __init__(self, start_lineno=None, end_lineno=None):
-            INPElementClass.__init__(self, start_lineno, end_lineno)
-            self.section = self.__class__.__name__
-            self.inp_label = self.__class__.inp_label
-            self.fields = OrderedDict([('NotesText', str)])
-            self.name_field = None
-            self.desc_field = None
-            
-            if start_lineno is not None and end_lineno is not None:
-                self.parse()
+        return subclasses_merged
 
-        def parse(self):
-            notes = {'NotesText' : ''}
-            blanks = ''
-            for i in range(self.start_lineno, self.end_lineno):
-                line = self.getline(i)
-                if i == self.start_lineno:
-                    continue
-                if re.match('[\s]*\n', line):
-                    blanks += line
+    def get_object_names(self):
+        return self.objects.keys()
+
+    @staticmethod
+    def get_minimal_label(label):
+        min_label_len = 5
+        lbl = label.strip().lower()
+        return lbl[:min(len(lbl), min_label_len)].strip(']')
+
+    def get_class(self, label):
+        min_label = self.get_minimal_label(label)
+        if min_label not in self.classes_by_label.keys():
+            raise Exception("Unrecognized INP label encountered: " + label.strip())
+        else:
+            return self.classes_by_label[min_label]
+
+    def select_sections(self, sections=None, exclude_sections=None, recognize_subclasses=False):
+        # resolves class names (e.g. 'XSections'), INP labels (e.g. '[XSECTIONS]') and composite
+        # class names to the set of class names that should be read from the *.inp
+        def resolve(names):
+            resolved = set()
+            for name in names:
+                if name in self.classes_by_name.keys():
+                    cls = self.classes_by_name[name]
+                    if issubclass(cls, CompositeElementClass):
+                        resolved.update(n for n, c in self.classes_by_name.items()
+                                        if issubclass(c, INPElementClass) and c().composite_class == name)
+                    else:
+                        resolved.add(name)
                 else:
-                    if blanks:
-                        line = blanks + line
-                        blanks = ''
-                    notes[self.fields.keys()[0]] += line
-
-            notes['NotesText'] = notes['NotesText'].strip()
-            self.elements = [notes] if notes['NotesText'] else []
-
-        def inp_lines(self, **kwargs):
-            notes = self.elements[0]['NotesText'].decode('string-escape').split('\n')
-            inp_lines = [self.inp_label]
-            inp_lines.extend(notes)
-            return inp_lines
-
-    @element_classes.append
-    class Options(INPElementClass):
-        inp_label = '[OPTIONS]'
-        def __init__(self, start_lineno=None, end_lineno=None, elements=None):
-            INPElementClass.__init__(self, start_lineno, end_lineno)
-            self.section = self.__class__.__name__
-            self.inp_label = self.__class__.inp_label
-            self.infil_key = 'INFILTRATION'
-            self.fields = OrderedDict([('FLOW_UNITS', str),
-                                       (self.infil_key, str),
-                                       ('FLOW_ROUTING', str),
-                                       ('START_DATE', str),
-                                       ('START_TIME', str),
-                                       ('REPORT_START_DATE', str),
-                                       ('REPORT_START_TIME', str),
-                                       ('END_DATE', str),
-                                       ('END_TIME', str),
-                                       ('SWEEP_START', str),
-                                       ('SWEEP_END', str),
-                                       ('DRY_DAYS', float),
-                                       ('REPORT_STEP', str),
-                                       ('WET_STEP', str),
-                                       ('DRY_STEP', str),
-                                       ('ROUTING_STEP', str),
-                                       ('ALLOW_PONDING', str),
-                                       ('INERTIAL_DAMPING', str),
-                                       ('VARIABLE_STEP', float),
-                                       ('LENGTHENING_STEP', float),
-                                       ('MIN_SURFAREA', float),
-                                       ('NORMAL_FLOW_LIMITED', str),
-                                       ('SKIP_STEADY_STATE', str),
-                                       ('FORCE_MAIN_EQUATION', str),
-                                       ('LINK_OFFSETS', str),
-                                       ('MIN_SLOPE', float),
-                                       ('IGNORE_RAINFALL', str),
-                                       ('IGNORE_GROUNDWATER', str)])
-            self.name_field = None
-            self.desc_field = None
-            
-            if start_lineno is not None and end_lineno is not None:
-                self.parse()
+                    label = name if name.strip().startswith('[') else '[' + name.strip() + ']'
+                    if self.get_minimal_label(label) not in self.classes_by_label.keys():
+                        raise Exception("Unknown section " + name)
+                    resolved.add(self.get_class(label).__name__)
+            return resolved
+
+        if sections is None:
+            selected = set(n for n, c in self.classes_by_name.items() if issubclass(c, INPElementClass))
+        else:
+            selected = resolve(sections)
+
+        if exclude_sections is not None:
+            selected -= resolve(exclude_sections)
+
+        if recognize_subclasses:
+            for name in selected:
+                for subclass_name, is_required in self.classes_by_name[name]().subclasses.items():
+                    if is_required and subclass_name not in selected:
+                        exc = "Cannot load " + name + " without its required subclass " + subclass_name + \
+                              ". Include " + subclass_name + " in the selected sections or don't recognize subclasses."
+                        raise Exception(exc)
+
+        return selected
+
+    def initialize_class(self, label, start_lineno, end_lineno, lines=None, read_lines=None):
+        obj = self.get_class(label)()
+        obj.set_options(self.inp_path, self.long_line_comment, self.require_support_files, self.columnar_timeseries,
+                        self.compact_elements)
+        if read_lines is not None:
+            obj.defer_parse(start_lineno, end_lineno, read_lines)
+        else:
+            obj.defer_parse(start_lineno, end_lineno, lambda: lines)
+            obj.load()
+        self.objects[obj.section] = obj
 
-        def parse(self):
-            options = {} 
-            for i in range(self.start_lineno, self.end_lineno):
-                line = self.getline(i)
-                if re.match(self.pats['desc'], line) or re.match(self.pats['blank_or_tag'], line):
-                    continue
-                else:
-                    line = line.split()
-                    if len(line) != 2:
-                        if line[2].startswith(';'):
-                            raise Exception("Comments in [OPTIONS] are not supported. Please remove them and try again.")
+    def merge_subclasses(self):
+        subclasses_merged = []
+        for name, obj in self.objects.items():
+            if obj.subclasses:
+                for subclass_name, is_required in obj.subclasses.items():
+                    if subclass_name not in self.objects.keys():
+                        if is_required:
+                            exc = "Cannot add subclass " + subclass_name + " to " + name + ". Subclass not found."
+                            raise Exception(exc)
                         else:
-                            raise self._unexpected_line_exc(line)
-                    param = line[0].upper()
-                    value = line[1]
-                    options[param] = self.fields[param](value)
+                            subclass = self.classes_by_name[subclass_name]()
+                    else:
+                        subclass = self.objects[subclass_name]
 
-            if all([value is None for value in options.values()]):
-                self.elements = []
+                    self.objects[name].assign(subclass)
+                    subclasses_merged.append(subclass_name)
+
+        for name in list(set(subclasses_merged)):
+            if name in self.objects.keys():
+                del self.objects[name]
+    
+    def merge_composite_classes(self):
+        objs_merged = []
+        key = lambda obj: obj.composite_class
+        objs_sorted_by_composite_class = sorted(self.objects.values(), key=key)
+        for composite_name, objs in itertools.groupby(objs_sorted_by_composite_class, key):
+            if composite_name:
+                if composite_name not in self.classes_by_name.keys():
+                    raise Exception("Unknown composite class " + composite_name)
+                objs_to_combine = dict([(obj.section, obj) for obj in objs])
+                self.objects[composite_name] = self.classes_by_name[composite_name](**objs_to_combine)
+                objs_merged.extend(objs_to_combine.keys())
+
+        for name in objs_merged:
+            del self.objects[name]
+
+    def get_state(self):
+        # returns a picklable copy of the parsed objects. classes are recorded by name since classes
+        # defined in this closure can't be pickled
+        def get_object_state(obj):
+            if isinstance(obj, INPElementClass):
+                obj.load()
+            data = dict((k, v) for k, v in obj.__dict__.items() if k not in ['lines', 'read_lines', 'objects', 'composed', 'copied', 'index', 'reference_index'])
+            # elements are stored as rows of values, they're made into elements again when first used
+            elements = data.get('_elements')
+            if isinstance(elements, list) and elements:
+                packed = pack_elements(elements, obj.fields.keys())
+                if packed is not None:
+                    data['_elements'] = None
+                    data['packed_elements'] = packed
+            components = None
+            if isinstance(obj, CompositeElementClass):
+                components = [(name, get_object_state(component)) for name, component in obj.objects.items()]
+            return obj.__class__.__name__, data, components
+
+        return {'meta_data' : self.meta_data,
+                'objects'   : [(name, get_object_state(obj)) for name, obj in self.objects.items()]}
+
+    def set_state(self, state):
+        def restore_object(object_state):
+            name, data, components = object_state
+            cls = self.classes_by_name[name]
+            if components is None:
+                obj = cls()
             else:
-                for field in self.fields.keys():
-                    if field not in options.keys():
-                        options[field] = None
-                
-                self.elements = [options]
+                obj = cls(**dict((name, restore_object(component)) for name, component in components))
+            obj.__dict__.update(data)
+            return obj
 
-        def inp_lines(self, **kwargs):
-            inp_lines = [self.inp_label]
-            opts = self.elements[0]
+        self.meta_data = state['meta_data']
+        self.objects = OrderedDict((name, restore_object(object_state)) for name, object_state in state['objects'])
+        self.name_index = None
 
-            label_col_width = max([len(name) for name in self.fields.keys()])
-            format_str = '{:<' + str(label_col_width) + '}'
-            for name in self.fields.keys():
-                value = opts[name] 
-                if value is None:
-                    continue
-                elif isinstance(value, float):
-                    if value == int(value):
-                        value = int(value)
-                inp_lines.append(format_str.format(name) + ' ' * 10 + str(value))
-
-            return inp_lines
-
-    @element_classes.append
-    class Files(INPElementClass):
-        inp_label = '[FILES]' 
-        def __init__(self, start_lineno=None, end_lineno=None):
-            INPElementClass.__init__(self, start_lineno, end_lineno)
-            self.section = self.__class__.__name__
-            self.inp_label = self.__class__.inp_label
-            self.fields = OrderedDict([('Usage', str),
-                                       ('FileType', str),
-                                       ('FileName', str)])
-            self.name_field = 'Name'
-            self.desc_field = None
-            self.ordinal_field = 'Ordinal'
-            self.md5_field = 'FileMD5'
-            self.composite_name = ['Usage', 'FileType', self.ordinal_field]
-            self.sort_by = [self.ordinal_field]
-            self.files = {}
-            
-            if start_lineno is not None and end_lineno is not None:
-                self.parse()
+    def get_all_objects(self):
+        return self.objects
 
-        def parse(self):
-            if self.inp_path:
-                current_file_num = 1
-                for i in range(self.start_lineno, self.end_lineno):
-                    line = self.getline(i)
-                    if re.match(self.pats['desc'], line) or re.match(self.pats['blank_or_tag'], line):
+    def get_elements(self, name):
+        return self.objects[name].get_elements()
+
+    def get_element(self, name, element_name, refresh=False):
+        return self.objects[name].lookup(element_name, refresh)
+
+    def has(self, name, element_name, refresh=False):
+        if name not in self.objects or not self.objects[name].name_field:
+            return False
+        try:
+            self.objects[name].lookup(element_name, refresh)
+        except KeyError:
+            return False
+        return True
+
+    def get_series(self, name):
+        return self.objects['TimeSeriesPoints'].get_series(name)
+
+    def get_name_index(self):
+        # the sections each element name is in. names that were added to the index of a section since are
+        # added to it and update_name_index takes out those it lost, it's built again when a section was
+        # added or removed or its index was built again
+        indexes = []
+        for name, obj in self.objects.items():
+            index = obj.get_index()
+            # the points of columnar time series aren't stored as elements, they're only found by section
+            if index is not None and not isinstance(index, TimeSeriesIndex):
+                indexes.append((name, index, obj.index[3]))
+
+        indexed, sections_by_name = self.name_index if self.name_index is not None else ([], None)
+        if sections_by_name is None or len(indexed) != len(indexes) or \
+                any(name != indexed_name or index is not indexed_index
+                    for (name, index, names), (indexed_name, indexed_index, length) in zip(indexes, indexed)):
+            sections_by_name = {}
+            for name, index, names in indexes:
+                for element_name in index:
+                    sections_by_name.setdefault(element_name, []).append(name)
+        else:
+            for (name, index, names), (indexed_name, indexed_index, length) in zip(indexes, indexed):
+                for element_name in names[length:]:
+                    # a name can be indexed again after it was renamed away
+                    sections = sections_by_name.setdefault(element_name, [])
+                    if element_name in index and name not in sections:
+                        sections.append(name)
+        self.name_index = ([(name, index, len(names)) for name, index, names in indexes], sections_by_name)
+        return sections_by_name
+
+    def update_name_index(self, name, obj, renamed=(), deleted=(), length=None):
+        # updates the index of a section for elements renamed or deleted, see ElementClass.update_index, and
+        # takes the names it lost out of the name index
+        index = obj.index[2] if obj.index is not None else None
+        removed = obj.update_index(renamed, deleted, length)
+        if removed and self.name_index is not None and \
+                any(indexed_name == name and indexed_index is index for indexed_name, indexed_index, count in self.name_index[0]):
+            sections_by_name = self.name_index[1]
+            for element_name in removed:
+                sections = sections_by_name.get(element_name, [])
+                if name in sections:
+                    sections.remove(name)
+                    if not sections:
+                        del sections_by_name[element_name]
+
+    def find(self, element_name, refresh=False):
+        # (section, element) for each section with an element of that name. the sections the name index
+        # gives are checked by lookup. with refresh every section with names is looked in and checked
+        # against the names its elements have, so that an element renamed in place is found
+        if refresh:
+            names = [name for name, obj in self.objects.items()
+                     if obj.name_field and not isinstance(obj.get_index(), TimeSeriesIndex)]
+        else:
+            names = self.get_name_index().get(element_name, [])
+        found = []
+        for name in names:
+            try:
+                found.append((name, self.objects[name].lookup(element_name, refresh)))
+            except KeyError:
+                pass
+        return found
+
+    def iter_sections(self):
+        # the sections that store elements, the components of composite classes in their place
+        for name, obj in self.objects.items():
+            if isinstance(obj, CompositeElementClass):
+                for component in obj.objects.values():
+                    yield component.section, component
+            else:
+                yield name, obj
+
+    def references_to(self, element_name, element_type=None):
+        # (section, element, field) for the fields that refer to element_name, as any type of element or
+        # as element_type
+        references = []
+        for name, obj in self.iter_sections():
+            index = obj.get_reference_index()
+            if index is not None:
+                for element, field, reference_type in index.get(element_name, ()):
+                    if field in obj.defines or element_type is not None and reference_type != element_type:
                         continue
+                    # the field was edited in place since the index was built
+                    if element.get(field) != element_name:
+                        continue
+                    # a field that can name several types is indexed once for each
+                    if references and references[-1][1] is element and references[-1][2] == field:
+                        continue
+                    references.append((name, element, field))
+        return references
+
+    def rename(self, element_type, names, refresh=False):
+        # renames elements of a type and the references to them, names maps old names to new ones. the
+        # reference indexes are updated in place, as are the name indexes of the sections whose names change.
+        # fields edited in place since the indexes were built are skipped unless refresh is given, then the
+        # reference indexes are built again first
+        names = dict((old, new) for old, new in names.items() if old != new)
+        if element_type == 'TimeSeries' and self.columnar_timeseries:
+            raise Exception("Columnar time series can't be renamed.")
+        if len(set(names.values())) != len(names):
+            raise Exception("Can't rename several " + element_type + " elements to the same name.")
+        sections = list(self.iter_sections())
+        # composed elements have fields of several components, they're renamed along with them
+        composites = [(name, obj) for name, obj in self.objects.items() if isinstance(obj, CompositeElementClass)]
+        # the indexes are taken before anything is renamed, a composition built again partway through would
+        # be indexed by names that were already renamed
+        indexes = [(name, obj, obj.get_reference_index(refresh)) for name, obj in sections + composites]
+        indexes = [(name, obj, index) for name, obj, index in indexes if index is not None]
+        for name, obj, index in indexes:
+            if element_type in obj.defines.values():
+                for new in names.viewvalues() & index.viewkeys():
+                    if new not in names and any(field in obj.defines and reference_type == element_type
+                                                for element, field, reference_type in index[new]):
+                        raise Exception("Can't rename to " + str(new) + ", there's already a " + element_type +
+                                        " of that name in " + name + ".")
+
+        for name, obj, index in indexes:
+            moved = []
+            for old in names.viewkeys() & index.viewkeys():
+                entries = index[old]
+                # a composed element shares its fields with a component that may have been renamed already,
+                # fields that hold neither name were edited in place and are left as they are
+                renamed = [(element, field) for element, field, reference_type in entries
+                           if reference_type == element_type and element.get(field) in (old, names[old])]
+                if renamed:
+                    # the other types a renamed field can name move with it
+                    renamed_ids = set((id(element), field) for element, field in renamed)
+                    kept = [entry for entry in entries if (id(entry[0]), entry[1]) not in renamed_ids and
+                            entry[0].get(entry[1]) == old]
+                    moved.extend((old, names[old], entry) for entry in entries if (id(entry[0]), entry[1]) in renamed_ids)
+                    if kept:
+                        index[old] = kept
                     else:
-                        line = line.split(None, 2)
-                        if len(line) != len(self.fields):
-                            raise self._unexpected_line_exc(line)
-                        for j, value in enumerate(line):
-                            if value is not None:
-                                line[j] = self.fields.values()[j](value)
-                        params = dict(zip(self.fields.keys(), line))
-                        params[self.ordinal_field] = current_file_num
-                        name = ':'.join([params['Usage'], params['FileType'], str(current_file_num)])
-                        params[self.name_field] = ':'.join([str(params[field]) for field in self.composite_name])
-                        if params['Usage'] == 'USE' and self.require_support_files:
-                            filepath = params['FileName'].strip(' \n\t"\'')
-                            if not os.path.exists(filepath):
-                                filepath = os.path.join(os.path.dirname(self.inp_path), filepath)
-
-                            if not os.path.exists(filepath):
-                                raise Exception("Can't find support file '" + params['FileName'] + "' referenced in [FILES]")
-                            else:
-                                params['FileName'] = '"' + os.path.basename(filepath) + '"'
-                                with open(filepath, 'rb') as f:
-                                    fcontents = f.read()
-                                md5 = hashlib.md5(fcontents).hexdigest()
-                                params['FileMD5'] = md5
-                                self.files[filepath] = md5
-                        else:
-                            if self.require_support_files:
-                                params['FileName'] = '"' + os.path.basename(params['FileName'].strip(' \n\t"\'')) + '"'
-                            else:
-                                params['FileName'] = params['FileName'].strip()
-                            params['FileMD5'] = None
-                        self.elements.append(params)
-                        current_file_num += 1
+                        del index[old]
+
+            renamed_fields = set()
+            for old, new, (element, field, reference_type) in moved:
+                if element.get(field) != new:
+                    element[field] = intern(new) if isinstance(new, str) else new
+                    renamed_fields.add(field)
+                index.setdefault(new, []).append((element, field, reference_type))
+
+            if obj.name_field in renamed_fields:
+                renamed = [(element, old) for old, new, (element, field, reference_type) in moved if field == obj.name_field]
+                self.update_name_index(name, obj, renamed)
+            elif renamed_fields & set(obj.composite_name) and obj.name_field:
+                renamed = {}
+                for old, new, (element, field, reference_type) in moved:
+                    if id(element) not in renamed:
+                        renamed[id(element)] = (element, element[obj.name_field])
+                    element[obj.name_field] = ':'.join([str(element[part]) for part in obj.composite_name])
+                self.update_name_index(name, obj, renamed.values())
+
+    def delete(self, element_type, element_names, refresh=False):
+        # deletes elements of a type with the elements that belong to them: those that refer to them by their
+        # names or parts of their composite names or by a field in deleted_with, such as links by their nodes,
+        # and in turn what belongs to those. returns (section, element, field) for the references left. the
+        # indexes are used as they are, fields edited in place since they were built are skipped unless
+        # refresh is given, see rename
+        if isinstance(element_names, basestring):
+            element_names = [element_names]
+        if element_type == 'TimeSeries' and self.columnar_timeseries:
+            raise Exception("Columnar time series can't be deleted.")
+        sections = list(self.iter_sections())
+        # nothing is removed until the end, the indexes stay as they are while the deletions are gathered
+        indexes = [(name, obj, obj.get_reference_index(refresh)) for name, obj in sections]
+        indexes = [(name, obj, index) for name, obj, index in indexes if index is not None]
+        owning_fields = dict((name, set([obj.name_field] + list(obj.composite_name) + obj.deleted_with + obj.defines.keys()))
+                             for name, obj in sections)
+        deleted = dict((name, {}) for name, obj in sections)
+        pending = [(element_type, element_name) for element_name in element_names]
+        seen = set(pending)
+        references = []
+        while pending:
+            element_type, element_name = pending.pop()
+            for name, obj, index in indexes:
+                for element, field, reference_type in index.get(element_name, ()):
+                    if reference_type != element_type or element.get(field) != element_name:
+                        continue
+                    if field not in owning_fields[name]:
+                        references.append((name, element, field))
+                    elif id(element) not in deleted[name]:
+                        deleted[name][id(element)] = element
+                        for defining_field, defined_type in obj.defines.items():
+                            defined = (defined_type, element.get(defining_field))
+                            if defined[1] is not None and defined not in seen:
+                                seen.add(defined)
+                                pending.append(defined)
+
+        for name, obj in sections:
+            if deleted[name]:
+                length = len(obj.elements)
+                obj.elements[:] = [element for element in obj.elements if id(element) not in deleted[name]]
+                self.update_name_index(name, obj, deleted=deleted[name].values(), length=length)
+                obj.delete_from_reference_index(deleted[name].values(), length)
+
+        left = []
+        for name, element, field in references:
+            if id(element) not in deleted[name] and (not left or left[-1][1] is not element or left[-1][2] != field):
+                left.append((name, element, field))
+        return left
+
+    def validate(self):
+        # checks that the names in reference fields are defined, that the elements of a section have the rows
+        # of its required subclasses and that no element is defined twice. names are gathered into sets once,
+        # elements are only looked at again for the names that are missing. returns (section, element name,
+        # field, value, problem) for each failure
+        sections = list(self.iter_sections())
+        problems = []
+        defined = {}
+        for name, obj in sections:
+            for element_type, names in obj.get_defined_names().items():
+                defined.setdefault(element_type, set()).update(names)
+
+        # sections defining elements by their names, such as the node sections, share a namespace
+        defining = {}
+        for name, obj in sections:
+            if obj.name_field and obj.defines.get(obj.name_field):
+                defining.setdefault(obj.defines[obj.name_field], []).append((name, obj))
+        for element_type, objs in defining.items():
+            names = [element_name for name, obj in objs for element_name in get_field_values(obj.get_elements(), obj.name_field)]
+            if len(set(names)) == len(names):
+                continue
+            seen = set()
+            duplicates = set()
+            for element_name in names:
+                if element_name in seen:
+                    duplicates.add(element_name)
+                seen.add(element_name)
+            for name, obj in objs:
+                for element in obj.get_elements():
+                    element_name = element.get(obj.name_field)
+                    if element_name in duplicates:
+                        problems.append((name, element_name, obj.name_field, element_name,
+                                         element_type + " " + str(element_name) + " is defined more than once"))
+
+        # names that stand for no element, "" is how a missing name is written in some sections
+        no_names = set([None, '*', '""'])
+        for name, obj in sections:
+            if not obj.references:
+                continue
+            elements = obj.get_elements()
+            for field, reference in obj.references.items():
+                # the names are grouped by the value of the field their type depends on, if there is one, and
+                # those of each group that aren't defined are found by difference
+                if isinstance(reference, tuple):
+                    condition = reference[0]
+                    names_by_condition = {}
+                    for condition_value, element_name in zip(get_field_values(elements, condition),
+                                                             get_field_values(elements, field)):
+                        names_by_condition.setdefault(condition_value, set()).add(element_name)
+                else:
+                    condition = None
+                    names_by_condition = {None : set(get_field_values(elements, field))}
+                missing = {}
+                for condition_value, names in names_by_condition.items():
+                    element_types = get_reference_types(reference, {condition : condition_value})
+                    if not element_types:
+                        continue
+                    names = names - no_names
+                    for element_type in element_types:
+                        names = names - defined.get(element_type, no_names)
+                    if names:
+                        missing[condition_value] = (names, element_types)
+                if missing:
+                    for element in elements:
+                        names, element_types = missing.get(element.get(condition) if condition else None, (no_names, None))
+                        value = element.get(field)
+                        if value in names and element_types:
+                            problems.append((name, element.get(obj.name_field) if obj.name_field else None, field,
+                                             value, "There's no " + " or ".join(element_types) + " " + str(value)))
+
+        for name, obj in sections:
+            elements = obj.get_elements()
+            for subclass_name, is_required in sorted(obj.subclasses.items()):
+                if not is_required or not elements:
+                    continue
+                subclass = self.objects.get(subclass_name)
+                if subclass is None:
+                    subclass = self.classes_by_name[subclass_name]()
+                    # a merged subclass is in the fields of the elements, assign checked it was complete
+                    if all(field in elements[0] for field in subclass.fields if field != subclass.name_field):
+                        continue
+                    names = no_names
+                else:
+                    names = set(get_field_values(subclass.get_elements(), subclass.name_field))
+                for element_name in get_field_values(elements, obj.name_field):
+                    if element_name not in names:
+                        problems.append((name, element_name, obj.name_field, element_name,
+                                         "No entry in " + subclass.inp_label + " for " + str(element_name)))
+        return problems
+
+@ElementClasses.append
+class Notes(INPElementClass):
+    inp_label = '[TITLE]'
+    def __init__(self, start_lineno=None, end_lineno=None, lines=None):
+        INPElementClass.__init__(self, start_lineno, end_lineno, lines)
+        self.section = self.__class__.__name__
+        self.inp_label = self.__class__.inp_label
+        self.fields = OrderedDict([('NotesText', str)])
+        self.name_field = None
+        self.desc_field = None
+
+    def parse(self):
+        notes = {'NotesText' : ''}
+        blanks = ''
+        for i in range(self.start_lineno, self.end_lineno):
+            line = self.getline(i)
+            if i == self.start_lineno:
+                continue
+            if re.match('[\s]*\n', line):
+                blanks += line
             else:
-                raise Exception("Can't parse inp file, no path supplied.")
-
-    @element_classes.append
-    class Evaporation(INPElementClass):
-        inp_label = '[EVAPORATION]'
-        def __init__(self, start_lineno=None, end_lineno=None):
-            INPElementClass.__init__(self, start_lineno, end_lineno)
-            self.section = self.__class__.__name__
-            self.inp_label = self.__class__.inp_label
-            self.fields = OrderedDict([('Type', str), ('Parameters', str), ('Recovery', str), ('DryOnly', str)])
-            self.name_field = None
-            self.desc_field = None
-            
-            if start_lineno is not None and end_lineno is not None:
-                self.parse()
+                if blanks:
+                    line = blanks + line
+                    blanks = ''
+                notes[self.fields.keys()[0]] += line
+
+        notes['NotesText'] = notes['NotesText'].strip()
+        self.elements = [notes] if notes['NotesText'] else []
+
+    def iter_inp_lines(self, **kwargs):
+        notes = self.elements[0]['NotesText'].decode('string-escape').split('\n')
+        inp_lines = [self.inp_label]
+        inp_lines.extend(notes)
+        return inp_lines
+
+@ElementClasses.append
+class Options(INPElementClass):
+    inp_label = '[OPTIONS]'
+    def __init__(self, start_lineno=None, end_lineno=None, lines=None, elements=None):
+        INPElementClass.__init__(self, start_lineno, end_lineno, lines)
+        self.section = self.__class__.__name__
+        self.inp_label = self.__class__.inp_label
+        self.infil_key = 'INFILTRATION'
+        self.fields = OrderedDict([('FLOW_UNITS', str),
+                                   (self.infil_key, str),
+                                   ('FLOW_ROUTING', str),
+                                   ('START_DATE', str),
+                                   ('START_TIME', str),
+                                   ('REPORT_START_DATE', str),
+                                   ('REPORT_START_TIME', str),
+                                   ('END_DATE', str),
+                                   ('END_TIME', str),
+                                   ('SWEEP_START', str),
+                                   ('SWEEP_END', str),
+                                   ('DRY_DAYS', float),
+                                   ('REPORT_STEP', str),
+                                   ('WET_STEP', str),
+                                   ('DRY_STEP', str),
+                                   ('ROUTING_STEP', str),
+                                   ('ALLOW_PONDING', str),
+                                   ('INERTIAL_DAMPING', str),
+                                   ('VARIABLE_STEP', float),
+                                   ('LENGTHENING_STEP', float),
+                                   ('MIN_SURFAREA', float),
+                                   ('NORMAL_FLOW_LIMITED', str),
+                                   ('SKIP_STEADY_STATE', str),
+                                   ('FORCE_MAIN_EQUATION', str),
+                                   ('LINK_OFFSETS', str),
+                                   ('MIN_SLOPE', float),
+                                   ('IGNORE_RAINFALL', str),
+                                   ('IGNORE_GROUNDWATER', str)])
+        self.name_field = None
+        self.desc_field = None
+
+    def parse(self):
+        options = {} 
+        for i in range(self.start_lineno, self.end_lineno):
+            line = self.getline(i)
+            if self.is_comment_or_blank(line):
+                continue
+            else:
+                line = line.split()
+                if len(line) != 2:
+                    if line[2].startswith(';'):
+                        raise Exception("Comments in [OPTIONS] are not supported. Please remove them and try again.")
+                    else:
+                        raise self._unexpected_line_exc(line)
+                param = line[0].upper()
+                value = line[1]
+                options[param] = self.fields[param](value)
 
-        def parse(self):
-            evaporation = {'Recovery' : None}
+        if all([value is None for value in options.values()]):
+            self.elements = []
+        else:
+            for field in self.fields.keys():
+                if field not in options.keys():
+                    options[field] = None
+            
+            self.elements = [options]
+
+    def iter_inp_lines(self, **kwargs):
+        inp_lines = [self.inp_label]
+        opts = self.elements[0]
+
+        label_col_width = max([len(name) for name in self.fields.keys()])
+        format_str = '{:<' + str(label_col_width) + '}'
+        for name in self.fields.keys():
+            value = opts[name] 
+            if value is None:
+                continue
+            elif isinstance(value, float):
+                if value == int(value):
+                    value = int(value)
+            inp_lines.append(format_str.format(name) + ' ' * 10 + str(value))
+
+        return inp_lines
+
+    def get_datetimes(self):
+        # START, REPORT_START and END as datetimes, None where the date isn't given. a missing time is midnight
+        opts = self.elements[0] if self.elements else {}
+        names = ['START', 'REPORT_START', 'END']
+        texts = [opts[name + '_DATE'] + ' ' + (opts[name + '_TIME'] or '00:00:00') if opts.get(name + '_DATE') else None
+                 for name in names]
+        if numpy is not None:
+            datetimes = parse_datetimes(texts).astype(object).tolist()
+        else:
+            datetimes = [parse_datetime(text) if text else None for text in texts]
+        return OrderedDict(zip(names, datetimes))
+
+@ElementClasses.append
+class Files(INPElementClass):
+    inp_label = '[FILES]' 
+    def __init__(self, start_lineno=None, end_lineno=None, lines=None):
+        INPElementClass.__init__(self, start_lineno, end_lineno, lines)
+        self.section = self.__class__.__name__
+        self.inp_label = self.__class__.inp_label
+        self.fields = OrderedDict([('Usage', str),
+                                   ('FileType', str),
+                                   ('FileName', str)])
+        self.name_field = 'Name'
+        self.desc_field = None
+        self.ordinal_field = 'Ordinal'
+        self.md5_field = 'FileMD5'
+        self.composite_name = ['Usage', 'FileType', self.ordinal_field]
+        self.sort_by = [self.ordinal_field]
+        self.files = {}
+
+    def parse(self):
+        if self.inp_path:
+            current_file_num = 1
+            decoder = self.get_row_decoder()
             for i in range(self.start_lineno, self.end_lineno):
                 line = self.getline(i)
-                if re.match(self.pats['desc'], line) or re.match(self.pats['blank_or_tag'], line):
+                if self.is_comment_or_blank(line):
                     continue
                 else:
-                    line = line.split()
-                    marker = line[0]
-
-                    if marker in ('CONSTANT', 'TIMESERIES', 'FILE', 'TEMPERATURE', 'MONTHLY'):
-                        evaporation['Type'] = marker
-                        parameters = ' '.join(line[1:])
-
-                        if len(parameters) == 0:
-                            parameters = None
-
-                        evaporation['Parameters'] = parameters
-                    elif marker in ('RECOVERY', 'DRY_ONLY'):
-                        if len(line) != 2:
-                            raise self._unexpected_line_exc(line)
+                    line = line.split(None, 2)
+                    if len(line) != len(self.fields):
+                        raise self._unexpected_line_exc(line)
+                    params = decoder.decode(line)
+                    params[self.ordinal_field] = current_file_num
+                    name = ':'.join([params['Usage'], params['FileType'], str(current_file_num)])
+                    params[self.name_field] = decoder.get_name(params)
+                    if params['Usage'] == 'USE' and self.require_support_files:
+                        filepath = params['FileName'].strip(' \n\t"\'')
+                        if not os.path.exists(filepath):
+                            filepath = os.path.join(os.path.dirname(self.inp_path), filepath)
+
+                        if not os.path.exists(filepath):
+                            raise Exception("Can't find support file '" + params['FileName'] + "' referenced in [FILES]")
                         else:
-                            if marker == 'RECOVERY':
-                                field = 'Recovery'
-                            elif marker == 'DRY_ONLY':
-                                field = 'DryOnly'
-
-                            evaporation[field] = line[1]
+                            params['FileName'] = '"' + os.path.basename(filepath) + '"'
+                            md5 = request_file_md5(filepath)
+                            params['FileMD5'] = md5
+                            self.files[filepath] = md5
                     else:
-                        raise self._unexpected_line_exc(line)
-
-            if all([value is None for value in evaporation.values()]):
-                self.elements = []
+                        if self.require_support_files:
+                            params['FileName'] = '"' + os.path.basename(params['FileName'].strip(' \n\t"\'')) + '"'
+                        else:
+                            params['FileName'] = params['FileName'].strip()
+                        params['FileMD5'] = None
+                    self.elements.append(params)
+                    current_file_num += 1
+            self._resolve_file_md5s()
+        else:
+            raise Exception("Can't parse inp file, no path supplied.")
+
+    def get_support_file(self, name):
+        # the file used as name, e.g. 'USE:RAINFALL:1'. interface files are binary and only read as bytes
+        for element in self.elements:
+            if element[self.name_field] == name and element['Usage'] == 'USE':
+                return SupportFile(self._find_support_file(element['FileName']))
+        raise Exception("No file is used as " + name + ".")
+
+@ElementClasses.append
+class Evaporation(INPElementClass):
+    inp_label = '[EVAPORATION]'
+    def __init__(self, start_lineno=None, end_lineno=None, lines=None):
+        INPElementClass.__init__(self, start_lineno, end_lineno, lines)
+        self.section = self.__class__.__name__
+        self.inp_label = self.__class__.inp_label
+        self.fields = OrderedDict([('Type', str), ('Parameters', str), ('Recovery', str), ('DryOnly', str)])
+        self.name_field = None
+        self.desc_field = None
+        self.references = {'Parameters' : ('Type', {'TIMESERIES' : 'TimeSeries'}, None), 'Recovery' : 'Pattern'}
+
+    def parse(self):
+        evaporation = {'Recovery' : None}
+        for i in range(self.start_lineno, self.end_lineno):
+            line = self.getline(i)
+            if self.is_comment_or_blank(line):
+                continue
             else:
-                self.elements = [evaporation]
-
-        def inp_lines(self, **kwargs):
-            if not self.elements:
-                return []
-
-            evap = self.elements[0]
+                line = line.split()
+                marker = line[0]
 
-            inp_lines = [self.inp_label,
-                 ';;Type       Parameters',
-                 ';;---------- ----------']
+                if marker in ('CONSTANT', 'TIMESERIES', 'FILE', 'TEMPERATURE', 'MONTHLY'):
+                    evaporation['Type'] = marker
+                    parameters = ' '.join(line[1:])
 
-            spacer = ' ' * 5
-            recovery = evap['Recovery']
-            dryonly = evap['DryOnly']
-
-            inp_lines.append(spacer.join([evap['Type'], evap['Parameters']]))
-            if evap['Recovery']:
-                inp_lines.append(spacer.join(['RECOVERY', evap['Recovery']]))
+                    if len(parameters) == 0:
+                        parameters = None
 
-            if evap['DryOnly']:
-                inp_lines.append(spacer.join(['DRY_ONLY', evap['DryOnly']]))
-
-            return inp_lines
-    
-    @element_classes.append
-    class Junctions(INPElementClass):
-        inp_label = '[JUNCTIONS]'
-        def __init__(self, start_lineno=None, end_lineno=None):
-            INPElementClass.__init__(self, start_lineno, end_lineno)
-            self.section = self.__class__.__name__
-            self.inp_label = self.__class__.inp_label
-            self.fields = OrderedDict([('Name', str), 
-                                       ('InvertElevation', float),
-                                       ('MaxDepth', float),
-                                       ('InitDepth', float),
-                                       ('SurchargeDepth', float),
-                                       ('PondedArea', float)])
-            self.subclasses = {'Coordinates' : False, 'Tags' : False, 'RDII' : False}
-            self.tag_type = 'Node'
-            
-            if start_lineno is not None and end_lineno is not None:
-                self.parse()
+                    evaporation['Parameters'] = parameters
+                elif marker in ('RECOVERY', 'DRY_ONLY'):
+                    if len(line) != 2:
+                        raise self._unexpected_line_exc(line)
+                    else:
+                        if marker == 'RECOVERY':
+                            field = 'Recovery'
+                        elif marker == 'DRY_ONLY':
+                            field = 'DryOnly'
 
-        def _parse_line(self, line):
-            unmarked_desc = ''
-            line = line.split()
-            if len(line) != len(self.fields):
-                if len(line) > len(self.fields) and self.long_line_comment:
-                    unmarked_desc = ' '.join(line[len(self.fields):]).strip()
-                    line = line[:len(self.fields)]
+                        evaporation[field] = line[1]
                 else:
                     raise self._unexpected_line_exc(line)
 
-            return line, unmarked_desc, None
-
-    @element_classes.append
-    class Outfalls(INPElementClass):
-        inp_label = '[OUTFALLS]'
-        def __init__(self, start_lineno=None, end_lineno=None):
-            INPElementClass.__init__(self, start_lineno, end_lineno)
-            self.section = self.__class__.__name__
-            self.inp_label = self.__class__.inp_label
-            self.fields = OrderedDict([('Name', str),
-                                       ('InvertElevation', float),
-                                       ('OutfallType', str),
-                                       ('TimeSeriesName', str),
-                                       ('TideGate', str)])
-            self.subclasses = {'Coordinates' : False, 'Tags' : False, 'RDII' : False}
-            self.tag_type = 'Node'
-            
-            if start_lineno is not None and end_lineno is not None:
-                self.parse()
-
-        def _parse_line(self, line):
-            unmarked_desc = ''
-            line = line.split()
-            if len(line) == (len(self.fields) - 1):
+        if all([value is None for value in evaporation.values()]):
+            self.elements = []
+        else:
+            self.elements = [evaporation]
+
+    def iter_inp_lines(self, **kwargs):
+        if not self.elements:
+            return []
+
+        evap = self.elements[0]
+
+        inp_lines = [self.inp_label,
+             ';;Type       Parameters',
+             ';;---------- ----------']
+
+        spacer = ' ' * 5
+        recovery = evap['Recovery']
+        dryonly = evap['DryOnly']
+
+        inp_lines.append(spacer.join([evap['Type'], evap['Parameters']]))
+        if evap['Recovery']:
+            inp_lines.append(spacer.join(['RECOVERY', evap['Recovery']]))
+
+        if evap['DryOnly']:
+            inp_lines.append(spacer.join(['DRY_ONLY', evap['DryOnly']]))
+
+        return inp_lines
+
+@ElementClasses.append
+class Junctions(INPElementClass):
+    inp_label = '[JUNCTIONS]'
+    def __init__(self, start_lineno=None, end_lineno=None, lines=None):
+        INPElementClass.__init__(self, start_lineno, end_lineno, lines)
+        self.section = self.__class__.__name__
+        self.inp_label = self.__class__.inp_label
+        self.fields = OrderedDict([('Name', str), 
+                                   ('InvertElevation', float),
+                                   ('MaxDepth', float),
+                                   ('InitDepth', float),
+                                   ('SurchargeDepth', float),
+                                   ('PondedArea', float)])
+        self.subclasses = {'Coordinates' : False, 'Tags' : False, 'RDII' : False}
+        self.tag_type = 'Node'
+        self.defines = {'Name' : 'Node'}
+
+@ElementClasses.append
+class Outfalls(INPElementClass):
+    inp_label = '[OUTFALLS]'
+    def __init__(self, start_lineno=None, end_lineno=None, lines=None):
+        INPElementClass.__init__(self, start_lineno, end_lineno, lines)
+        self.section = self.__class__.__name__
+        self.inp_label = self.__class__.inp_label
+        self.fields = OrderedDict([('Name', str),
+                                   ('InvertElevation', float),
+                                   ('OutfallType', str),
+                                   ('TimeSeriesName', str),
+                                   ('TideGate', str)])
+        self.subclasses = {'Coordinates' : False, 'Tags' : False, 'RDII' : False}
+        self.tag_type = 'Node'
+        self.defines = {'Name' : 'Node'}
+        self.references = {'TimeSeriesName' : ('OutfallType', {'TIDAL' : 'Curve', 'TIMESERIES' : 'TimeSeries'}, None)}
+
+    def _parse_line(self, line):
+        unmarked_desc = ''
+        line = line.split()
+        if len(line) == (len(self.fields) - 1):
+            line.insert(3, None)
+        elif len(line) == len(self.fields) and self.long_line_comment:
+            if re.match('yes|no', line[len(self.fields)-2], re.IGNORECASE):
                 line.insert(3, None)
-            elif len(line) == len(self.fields) and self.long_line_comment:
+                unmarked_desc = ' '.join(line[len(self.fields):]).strip()
+                line = line[:len(self.fields)]
+        elif len(line) > len(self.fields):
+            if self.long_line_comment:
                 if re.match('yes|no', line[len(self.fields)-2], re.IGNORECASE):
                     line.insert(3, None)
-                    unmarked_desc = ' '.join(line[len(self.fields):]).strip()
-                    line = line[:len(self.fields)]
-            elif len(line) > len(self.fields):
-                if self.long_line_comment:
-                    if re.match('yes|no', line[len(self.fields)-2], re.IGNORECASE):
-                        line.insert(3, None)
-                    unmarked_desc = ' '.join(line[len(self.fields):]).strip()
-                    line = line[:len(self.fields)]
-                else:
-                    raise self._unexpected_line_exc(line)
-
-            return line, unmarked_desc, None
-
-    @element_classes.append
-    class Dividers(INPElementClass):
-        inp_label = '[DIVIDERS]'
-        def __init__(self, start_lineno=None, end_lineno=None):
-            INPElementClass.__init__(self, start_lineno, end_lineno)
-            self.section = self.__class__.__name__
-            self.inp_label = self.__class__.inp_label
-            self.fields = OrderedDict([('Name', str),
-                                       ('InvertElevation', float),
-                                       ('DivertedLink', str),
-                                       ('DividerType', str),
-                                       ('CutoffFlow', float),
-                                       ('CurveName', str),
-                                       ('MinFlow', float),
-                                       ('WeirMaxDepth', float),
-                                       ('Coefficient', float),
-                                       ('MaxDepth', float),
-                                       ('InitDepth', float),
-                                       ('SurchargeDepth', float),
-                                       ('PondedArea', float)])
-            self.subclasses = {'Coordinates' : False, 'Tags' : False, 'RDII' : False}
-            self.tag_type = 'Node'
-
-            if start_lineno is not None and end_lineno is not None:
-                self.parse()
-
-        def _parse_line(self, line):
-            unmarked_desc = ''
-            line = line.split()
-            if line[3] == 'OVERFLOW' and (len(line) == len(self.fields) - 5 or self.long_line_comment):
-                line = line[0:4] + [None]*5 + line[4:]
-            elif line[3] == 'WEIR' and (len(line) == len(self.fields) - 2 or self.long_line_comment):
-                line = line[0:4] + [None]*2 + line[4:]
-            elif ( line[3] == 'CUTOFF' or line[3] == 'TABULAR' ) and (len(line) == len(self.fields) - 4 \
-                    or self.long_line_comment):
-                if line[3] == 'CUTOFF':
-                    line = line[0:4] + line[4:5] + [None]*4 + line[5:]
-                else:
-                    line = line[0:4] + [None] + line[4:5] + [None]*3 + line[5:]
+                unmarked_desc = ' '.join(line[len(self.fields):]).strip()
+                line = line[:len(self.fields)]
             else:
                 raise self._unexpected_line_exc(line)
 
-            if len(line) > len(self.fields):
-                if self.long_line_comment:
-                    unmarked_desc = ' '.join(line[len(self.fields):]).strip()
-                    line = line[:len(self.fields)]
-                else:
-                    raise self._unexpected_line_exc(line)
-
-            return line, unmarked_desc, None
-        
-    @element_classes.append
-    class Storage(INPElementClass):
-        inp_label = '[STORAGE]'
-        def __init__(self, start_lineno=None, end_lineno=None):
-            INPElementClass.__init__(self, start_lineno, end_lineno)
-            self.section = self.__class__.__name__
-            self.inp_label = self.__class__.inp_label
-            self.fields = OrderedDict([('Name', str),
-                                       ('InvertElevation', float),
-                                       ('MaxDepth', float),
-                                       ('InitDepth', float),
-                                       ('StorageCurve', str),
-                                       ('CurveName', str),
-                                       ('CurveCoeff', float),
-                                       ('CurveExponent', float),
-                                       ('CurveConstant', float),
-                                       ('PondedArea', float),
-                                       ('EvapFactor', float),
-                                       ('SuctionHead', float),
-                                       ('Conductivity', float),
-                                       ('InitialDeficit', float)])
-            self.subclasses = {'Coordinates' : False, 'Tags' : False, 'RDII' : False}
-            self.tag_type = 'Node'
-
-            if start_lineno is not None and end_lineno is not None:
-                self.parse()
+        return line, unmarked_desc
+
+@ElementClasses.append
+class Dividers(INPElementClass):
+    inp_label = '[DIVIDERS]'
+    def __init__(self, start_lineno=None, end_lineno=None, lines=None):
+        INPElementClass.__init__(self, start_lineno, end_lineno, lines)
+        self.section = self.__class__.__name__
+        self.inp_label = self.__class__.inp_label
+        self.fields = OrderedDict([('Name', str),
+                                   ('InvertElevation', float),
+                                   ('DivertedLink', str),
+                                   ('DividerType', str),
+                                   ('CutoffFlow', float),
+                                   ('CurveName', str),
+                                   ('MinFlow', float),
+                                   ('WeirMaxDepth', float),
+                                   ('Coefficient', float),
+                                   ('MaxDepth', float),
+                                   ('InitDepth', float),
+                                   ('SurchargeDepth', float),
+                                   ('PondedArea', float)])
+        self.subclasses = {'Coordinates' : False, 'Tags' : False, 'RDII' : False}
+        self.tag_type = 'Node'
+        self.defines = {'Name' : 'Node'}
+        self.references = {'DivertedLink' : 'Link', 'CurveName' : 'Curve'}
+
+    def _parse_line(self, line):
+        unmarked_desc = ''
+        line = line.split()
+        if line[3] == 'OVERFLOW' and (len(line) == len(self.fields) - 5 or self.long_line_comment):
+            line = line[0:4] + [None]*5 + line[4:]
+        elif line[3] == 'WEIR' and (len(line) == len(self.fields) - 2 or self.long_line_comment):
+            line = line[0:4] + [None]*2 + line[4:]
+        elif ( line[3] == 'CUTOFF' or line[3] == 'TABULAR' ) and (len(line) == len(self.fields) - 4 \
+                or self.long_line_comment):
+            if line[3] == 'CUTOFF':
+                line = line[0:4] + line[4:5] + [None]*4 + line[5:]
+            else:
+                line = line[0:4] + [None] + line[4:5] + [None]*3 + line[5:]
+        else:
+            raise self._unexpected_line_exc(line)
 
-        def _parse_line(self, line):
-            unmarked_desc = ''
-            line = line.split()
-            fields = self.fields.keys()
-            storage_curve_index = fields.index('StorageCurve')
-            curve_marker = line[storage_curve_index] # should be 'FUNCTIONAL' or 'TABULAR'
-            if curve_marker == 'TABULAR':
-                none_fields = ['CurveCoeff', 'CurveExponent', 'CurveConstant']
-                for i in [fields.index(field) for field in none_fields]:
-                    line.insert(i, None)
-            elif curve_marker == 'FUNCTIONAL':
-                none_field = 'CurveName'
-                idx = fields.index(none_field)
-                line.insert(idx, None)
+        if len(line) > len(self.fields):
+            if self.long_line_comment:
+                unmarked_desc = ' '.join(line[len(self.fields):]).strip()
+                line = line[:len(self.fields)]
             else:
                 raise self._unexpected_line_exc(line)
 
-            if len(line) != len(self.fields):
-                if len(line) == len(self.fields) - 3:
+        return line, unmarked_desc
+    
+@ElementClasses.append
+class Storage(INPElementClass):
+    inp_label = '[STORAGE]'
+    def __init__(self, start_lineno=None, end_lineno=None, lines=None):
+        INPElementClass.__init__(self, start_lineno, end_lineno, lines)
+        self.section = self.__class__.__name__
+        self.inp_label = self.__class__.inp_label
+        self.fields = OrderedDict([('Name', str),
+                                   ('InvertElevation', float),
+                                   ('MaxDepth', float),
+                                   ('InitDepth', float),
+                                   ('StorageCurve', str),
+                                   ('CurveName', str),
+                                   ('CurveCoeff', float),
+                                   ('CurveExponent', float),
+                                   ('CurveConstant', float),
+                                   ('PondedArea', float),
+                                   ('EvapFactor', float),
+                                   ('SuctionHead', float),
+                                   ('Conductivity', float),
+                                   ('InitialDeficit', float)])
+        self.subclasses = {'Coordinates' : False, 'Tags' : False, 'RDII' : False}
+        self.tag_type = 'Node'
+        self.defines = {'Name' : 'Node'}
+        self.references = {'CurveName' : 'Curve'}
+
+    def _parse_line(self, line):
+        unmarked_desc = ''
+        line = line.split()
+        fields = self.fields.keys()
+        storage_curve_index = fields.index('StorageCurve')
+        curve_marker = line[storage_curve_index] # should be 'FUNCTIONAL' or 'TABULAR'
+        if curve_marker == 'TABULAR':
+            none_fields = ['CurveCoeff', 'CurveExponent', 'CurveConstant']
+            for i in [fields.index(field) for field in none_fields]:
+                line.insert(i, None)
+        elif curve_marker == 'FUNCTIONAL':
+            none_field = 'CurveName'
+            idx = fields.index(none_field)
+            line.insert(idx, None)
+        else:
+            raise self._unexpected_line_exc(line)
+
+        if len(line) != len(self.fields):
+            if len(line) == len(self.fields) - 3:
+                line.extend([None for i in xrange(3)])
+            elif self.long_line_comment:
+                if len(line) < len(self.fields):
+                    unmarked_desc = ' '.join(line[len(self.fields)-3:]).strip()
+                    line = line[:len(self.fields)-3]
                     line.extend([None for i in xrange(3)])
-                elif self.long_line_comment:
-                    if len(line) < len(self.fields):
-                        unmarked_desc = ' '.join(line[len(self.fields)-3:]).strip()
-                        line = line[:len(self.fields)-3]
-                        line.extend([None for i in xrange(3)])
-                    else:
-                        last_three_params = line[len(self.fields)-3:len(self.fields)]
-                        try:
-                            _ = [float(x) for x in last_three_params]
-                        except:
-                            unmarked_desc = ' '.join(line[len(self.fields)-3:]).strip()
-                            line = line[:len(self.fields)-3]
-                        else:
-                            unmarked_desc = ' '.join(line[len(self.fields):]).strip()
-                            line = line[:len(self.fields)]
-            else:
-                if self.long_line_comment:
-                    last_three_params = line[len(self.fields)-3:]
+                else:
+                    last_three_params = line[len(self.fields)-3:len(self.fields)]
                     try:
                         _ = [float(x) for x in last_three_params]
                     except:
                         unmarked_desc = ' '.join(line[len(self.fields)-3:]).strip()
                         line = line[:len(self.fields)-3]
-
-            return line, unmarked_desc, None
-
-    @element_classes.append
-    class Coordinates(INPElementClass):
-        inp_label = '[COORDINATES]'
-        def __init__(self, start_lineno=None, end_lineno=None):
-            INPElementClass.__init__(self, start_lineno, end_lineno)
-            self.section = self.__class__.__name__
-            self.inp_label = self.__class__.inp_label
-            self.fields = OrderedDict([('Name', str),
-                                       ('XCoordinate', float),
-                                       ('YCoordinate', float)])
-            self.desc_field = 'CoordinateDescription'
-            self.defaults = {'XCoordinate' : None, 'YCoordinate' : None}
-            
-            if start_lineno is not None and end_lineno is not None:
-                self.parse()
-
-        def _parse_line(self, line):
-            unmarked_desc = ''
-            line = line.split()
-            if len(line) != len(self.fields):
-                if len(line) > len(self.fields) and self.long_line_comment:
-                    unmarked_desc = ' '.join(line[len(self.fields):]).strip()
-                    line = line[:len(self.fields)]
-                else:
-                    raise self._unexpected_line_exc(line)
-
-            return line, unmarked_desc, None
-
-    @element_classes.append
-    class Conduits(INPElementClass):
-        inp_label = '[CONDUITS]'
-        def __init__(self, start_lineno=None, end_lineno=None):
-            INPElementClass.__init__(self, start_lineno, end_lineno)
-            self.inp_label = self.__class__.inp_label
-            self.section = self.__class__.__name__
-            self.fields = OrderedDict([('Name', str),
-                                       ('InletNode', str),
-                                       ('OutletNode', str),
-                                       ('Length', float),
-                                       ('ManningN', float),
-                                       ('InletOffset', float),
-                                       ('OutletOffset', float),
-                                       ('InitFlow', float),
-                                       ('MaxFlow', float)])
-            self.subclasses = {'XSections' : True, 'Losses' : False, 'Tags' : False}
-            self.tag_type = 'Link'
-            
-            if start_lineno is not None and end_lineno is not None:
-                self.parse()
-
-        def _parse_line(self, line):
-            unmarked_desc = ''
-            line = line.split()
-            if len(line) != len(self.fields):
-                if len(line) > len(self.fields) and self.long_line_comment:
-                    unmarked_desc = ' '.join(line[len(self.fields):]).strip()
-                    line = line[:len(self.fields)]
-                else:
-                    raise self._unexpected_line_exc(line)
-
-            return line, unmarked_desc, None
-
-    @element_classes.append
-    class Pumps(INPElementClass):
-        inp_label = '[PUMPS]'
-        def __init__(self, start_lineno=None, end_lineno=None):
-            INPElementClass.__init__(self, start_lineno, end_lineno)
-            self.section = self.__class__.__name__
-            self.inp_label = self.__class__.inp_label
-            self.fields = OrderedDict([('Name', str),
-                                       ('InletNode', str),
-                                       ('OutletNode', str),
-                                       ('PumpCurve', str),
-                                       ('InitStatus', str),
-                                       ('StartupDepth', float),
-                                       ('ShutoffDepth', float)])
-            self.subclasses = {'Tags' : False}
-            self.tag_type = 'Link'
-            
-            if start_lineno is not None and end_lineno is not None:
-                self.parse()
-
-        def _parse_line(self, line):
-            unmarked_desc = ''
-            line = line.split()
-            if len(line) != len(self.fields):
-                if len(line) > len(self.fields) and self.long_line_comment:
-                    unmarked_desc = ' '.join(line[len(self.fields):]).strip()
-                    line = line[:len(self.fields)]
-                else:
-                    raise self._unexpected_line_exc(line)
-            return line, unmarked_desc, None
-        
-
-    @element_classes.append
-    class Orifices(INPElementClass):
-        inp_label = '[ORIFICES]'
-        def __init__(self, start_lineno=None, end_lineno=None):
-            INPElementClass.__init__(self, start_lineno, end_lineno)
-            self.section = self.__class__.__name__
-            self.inp_label = self.__class__.inp_label
-            self.fields = OrderedDict([('Name', str),
-                                       ('InletNode', str),
-                                       ('OutletNode', str),
-                                       ('Type', str),
-                                       ('InletOffset', float),
-                                       ('DischargeCoeff', float),
-                                       ('FlapGate', str),
-                                       ('MoveTime', float)])
-            self.subclasses = {'XSections' : True, 'Tags' : False}
-            self.tag_type = 'Link'
-            
-            if start_lineno is not None and end_lineno is not None:
-                self.parse()
-            
-        def _parse_line(self, line):
-            unmarked_desc = ''
-            line = line.split()
-            if len(line) != len(self.fields):
-                if len(line) > len(self.fields):
-                    unmarked_desc = ' '.join(line[len(self.fields):]).strip()
-                    line = line[:len(self.fields)]
-                else:
-                    raise self._unexpected_line_exc(line)
-            return line, unmarked_desc, None
-
-    @element_classes.append
-    class Weirs(INPElementClass):
-        inp_label = '[WEIRS]'
-        def __init__(self, start_lineno=None, end_lineno=None):
-            INPElementClass.__init__(self, start_lineno, end_lineno)
-            self.section = self.__class__.__name__
-            self.inp_label = self.__class__.inp_label
-            self.fields = OrderedDict([('Name', str),
-                                       ('InletNode', str),
-                                       ('OutletNode', str),
-                                       ('Type', str),
-                                       ('InletOffset', float),
-                                       ('DischargeCoeff', float),
-                                       ('FlapGate', str),
-                                       ('EndContractions', int),
-                                       ('EndCoeff', float)])
-            self.subclasses = {'XSections' : True, 'Tags' : False}
-            self.tag_type = 'Link'
-            
-            if start_lineno is not None and end_lineno is not None:
-                self.parse()
-
-        def _parse_line(self, line):
-            unmarked_desc = ''
-            line = line.split()
-            if len(line) != len(self.fields):
-                if len(line) == (len(self.fields) - 1):
-                    line.append(None)
-                elif len(line) > len(self.fields) and self.long_line_comment:
-                    try:
-                        _ = float(line[len(self.fields)-1])
-                    except:
-                        unmarked_desc = ' '.join(line[len(self.fields) - 1:]).strip()
-                        line = line[:len(self.fields)-1]
-                        line.append(None)
                     else:
                         unmarked_desc = ' '.join(line[len(self.fields):]).strip()
                         line = line[:len(self.fields)]
-                else:
-                    raise self._unexpected_line_exc(line)
-            else:
-                last_param = line[len(self.fields)-1]
+        else:
+            if self.long_line_comment:
+                last_three_params = line[len(self.fields)-3:]
                 try:
-                    _ = float(last_param)
+                    _ = [float(x) for x in last_three_params]
                 except:
-                    if self.long_line_comment:
-                        unmarked_desc = ' '.join(line[len(self.fields)-1:]).strip()
-                        line = line[:len(self.fields)-1]
-                        line.append(None)
-                    else:
-                        raise self._unexpected_line_exc(line)
-        
-            return line, unmarked_desc, None
-
-    @element_classes.append
-    class Outlets(INPElementClass):
-        inp_label = '[OUTLETS]' 
-        def __init__(self, start_lineno=None, end_lineno=None, elements=None):
-            INPElementClass.__init__(self, start_lineno, end_lineno)
-            self.section = self.__class__.__name__
-            self.inp_label = self.__class__.inp_label
-            self.fields = OrderedDict([('Name', str),
-                                       ('InletNode', str),
-                                       ('OutletNode', str),
-                                       ('OutflowHeight', float),
-                                       ('OutletType', str),
-                                       ('FunctionalCoeff', float),
-                                       ('FunctionalExponent', float),
-                                       ('CurveName', str),
-                                       ('FlapGate', str)])
-            self.subclasses = {'Tags' : False}
-            self.tag_type = 'Link'
-
-            if start_lineno is not None and end_lineno is not None:
-                self.parse()
+                    unmarked_desc = ' '.join(line[len(self.fields)-3:]).strip()
+                    line = line[:len(self.fields)-3]
+
+        return line, unmarked_desc
+
+@ElementClasses.append
+class Coordinates(INPElementClass):
+    inp_label = '[COORDINATES]'
+    def __init__(self, start_lineno=None, end_lineno=None, lines=None):
+        INPElementClass.__init__(self, start_lineno, end_lineno, lines)
+        self.section = self.__class__.__name__
+        self.inp_label = self.__class__.inp_label
+        self.fields = OrderedDict([('Name', str),
+                                   ('XCoordinate', float),
+                                   ('YCoordinate', float)])
+        self.desc_field = 'CoordinateDescription'
+        self.defaults = {'XCoordinate' : None, 'YCoordinate' : None}
+        self.references = {'Name' : 'Node'}
+
+@ElementClasses.append
+class Conduits(INPElementClass):
+    inp_label = '[CONDUITS]'
+    def __init__(self, start_lineno=None, end_lineno=None, lines=None):
+        INPElementClass.__init__(self, start_lineno, end_lineno, lines)
+        self.inp_label = self.__class__.inp_label
+        self.section = self.__class__.__name__
+        self.fields = OrderedDict([('Name', str),
+                                   ('InletNode', str),
+                                   ('OutletNode', str),
+                                   ('Length', float),
+                                   ('ManningN', float),
+                                   ('InletOffset', float),
+                                   ('OutletOffset', float),
+                                   ('InitFlow', float),
+                                   ('MaxFlow', float)])
+        self.subclasses = {'XSections' : True, 'Losses' : False, 'Tags' : False}
+        self.tag_type = 'Link'
+        self.defines = {'Name' : 'Link'}
+        self.references = {'InletNode' : 'Node', 'OutletNode' : 'Node'}
+        self.deleted_with = ['InletNode', 'OutletNode']
+
+@ElementClasses.append
+class Pumps(INPElementClass):
+    inp_label = '[PUMPS]'
+    def __init__(self, start_lineno=None, end_lineno=None, lines=None):
+        INPElementClass.__init__(self, start_lineno, end_lineno, lines)
+        self.section = self.__class__.__name__
+        self.inp_label = self.__class__.inp_label
+        self.fields = OrderedDict([('Name', str),
+                                   ('InletNode', str),
+                                   ('OutletNode', str),
+                                   ('PumpCurve', str),
+                                   ('InitStatus', str),
+                                   ('StartupDepth', float),
+                                   ('ShutoffDepth', float)])
+        self.subclasses = {'Tags' : False}
+        self.tag_type = 'Link'
+        self.defines = {'Name' : 'Link'}
+        self.references = {'InletNode' : 'Node', 'OutletNode' : 'Node', 'PumpCurve' : 'Curve'}
+        self.deleted_with = ['InletNode', 'OutletNode']
+
+@ElementClasses.append
+class Orifices(INPElementClass):
+    inp_label = '[ORIFICES]'
+    def __init__(self, start_lineno=None, end_lineno=None, lines=None):
+        INPElementClass.__init__(self, start_lineno, end_lineno, lines)
+        self.section = self.__class__.__name__
+        self.inp_label = self.__class__.inp_label
+        self.fields = OrderedDict([('Name', str),
+                                   ('InletNode', str),
+                                   ('OutletNode', str),
+                                   ('Type', str),
+                                   ('InletOffset', float),
+                                   ('DischargeCoeff', float),
+                                   ('FlapGate', str),
+                                   ('MoveTime', float)])
+        self.subclasses = {'XSections' : True, 'Tags' : False}
+        self.tag_type = 'Link'
+        self.defines = {'Name' : 'Link'}
+        self.references = {'InletNode' : 'Node', 'OutletNode' : 'Node'}
+        self.deleted_with = ['InletNode', 'OutletNode']
         
-        def _parse_line(self, line):
-            line = line.split()
-            unmarked_desc = ''
-            fields = self.fields.keys()
-            if re.match('^FUNCTIONAL', line[fields.index('OutletType')]):
-                line.insert(fields.index('CurveName'), None)
-            elif re.match('^TABULAR', line[fields.index('OutletType')]):
-                line.insert(fields.index('FunctionalCoeff'), None)
-                line.insert(fields.index('FunctionalExponent'), None)
+    def _parse_line(self, line):
+        unmarked_desc = ''
+        line = line.split()
+        if len(line) != len(self.fields):
+            if len(line) > len(self.fields):
+                unmarked_desc = ' '.join(line[len(self.fields):]).strip()
+                line = line[:len(self.fields)]
             else:
                 raise self._unexpected_line_exc(line)
-                
-            if len(line) != len(self.fields):
-                if len(line) > len(self.fields) and self.long_line_comment:
-                    unmarked_desc = ' '.join(line[len(self.fields):]).strip()
-                    line = line[:len(self.fields)]
-                else:
-                    raise self._unexpected_line_exc(line)
-
-            return line, unmarked_desc, None
-
-    @element_classes.append
-    class XSections(INPElementClass):
-        inp_label = '[XSECTIONS]'
-        def __init__(self, start_lineno=None, end_lineno=None):
-            INPElementClass.__init__(self, start_lineno, end_lineno)
-            self.section = self.__class__.__name__
-            self.inp_label = self.__class__.inp_label
-            self.fields = OrderedDict([('Name', str),
-                                       ('PipeShape', str),
-                                       ('Geom1', str),
-                                       ('Geom2', str),
-                                       ('Geom3', float),
-                                       ('Geom4', float),
-                                       ('Barrels', float),
-                                       ('CulvertCode', str)])
-            self.desc_field = 'XSectionsDescription'
-            
-            if start_lineno is not None and end_lineno is not None:
-                self.parse()
-
-        def _parse_line(self, line):
-            line = line.split()
-            unmarked_desc = ''
-            if len(line) == len(self.fields):
+        return line, unmarked_desc
+
+@ElementClasses.append
+class Weirs(INPElementClass):
+    inp_label = '[WEIRS]'
+    def __init__(self, start_lineno=None, end_lineno=None, lines=None):
+        INPElementClass.__init__(self, start_lineno, end_lineno, lines)
+        self.section = self.__class__.__name__
+        self.inp_label = self.__class__.inp_label
+        self.fields = OrderedDict([('Name', str),
+                                   ('InletNode', str),
+                                   ('OutletNode', str),
+                                   ('Type', str),
+                                   ('InletOffset', float),
+                                   ('DischargeCoeff', float),
+                                   ('FlapGate', str),
+                                   ('EndContractions', int),
+                                   ('EndCoeff', float)])
+        self.subclasses = {'XSections' : True, 'Tags' : False}
+        self.tag_type = 'Link'
+        self.defines = {'Name' : 'Link'}
+        self.references = {'InletNode' : 'Node', 'OutletNode' : 'Node'}
+        self.deleted_with = ['InletNode', 'OutletNode']
+
+    def _parse_line(self, line):
+        unmarked_desc = ''
+        line = line.split()
+        if len(line) != len(self.fields):
+            if len(line) == (len(self.fields) - 1):
+                line.append(None)
+            elif len(line) > len(self.fields) and self.long_line_comment:
                 try:
-                    _ = [float(x) for x in line[:-3:-1]]
+                    _ = float(line[len(self.fields)-1])
                 except:
-                    if self.long_line_comment:
-                        unmarked_desc = ' '.join(line[-2:1]).strip()
-                        line = line[:-2]
-                        line.extend([None, None])
-                    else:
-                        raise self._unexpected_line_exc(line)
-            elif len(line) == len(self.fields) - 1:
-                if self.long_line_comment:
-                    last_param = line[-1]
-                    try:
-                        assert int(last_param) == float(last_param)
-                    except:
-                        unmarked_desc = line[-1]
-                        line = line[:-1]
-                line.extend([None, None])
-            elif len(line) == len(self.fields) - 2:
-                line.extend([None, None])
-            elif len(line) > len(self.fields):
-                if self.long_line_comment:
-                    penult_param = line[len(self.fields)-2]
-                    try:
-                        assert float(penult_param) == int(penult_param)
-                    except:
-                        unmarked_desc = ' '.join(line[len(self.fields)-2:]).strip()
-                        line = line[:len(self.fields)-2]
-                        line.extend([None, None])
-                    else:
-                        raise self._ambiguous_line_exc(line)
-
-            return line, unmarked_desc, None
-
-    @element_classes.append
-    class Losses(INPElementClass):
-        inp_label = '[LOSSES]'
-        def __init__(self, start_lineno=None, end_lineno=None):
-            INPElementClass.__init__(self, start_lineno, end_lineno)
-            self.section = self.__class__.__name__
-            self.inp_label = self.__class__.inp_label
-            self.fields = OrderedDict([('Name', str),
-                                       ('EntryLoss', float),
-                                       ('ExitLoss', float),
-                                       ('AvgLoss', float),
-                                       ('FlapGate', str)])
-            self.desc_field = 'LossesDescription'
-            default_fields = self.fields.keys()
-            default_fields.remove(self.name_field)
-            self.defaults = dict([(field, None) for field in default_fields])
-
-            
-            if start_lineno is not None and end_lineno is not None:
-                self.parse()
-
-        def _parse_line(self, line):
-            line = line.split()
-            unmarked_desc = ''
-            if len(line) != len(self.fields):
-                if len(line) > len(self.fields):
-                    unmarked_desc = ' '.join(line[len(self.fields):]).strip()
-                    line = line[:len(self.fields)]
-                else:
-                    raise self._unexpected_line_exc(line)
-            return line, unmarked_desc, None
-
-    @element_classes.append
-    class RainGages(INPElementClass):
-        inp_label = '[RAINGAGES]'
-        def __init__(self, start_lineno=None, end_lineno=None):
-            INPElementClass.__init__(self, start_lineno, end_lineno)
-            self.section = self.__class__.__name__
-            self.inp_label = self.__class__.inp_label
-            self.fields = OrderedDict([('Name', str), 
-                                       ('RainType', str), 
-                                       ('Interval', str), 
-                                       ('SnowCatch', float), 
-                                       ('Source', str), 
-                                       ('SourceName', str), 
-                                       ('StationID', str), 
-                                       ('Units', str)])
-            self.subclasses = {'Symbols' : False, 'Tags' : False}
-            self.tag_type = 'Gage'
-            self.md5_field = 'FileMD5'
-            self.files = {}
-
-            if start_lineno is not None and end_lineno is not None:
-                self.parse()
-
-        def _parse_line(self, line):
-            unmarked_desc = ''
-            original_line = line
-            line = line.split()
-            if line[self.fields.keys().index('Source')] == 'TIMESERIES':
-                # implies no gage number or units
-                num_fields_TIMESERIES = len(self.fields) - 2
-                if len(line) == num_fields_TIMESERIES:
-                    line.extend([None, None])
-                elif len(line) > num_fields_TIMESERIES and self.long_line_comment:
-                    unmarked_desc = ' '.join(line[num_fields_TIMESERIES:]).strip()
-                    line = line[:num_fields_TIMESERIES]
-                    line.extend([None, None])
-                else:
-                    raise self._unexpected_line_exc(line)
-            else:
-                num_remaining_params_after_path = 2
-
-                start_of_fileref = 5
-                val = line[start_of_fileref]
-                has_quote = re.match('\'|"', val)
-                end_of_fileref = None
-                if has_quote:
-                    quote_char = has_quote.group()
-                    for i, val in enumerate(line[start_of_fileref:]):
-                        has_end_quote = re.search('\'|"$', val)
-                        if has_end_quote:
-                            end_of_fileref = start_of_fileref + i
-                            break
-                    
-                    if not end_of_fileref:
-                        raise Exception('The file reference on the following line is missing a quote: ' + str(line))
-                    num_params_after_fileref = 2
-                    del line[start_of_fileref:end_of_fileref + 1]
-                    unsplit_fileref = '"' + original_line.split(quote_char)[1].strip() + '"'
-                    line.insert(start_of_fileref, unsplit_fileref)
-                else:
-                    line[start_of_fileref] = '"' + line[start_of_fileref] + '"'
-
-                if len(line) < len(self.fields):
-                    raise self._unexpected_line_exc(original_line)
-                elif len(line) > len(self.fields):
-                    if self.long_line_comment:
-                        unmarked_desc = ' '.join(line[len(self.fields):])
-                        line = line[:len(self.fields)]
-                    else:
-                        raise self._unexpected_line_exc(line)
-
-            md5 = None
-            source_idx = self.fields.keys().index('Source')
-            sourcename_idx = self.fields.keys().index('SourceName')
-            if line[source_idx] == 'FILE' and self.require_support_files:
-                filepath = line[sourcename_idx].strip(' \t\n"\'')
-                if not os.path.exists(filepath):
-                    filepath = os.path.join(os.path.dirname(self.inp_path), line[sourcename_idx].strip(' \t\n"'))
-
-                if not os.path.exists(filepath):
-                    raise self._missing_file_exc(line[sourcename_idx])
-                elif os.path.exists(filepath):
-                    line[sourcename_idx] = '"' + os.path.basename(filepath) + '"'
-                    with open(filepath, 'rb') as f:
-                        fcontents = f.read()
-                    md5 = hashlib.md5(fcontents).hexdigest()
-                    self.files[filepath] = md5
-
-            return line, unmarked_desc, md5
-
-    @element_classes.append
-    class Symbols(INPElementClass):
-        inp_label = '[SYMBOLS]'
-        def __init__(self, start_lineno=None, end_lineno=None):
-            INPElementClass.__init__(self, start_lineno, end_lineno)
-                
-            self.section = self.__class__.__name__
-            self.inp_label = self.__class__.inp_label
-            self.fields = OrderedDict([('Name', str), 
-                                       ('XCoordinate', float), 
-                                       ('YCoordinate', float)])
-            self.desc_field = 'CoordinateDescription'
-            self.defaults = {'XCoordinate' : None, 'YCoordinate' : None}
-
-            if start_lineno is not None and end_lineno is not None:
-                self.parse()
-
-        def _parse_line(self, line):
-            line = line.split()
-            unmarked_desc = ''
-            if len(line) != len(self.fields):
-                if len(line) > len(self.fields) and self.long_line_comment:
-                    unmarked_desc = ' '.join(line[len(self.fields):]).strip()
-                    line = line[:len(self.fields)]
-                else: 
-                    raise self._unexpected_line_exc(line)
-
-            return line, unmarked_desc, None
-    
-    @element_classes.append
-    class Pollutants(INPElementClass):
-        inp_label = '[POLLUTANTS]'
-        def __init__(self, start_lineno=None, end_lineno=None):
-            INPElementClass.__init__(self, start_lineno, end_lineno)
-            self.section = self.__class__.__name__
-            self.inp_label = self.__class__.inp_label
-            self.fields = OrderedDict([('Name', str),
-                                       ('MassUnits', str),
-                                       ('RainConcen', float),
-                                       ('GWConcen', float),
-                                       ('IIConcen', float),
-                                       ('DecayCoeff', float),
-                                       ('SnowOnly', str),
-                                       ('CoPollutant', str),
-                                       ('CoPollutantFraction', float),
-                                       ('DWFConcen', float)])
-
-            
-            if start_lineno is not None and end_lineno is not None:
-                self.parse()
-
-        def _parse_line(self, line):
-            line = line.split()
-            unmarked_desc = ''
-            if len(line) != len(self.fields):
-                if len(line) > len(self.fields) and self.long_line_comment:
-                    unmarked_desc = ' '.join(line[len(self.fields):]).strip()
-                    line = line[:len(self.fields)]
+                    unmarked_desc = ' '.join(line[len(self.fields) - 1:]).strip()
+                    line = line[:len(self.fields)-1]
+                    line.append(None)
                 else:
-                    raise self._unexpected_line_exc(line)
-
-            return line, unmarked_desc, None
-
-    @element_classes.append
-    class LandUses(INPElementClass):
-        inp_label = '[LANDUSES]'
-        def __init__(self, start_lineno=None, end_lineno=None):
-            INPElementClass.__init__(self, start_lineno, end_lineno)
-            self.section = self.__class__.__name__
-            self.inp_label = self.__class__.inp_label
-            self.fields = OrderedDict([('Name', str),
-                                       ('CleaningInterval', float),
-                                       ('Availability', float),
-                                       ('LastCleaned', float)])
-            
-            if start_lineno is not None and end_lineno is not None:
-                self.parse()
-
-        def _parse_line(self, line):
-            line = line.split()
-            unmarked_desc = ''
-            if len(line) != len(self.fields):
-                if len(line) > len(self.fields) and self.long_line_comment:
                     unmarked_desc = ' '.join(line[len(self.fields):]).strip()
                     line = line[:len(self.fields)]
-                else:
-                    raise self._unexpected_line_exc(line)
-
-            return line, unmarked_desc, None
-
-    @element_classes.append
-    class BuildUp(INPElementClass):
-        inp_label = '[BUILDUP]'
-        def __init__(self, start_lineno=None, end_lineno=None):
-            INPElementClass.__init__(self, start_lineno, end_lineno)
-            self.section = self.__class__.__name__
-            self.inp_label = self.__class__.inp_label 
-            self.fields = OrderedDict([('LandUse', str),
-                                       ('Pollutant', str),
-                                       ('Formula', str),
-                                       ('Coeff1', float),
-                                       ('Coeff2', float),
-                                       ('Coeff3', float),
-                                       ('TimeSeries', str),
-                                       ('Normalizer', str)])
-            self.composite_name = ['LandUse', 'Pollutant']
-            
-            if start_lineno is not None and end_lineno is not None:
-                self.parse()
-
-        def _parse_line(self, line):
-            line = line.split()
-            unmarked_desc = ''
-            fields = self.fields.keys()
-            timeseries_marker = line[fields.index('Coeff3')]
+            else:
+                raise self._unexpected_line_exc(line)
+        else:
+            last_param = line[len(self.fields)-1]
             try:
-                dummy = float(timeseries_marker)
+                _ = float(last_param)
             except:
-                line.insert(fields.index('Coeff3'), None)
-            else:
-                line.insert(fields.index('TimeSeries'), None)
-
-            if len(line) != len(self.fields):
-                if len(line) > len(self.fields) and self.long_line_comment:
-                    unmarked_desc = ' '.join(line[len(self.fields):]).strip()
-                    line = line[:len(self.fields)]
+                if self.long_line_comment:
+                    unmarked_desc = ' '.join(line[len(self.fields)-1:]).strip()
+                    line = line[:len(self.fields)-1]
+                    line.append(None)
                 else:
                     raise self._unexpected_line_exc(line)
-            return line, unmarked_desc, None
     
-    @element_classes.append
-    class WashOff(INPElementClass):
-        inp_label = '[WASHOFF]'
-        def __init__(self, start_lineno=None, end_lineno=None):
-            INPElementClass.__init__(self, start_lineno, end_lineno)
-            self.section = self.__class__.__name__
-            self.inp_label = self.__class__.inp_label
-            self.fields = OrderedDict([('LandUse', str),
-                                       ('Pollutant', str),
-                                       ('Formula', str),
-                                       ('Coeff1', float),
-                                       ('Coeff2', float),
-                                       ('CleaningEfficiency', float),
-                                       ('BMPEfficiency', float)])
-            self.composite_name = ['LandUse', 'Pollutant']
+        return line, unmarked_desc
+
+@ElementClasses.append
+class Outlets(INPElementClass):
+    inp_label = '[OUTLETS]' 
+    def __init__(self, start_lineno=None, end_lineno=None, lines=None, elements=None):
+        INPElementClass.__init__(self, start_lineno, end_lineno, lines)
+        self.section = self.__class__.__name__
+        self.inp_label = self.__class__.inp_label
+        self.fields = OrderedDict([('Name', str),
+                                   ('InletNode', str),
+                                   ('OutletNode', str),
+                                   ('OutflowHeight', float),
+                                   ('OutletType', str),
+                                   ('FunctionalCoeff', float),
+                                   ('FunctionalExponent', float),
+                                   ('CurveName', str),
+                                   ('FlapGate', str)])
+        self.subclasses = {'Tags' : False}
+        self.tag_type = 'Link'
+        self.defines = {'Name' : 'Link'}
+        self.references = {'InletNode' : 'Node', 'OutletNode' : 'Node', 'CurveName' : 'Curve'}
+        self.deleted_with = ['InletNode', 'OutletNode']
+    
+    def _parse_line(self, line):
+        line = line.split()
+        unmarked_desc = ''
+        fields = self.fields.keys()
+        if re.match('^FUNCTIONAL', line[fields.index('OutletType')]):
+            line.insert(fields.index('CurveName'), None)
+        elif re.match('^TABULAR', line[fields.index('OutletType')]):
+            line.insert(fields.index('FunctionalCoeff'), None)
+            line.insert(fields.index('FunctionalExponent'), None)
+        else:
+            raise self._unexpected_line_exc(line)
             
-            if start_lineno is not None and end_lineno is not None:
-                self.parse()
+        if len(line) != len(self.fields):
+            if len(line) > len(self.fields) and self.long_line_comment:
+                unmarked_desc = ' '.join(line[len(self.fields):]).strip()
+                line = line[:len(self.fields)]
+            else:
+                raise self._unexpected_line_exc(line)
 
-        def _parse_line(self, line):
-            line = line.split()
-            unmarked_desc = ''
-            if len(line) != len(self.fields):
-                if len(line) > len(self.fields) and self.long_line_comment:
-                    unmarked_desc = ' '.join(line[len(self.fields):]).strip()
-                    line = line[:len(self.fields)]
+        return line, unmarked_desc
+
+@ElementClasses.append
+class XSections(INPElementClass):
+    inp_label = '[XSECTIONS]'
+    def __init__(self, start_lineno=None, end_lineno=None, lines=None):
+        INPElementClass.__init__(self, start_lineno, end_lineno, lines)
+        self.section = self.__class__.__name__
+        self.inp_label = self.__class__.inp_label
+        self.fields = OrderedDict([('Name', str),
+                                   ('PipeShape', str),
+                                   ('Geom1', str),
+                                   ('Geom2', str),
+                                   ('Geom3', float),
+                                   ('Geom4', float),
+                                   ('Barrels', float),
+                                   ('CulvertCode', str)])
+        self.desc_field = 'XSectionsDescription'
+        self.references = {'Name' : 'Link',
+                           'Geom1' : ('PipeShape', {'IRREGULAR' : 'Transect'}, None),
+                           'Geom2' : ('PipeShape', {'CUSTOM' : 'Curve'}, None)}
+
+    def _parse_line(self, line):
+        line = line.split()
+        unmarked_desc = ''
+        if len(line) == len(self.fields):
+            try:
+                _ = [float(x) for x in line[:-3:-1]]
+            except:
+                if self.long_line_comment:
+                    unmarked_desc = ' '.join(line[-2:1]).strip()
+                    line = line[:-2]
+                    line.extend([None, None])
                 else:
                     raise self._unexpected_line_exc(line)
-            return line, unmarked_desc, None
-    
-    @element_classes.append
-    class Inflows(INPElementClass):
-        inp_label = '[INFLOWS]'
-        def __init__(self, start_lineno=None, end_lineno=None):
-            INPElementClass.__init__(self, start_lineno, end_lineno)
-            self.section = self.__class__.__name__
-            self.inp_label = self.__class__.inp_label
-            self.fields = OrderedDict([('Node', str),
-                                       ('Parameter', str),
-                                       ('TimeSeries', str),
-                                       ('ParameterType', str),
-                                       ('UnitsFactor', float),
-                                       ('ScaleFactor', float),
-                                       ('BaselineValue', float),
-                                       ('BaselinePattern', str)])
-            self.composite_name = ['Node', 'Parameter']
-            self.defaults = {}
-            for fieldname in self.fields.keys():
-                if fieldname not in self.composite_name:
-                    self.defaults[fieldname] = None
-            self.composite_class = 'NodeInflows'
-            self.desc_field = 'InflowsDescription'
-
-            if start_lineno is not None and end_lineno is not None:
-                self.parse()
-
-        def _parse_line(self, line):
-            line = line.split()
-            if len(line) != len(self.fields):
-                if len(line) == (len(self.fields) - 1):
-                    # baseline pattern is empty
-                    line.append(None)
-                elif len(line) == (len(self.fields) - 2):
-                    # baseline value and baseline pattern are empty
+        elif len(line) == len(self.fields) - 1:
+            if self.long_line_comment:
+                last_param = line[-1]
+                try:
+                    assert int(last_param) == float(last_param)
+                except:
+                    unmarked_desc = line[-1]
+                    line = line[:-1]
+            line.extend([None, None])
+        elif len(line) == len(self.fields) - 2:
+            line.extend([None, None])
+        elif len(line) > len(self.fields):
+            if self.long_line_comment:
+                penult_param = line[len(self.fields)-2]
+                try:
+                    assert float(penult_param) == int(penult_param)
+                except:
+                    unmarked_desc = ' '.join(line[len(self.fields)-2:]).strip()
+                    line = line[:len(self.fields)-2]
                     line.extend([None, None])
-                elif len(line) > len(self.fields) and self.long_line_comment:
-                    raise self._ambiguous_line_exc(line)
                 else:
-                    raise self._unexpected_line_exc(line)
-
-            return line, None, None
-
-    @element_classes.append
-    class DWF(INPElementClass):
-        inp_label = '[DWF]' 
-        def __init__(self, start_lineno=None, end_lineno=None):
-            INPElementClass.__init__(self, start_lineno, end_lineno)
-            self.section = self.__class__.__name__
-            self.inp_label = self.__class__.inp_label
-            self.fields = OrderedDict([('Node', str),
-                                       ('Parameter', str),
-                                       ('AvgValue', float),
-                                       ('DWFTimePattern1', str),
-                                       ('DWFTimePattern2', str),
-                                       ('DWFTimePattern3', str),
-                                       ('DWFTimePattern4', str)])
-            self.composite_name = ['Node', 'Parameter']
-            self.defaults = {}
-            for fieldname in self.fields.keys():
-                if fieldname not in self.composite_name:
-                    self.defaults[fieldname] = None
-            self.composite_class = 'NodeInflows'
-            self.desc_field = 'DWFDescription'
-
-            if start_lineno is not None and end_lineno is not None:
-                self.parse()
-
-        def _parse_line(self, line):
-            line = line.split()
-            if len(line) != len(self.fields):
-                if len(line) < len(self.fields):
-                    if len(line) >= len(self.fields) - 4:
-                        line.extend([None for j in range(len(self.fields) - len(line))])
-                    else:
-                        raise self._unexpected_line_exc(line)
-                elif len(line) > len(self.fields):
-                    if self.long_line_comment:
-                        raise self._ambiguous_line_exc(line)
-                    else:
-                        raise self._unexpected_line_exc(line)
-            return line, None, None
-
-    @element_classes.append
-    class RDII(INPElementClass):
-        inp_label = '[RDII]'
-        def __init__(self, start_lineno=None, end_lineno=None):
-            INPElementClass.__init__(self, start_lineno, end_lineno)
-            self.section = self.__class__.__name__
-            self.inp_label = self.__class__.inp_label
-            self.fields = OrderedDict([('Name', str),
-                                       ('UnitHydrograph', str),
-                                       ('SewerArea', float)])
-            self.desc_field = 'RDIIDescription'
-            self.defaults = {'UnitHydrograph' : None, 'SewerArea' : None}
+                    raise self._ambiguous_line_exc(line)
 
-            
-            if start_lineno is not None and end_lineno is not None:
-                self.parse()
+        return line, unmarked_desc
+
+@ElementClasses.append
+class Losses(INPElementClass):
+    inp_label = '[LOSSES]'
+    def __init__(self, start_lineno=None, end_lineno=None, lines=None):
+        INPElementClass.__init__(self, start_lineno, end_lineno, lines)
+        self.section = self.__class__.__name__
+        self.inp_label = self.__class__.inp_label
+        self.fields = OrderedDict([('Name', str),
+                                   ('EntryLoss', float),
+                                   ('ExitLoss', float),
+                                   ('AvgLoss', float),
+                                   ('FlapGate', str)])
+        self.desc_field = 'LossesDescription'
+        default_fields = self.fields.keys()
+        default_fields.remove(self.name_field)
+        self.defaults = dict([(field, None) for field in default_fields])
+        self.references = {'Name' : 'Link'}
+
+
+    def _parse_line(self, line):
+        line = line.split()
+        unmarked_desc = ''
+        if len(line) != len(self.fields):
+            if len(line) > len(self.fields):
+                unmarked_desc = ' '.join(line[len(self.fields):]).strip()
+                line = line[:len(self.fields)]
+            else:
+                raise self._unexpected_line_exc(line)
+        return line, unmarked_desc
+
+@ElementClasses.append
+class RainGages(INPElementClass):
+    inp_label = '[RAINGAGES]'
+    def __init__(self, start_lineno=None, end_lineno=None, lines=None):
+        INPElementClass.__init__(self, start_lineno, end_lineno, lines)
+        self.section = self.__class__.__name__
+        self.inp_label = self.__class__.inp_label
+        self.fields = OrderedDict([('Name', str), 
+                                   ('RainType', str), 
+                                   ('Interval', str), 
+                                   ('SnowCatch', float), 
+                                   ('Source', str), 
+                                   ('SourceName', str), 
+                                   ('StationID', str), 
+                                   ('Units', str)])
+        self.subclasses = {'Symbols' : False, 'Tags' : False}
+        self.tag_type = 'Gage'
+        self.md5_field = 'FileMD5'
+        self.files = {}
+        self.defines = {'Name' : 'Gage'}
+        self.references = {'SourceName' : ('Source', {'TIMESERIES' : 'TimeSeries'}, None)}
+
+    def _parse_line(self, line):
+        unmarked_desc = ''
+        original_line = line
+        line = line.split()
+        if line[self.fields.keys().index('Source')] == 'TIMESERIES':
+            # implies no gage number or units
+            num_fields_TIMESERIES = len(self.fields) - 2
+            if len(line) == num_fields_TIMESERIES:
+                line.extend([None, None])
+            elif len(line) > num_fields_TIMESERIES and self.long_line_comment:
+                unmarked_desc = ' '.join(line[num_fields_TIMESERIES:]).strip()
+                line = line[:num_fields_TIMESERIES]
+                line.extend([None, None])
+            else:
+                raise self._unexpected_line_exc(line)
+        else:
+            num_remaining_params_after_path = 2
+
+            start_of_fileref = 5
+            val = line[start_of_fileref]
+            has_quote = re.match('\'|"', val)
+            end_of_fileref = None
+            if has_quote:
+                quote_char = has_quote.group()
+                for i, val in enumerate(line[start_of_fileref:]):
+                    has_end_quote = re.search('\'|"$', val)
+                    if has_end_quote:
+                        end_of_fileref = start_of_fileref + i
+                        break
+                
+                if not end_of_fileref:
+                    raise Exception('The file reference on the following line is missing a quote: ' + str(line))
+                num_params_after_fileref = 2
+                del line[start_of_fileref:end_of_fileref + 1]
+                unsplit_fileref = '"' + original_line.split(quote_char)[1].strip() + '"'
+                line.insert(start_of_fileref, unsplit_fileref)
+            else:
+                line[start_of_fileref] = '"' + line[start_of_fileref] + '"'
 
-        def _parse_line(self, line):
-            unmarked_desc = ''
-            line = line.split()
-            if len(line) != len(self.fields):
-                if len(line) > len(self.fields) and self.long_line_comment:
-                    unmarked_desc = ' '.join(line[len(self.fields):]).strip()
+            if len(line) < len(self.fields):
+                raise self._unexpected_line_exc(original_line)
+            elif len(line) > len(self.fields):
+                if self.long_line_comment:
+                    unmarked_desc = ' '.join(line[len(self.fields):])
                     line = line[:len(self.fields)]
                 else:
                     raise self._unexpected_line_exc(line)
 
-            return line, unmarked_desc, None
-    
-    @element_classes.append
-    class Aquifers(INPElementClass):
-        inp_label = '[AQUIFERS]'
-        def __init__(self, start_lineno=None, end_lineno=None):
-            INPElementClass.__init__(self, start_lineno, end_lineno)
-            self.section = self.__class__.__name__
-            self.inp_label = self.__class__.inp_label
-            self.fields = OrderedDict([('Name', str),
-                                       ('Porosity', float),
-                                       ('WiltPoint', float),
-                                       ('FieldCapacity', float),
-                                       ('HydCon', float),
-                                       ('CondSlope', float),
-                                       ('TensionSlope', float),
-                                       ('UpperEvap', float),
-                                       ('LowerEvap', float),
-                                       ('LowerLoss', float),
-                                       ('BottomElev', float),
-                                       ('WaterTable', float),
-                                       ('UpperMoist', float)])
-            
+        return line, unmarked_desc
+
+    def get_support_file(self, name):
+        # the rainfall file of a FILE gage, see SupportFile
+        for element in self.elements:
+            if element[self.name_field] == name and element['Source'] == 'FILE':
+                return SupportFile(self._find_support_file(element['SourceName']), 'RAINFALL', element['StationID'])
+        raise Exception("Rain gage " + name + " isn't read from a file.")
+
+    def _read_support_file(self, params):
+        md5 = None
+        if params['Source'] == 'FILE' and self.require_support_files:
+            filepath = params['SourceName'].strip(' \t\n"\'')
+            if not os.path.exists(filepath):
+                filepath = os.path.join(os.path.dirname(self.inp_path), params['SourceName'].strip(' \t\n"'))
+
+            if not os.path.exists(filepath):
+                raise self._missing_file_exc(params['SourceName'])
+            elif os.path.exists(filepath):
+                params['SourceName'] = '"' + os.path.basename(filepath) + '"'
+                md5 = request_file_md5(filepath)
+                self.files[filepath] = md5
+
+        return md5
+
+@ElementClasses.append
+class Symbols(INPElementClass):
+    inp_label = '[SYMBOLS]'
+    def __init__(self, start_lineno=None, end_lineno=None, lines=None):
+        INPElementClass.__init__(self, start_lineno, end_lineno, lines)
             
-            if start_lineno is not None and end_lineno is not None:
-                self.parse()
+        self.section = self.__class__.__name__
+        self.inp_label = self.__class__.inp_label
+        self.fields = OrderedDict([('Name', str), 
+                                   ('XCoordinate', float), 
+                                   ('YCoordinate', float)])
+        self.desc_field = 'CoordinateDescription'
+        self.defaults = {'XCoordinate' : None, 'YCoordinate' : None}
+        self.references = {'Name' : 'Gage'}
+
+@ElementClasses.append
+class Pollutants(INPElementClass):
+    inp_label = '[POLLUTANTS]'
+    def __init__(self, start_lineno=None, end_lineno=None, lines=None):
+        INPElementClass.__init__(self, start_lineno, end_lineno, lines)
+        self.section = self.__class__.__name__
+        self.inp_label = self.__class__.inp_label
+        self.fields = OrderedDict([('Name', str),
+                                   ('MassUnits', str),
+                                   ('RainConcen', float),
+                                   ('GWConcen', float),
+                                   ('IIConcen', float),
+                                   ('DecayCoeff', float),
+                                   ('SnowOnly', str),
+                                   ('CoPollutant', str),
+                                   ('CoPollutantFraction', float),
+                                   ('DWFConcen', float)])
+        self.defines = {'Name' : 'Pollutant'}
+        self.references = {'CoPollutant' : 'Pollutant'}
+
+
+@ElementClasses.append
+class LandUses(INPElementClass):
+    inp_label = '[LANDUSES]'
+    def __init__(self, start_lineno=None, end_lineno=None, lines=None):
+        INPElementClass.__init__(self, start_lineno, end_lineno, lines)
+        self.section = self.__class__.__name__
+        self.inp_label = self.__class__.inp_label
+        self.fields = OrderedDict([('Name', str),
+                                   ('CleaningInterval', float),
+                                   ('Availability', float),
+                                   ('LastCleaned', float)])
+        self.defines = {'Name' : 'LandUse'}
+
+@ElementClasses.append
+class BuildUp(INPElementClass):
+    inp_label = '[BUILDUP]'
+    def __init__(self, start_lineno=None, end_lineno=None, lines=None):
+        INPElementClass.__init__(self, start_lineno, end_lineno, lines)
+        self.section = self.__class__.__name__
+        self.inp_label = self.__class__.inp_label 
+        self.fields = OrderedDict([('LandUse', str),
+                                   ('Pollutant', str),
+                                   ('Formula', str),
+                                   ('Coeff1', float),
+                                   ('Coeff2', float),
+                                   ('Coeff3', float),
+                                   ('TimeSeries', str),
+                                   ('Normalizer', str)])
+        self.composite_name = ['LandUse', 'Pollutant']
+        self.references = {'LandUse' : 'LandUse', 'Pollutant' : 'Pollutant', 'TimeSeries' : 'TimeSeries'}
+
+    def _parse_line(self, line):
+        line = line.split()
+        unmarked_desc = ''
+        fields = self.fields.keys()
+        timeseries_marker = line[fields.index('Coeff3')]
+        try:
+            dummy = float(timeseries_marker)
+        except:
+            line.insert(fields.index('Coeff3'), None)
+        else:
+            line.insert(fields.index('TimeSeries'), None)
 
-        def _parse_line(self, line):
-            unmarked_desc = ''
-            line = line.split()
-            if len(line) != len(self.fields):
-                if len(line) > len(self.fields) and self.long_line_comment:
-                    unmarked_desc = ' '.join(line[len(self.fields):]).strip()
-                    line = line[:len(self.fields)]
+        if len(line) != len(self.fields):
+            if len(line) > len(self.fields) and self.long_line_comment:
+                unmarked_desc = ' '.join(line[len(self.fields):]).strip()
+                line = line[:len(self.fields)]
+            else:
+                raise self._unexpected_line_exc(line)
+        return line, unmarked_desc
+
+@ElementClasses.append
+class WashOff(INPElementClass):
+    inp_label = '[WASHOFF]'
+    def __init__(self, start_lineno=None, end_lineno=None, lines=None):
+        INPElementClass.__init__(self, start_lineno, end_lineno, lines)
+        self.section = self.__class__.__name__
+        self.inp_label = self.__class__.inp_label
+        self.fields = OrderedDict([('LandUse', str),
+                                   ('Pollutant', str),
+                                   ('Formula', str),
+                                   ('Coeff1', float),
+                                   ('Coeff2', float),
+                                   ('CleaningEfficiency', float),
+                                   ('BMPEfficiency', float)])
+        self.composite_name = ['LandUse', 'Pollutant']
+        self.references = {'LandUse' : 'LandUse', 'Pollutant' : 'Pollutant'}
+
+@ElementClasses.append
+class Inflows(INPElementClass):
+    inp_label = '[INFLOWS]'
+    def __init__(self, start_lineno=None, end_lineno=None, lines=None):
+        INPElementClass.__init__(self, start_lineno, end_lineno, lines)
+        self.section = self.__class__.__name__
+        self.inp_label = self.__class__.inp_label
+        self.fields = OrderedDict([('Node', str),
+                                   ('Parameter', str),
+                                   ('TimeSeries', str),
+                                   ('ParameterType', str),
+                                   ('UnitsFactor', float),
+                                   ('ScaleFactor', float),
+                                   ('BaselineValue', float),
+                                   ('BaselinePattern', str)])
+        self.composite_name = ['Node', 'Parameter']
+        self.defaults = {}
+        for fieldname in self.fields.keys():
+            if fieldname not in self.composite_name:
+                self.defaults[fieldname] = None
+        self.composite_class = 'NodeInflows'
+        self.desc_field = 'InflowsDescription'
+        self.references = {'Node' : 'Node',
+                           'Parameter' : ('Parameter', {'FLOW' : None}, 'Pollutant'),
+                           'TimeSeries' : 'TimeSeries',
+                           'BaselinePattern' : 'Pattern'}
+
+    def _parse_line(self, line):
+        line = line.split()
+        if len(line) != len(self.fields):
+            if len(line) == (len(self.fields) - 1):
+                # baseline pattern is empty
+                line.append(None)
+            elif len(line) == (len(self.fields) - 2):
+                # baseline value and baseline pattern are empty
+                line.extend([None, None])
+            elif len(line) > len(self.fields) and self.long_line_comment:
+                raise self._ambiguous_line_exc(line)
+            else:
+                raise self._unexpected_line_exc(line)
+
+        return line, None
+
+@ElementClasses.append
+class DWF(INPElementClass):
+    inp_label = '[DWF]' 
+    def __init__(self, start_lineno=None, end_lineno=None, lines=None):
+        INPElementClass.__init__(self, start_lineno, end_lineno, lines)
+        self.section = self.__class__.__name__
+        self.inp_label = self.__class__.inp_label
+        self.fields = OrderedDict([('Node', str),
+                                   ('Parameter', str),
+                                   ('AvgValue', float),
+                                   ('DWFTimePattern1', str),
+                                   ('DWFTimePattern2', str),
+                                   ('DWFTimePattern3', str),
+                                   ('DWFTimePattern4', str)])
+        self.composite_name = ['Node', 'Parameter']
+        self.defaults = {}
+        for fieldname in self.fields.keys():
+            if fieldname not in self.composite_name:
+                self.defaults[fieldname] = None
+        self.composite_class = 'NodeInflows'
+        self.desc_field = 'DWFDescription'
+        self.references = {'Node' : 'Node',
+                           'Parameter' : ('Parameter', {'FLOW' : None}, 'Pollutant'),
+                           'DWFTimePattern1' : 'Pattern',
+                           'DWFTimePattern2' : 'Pattern',
+                           'DWFTimePattern3' : 'Pattern',
+                           'DWFTimePattern4' : 'Pattern'}
+
+    def _parse_line(self, line):
+        line = line.split()
+        if len(line) != len(self.fields):
+            if len(line) < len(self.fields):
+                if len(line) >= len(self.fields) - 4:
+                    line.extend([None for j in range(len(self.fields) - len(line))])
                 else:
                     raise self._unexpected_line_exc(line)
-
-            return line, unmarked_desc, None
-    
-    @element_classes.append
-    class Subcatchments(INPElementClass):
-        inp_label = '[SUBCATCHMENTS]'
-        def __init__(self, start_lineno=None, end_lineno=None):
-            INPElementClass.__init__(self, start_lineno, end_lineno)
-            self.section = self.__class__.__name__
-            self.inp_label = self.__class__.inp_label
-            self.fields = OrderedDict([('Name', str), 
-                                       ('Raingage', str),
-                                       ('Outlet', str),
-                                       ('Area', float),
-                                       ('PctImperv', float),
-                                       ('Width', float),
-                                       ('PctSlope', float),
-                                       ('CurbLength', float),
-                                       ('SnowPack', str)])
-            self.subclasses = {'Subareas' : True, 'Groundwater' : False, 'Infiltration' : True, 'Tags' : False}
-            self.tag_type = 'Subcatch'
-
-            if start_lineno is not None and end_lineno is not None:
-                self.parse()
-
-        def _parse_line(self, line):
-            line = line.split()
-            num_fields_NoSnowPack = len(self.fields) - 1
-            if len(line) != len(self.fields):
-                if len(line) == num_fields_NoSnowPack:
-                    line.append(None)
-                elif len(line) > len(self.fields) and self.long_line_comment:
+            elif len(line) > len(self.fields):
+                if self.long_line_comment:
                     raise self._ambiguous_line_exc(line)
                 else:
                     raise self._unexpected_line_exc(line)
-            
-            return line, None, None
-    
-    @element_classes.append
-    class Subareas(INPElementClass):
-        inp_label = '[SUBAREAS]'
-        def __init__(self, start_lineno=None, end_lineno=None):
-            INPElementClass.__init__(self, start_lineno, end_lineno)
-            self.section = self.__class__.__name__
-            self.inp_label = self.__class__.inp_label
-            self.fields = OrderedDict([('Name', str),
-                                       ('NImperv', float),
-                                       ('NPerv', float),
-                                       ('SImperv', float),
-                                       ('SPerv', float),
-                                       ('PctZero', float),
-                                       ('RouteTo', str),
-                                       ('PctRouted', float)])
-            self.desc_field = 'SubareasDescription'
-
-            if start_lineno and end_lineno:
-                self.parse()
+        return line, None
+
+@ElementClasses.append
+class RDII(INPElementClass):
+    inp_label = '[RDII]'
+    def __init__(self, start_lineno=None, end_lineno=None, lines=None):
+        INPElementClass.__init__(self, start_lineno, end_lineno, lines)
+        self.section = self.__class__.__name__
+        self.inp_label = self.__class__.inp_label
+        self.fields = OrderedDict([('Name', str),
+                                   ('UnitHydrograph', str),
+                                   ('SewerArea', float)])
+        self.desc_field = 'RDIIDescription'
+        self.defaults = {'UnitHydrograph' : None, 'SewerArea' : None}
+        self.references = {'Name' : 'Node', 'UnitHydrograph' : 'UnitHydrograph'}
+        self.deleted_with = ['UnitHydrograph']
+
+
+@ElementClasses.append
+class Aquifers(INPElementClass):
+    inp_label = '[AQUIFERS]'
+    def __init__(self, start_lineno=None, end_lineno=None, lines=None):
+        INPElementClass.__init__(self, start_lineno, end_lineno, lines)
+        self.section = self.__class__.__name__
+        self.inp_label = self.__class__.inp_label
+        self.fields = OrderedDict([('Name', str),
+                                   ('Porosity', float),
+                                   ('WiltPoint', float),
+                                   ('FieldCapacity', float),
+                                   ('HydCon', float),
+                                   ('CondSlope', float),
+                                   ('TensionSlope', float),
+                                   ('UpperEvap', float),
+                                   ('LowerEvap', float),
+                                   ('LowerLoss', float),
+                                   ('BottomElev', float),
+                                   ('WaterTable', float),
+                                   ('UpperMoist', float)])
+        self.defines = {'Name' : 'Aquifer'}
+        
 
-        def _parse_line(self, line):
-            num_fields_NoPctRouted = len(self.fields) - 1
-            line = line.split()
-            unmarked_desc = ''
-            if len(line) != len(self.fields):
-                if len(line) == num_fields_NoPctRouted:
-                    line.append(None)
-                elif len(line) > len(self.fields) and self.long_line_comment:
-                    last_param = line[len(self.fields)-1]
-                    try:
-                        last_param = float(last_param)
-                        assert last_param <= 100 and last_param >= 0
-                    except:
-                        unmarked_desc = ' '.join(line[num_fields_NoPctRouted:]).strip()
-                        line = line[:num_fields_NoPctRouted]
-                        line.append(None)
-                    else:
-                        unmarked_desc = ' '.join(line[len(self.fields):]).strip()
-                        line = line[:len(self.fields)]
-                else:
-                    raise self._unexpected_line_exc(line)
-            elif self.long_line_comment:
+@ElementClasses.append
+class Subcatchments(INPElementClass):
+    inp_label = '[SUBCATCHMENTS]'
+    def __init__(self, start_lineno=None, end_lineno=None, lines=None):
+        INPElementClass.__init__(self, start_lineno, end_lineno, lines)
+        self.section = self.__class__.__name__
+        self.inp_label = self.__class__.inp_label
+        self.fields = OrderedDict([('Name', str), 
+                                   ('Raingage', str),
+                                   ('Outlet', str),
+                                   ('Area', float),
+                                   ('PctImperv', float),
+                                   ('Width', float),
+                                   ('PctSlope', float),
+                                   ('CurbLength', float),
+                                   ('SnowPack', str)])
+        self.subclasses = {'Subareas' : True, 'Groundwater' : False, 'Infiltration' : True, 'Tags' : False}
+        self.tag_type = 'Subcatch'
+        self.defines = {'Name' : 'Subcatch'}
+        self.references = {'Raingage' : 'Gage', 'Outlet' : ['Node', 'Subcatch'], 'SnowPack' : 'SnowPack'}
+
+    def _parse_line(self, line):
+        line = line.split()
+        num_fields_NoSnowPack = len(self.fields) - 1
+        if len(line) != len(self.fields):
+            if len(line) == num_fields_NoSnowPack:
+                line.append(None)
+            elif len(line) > len(self.fields) and self.long_line_comment:
+                raise self._ambiguous_line_exc(line)
+            else:
+                raise self._unexpected_line_exc(line)
+        
+        return line, None
+
+@ElementClasses.append
+class Subareas(INPElementClass):
+    inp_label = '[SUBAREAS]'
+    def __init__(self, start_lineno=None, end_lineno=None, lines=None):
+        INPElementClass.__init__(self, start_lineno, end_lineno, lines)
+        self.section = self.__class__.__name__
+        self.inp_label = self.__class__.inp_label
+        self.fields = OrderedDict([('Name', str),
+                                   ('NImperv', float),
+                                   ('NPerv', float),
+                                   ('SImperv', float),
+                                   ('SPerv', float),
+                                   ('PctZero', float),
+                                   ('RouteTo', str),
+                                   ('PctRouted', float)])
+        self.desc_field = 'SubareasDescription'
+        self.references = {'Name' : 'Subcatch'}
+
+    def _parse_line(self, line):
+        num_fields_NoPctRouted = len(self.fields) - 1
+        line = line.split()
+        unmarked_desc = ''
+        if len(line) != len(self.fields):
+            if len(line) == num_fields_NoPctRouted:
+                line.append(None)
+            elif len(line) > len(self.fields) and self.long_line_comment:
+                last_param = line[len(self.fields)-1]
                 try:
-                    last_param = float(line[-1])
+                    last_param = float(last_param)
                     assert last_param <= 100 and last_param >= 0
                 except:
-                    unmarked_desc = line[-1]
-                    line = line[:-1]
+                    unmarked_desc = ' '.join(line[num_fields_NoPctRouted:]).strip()
+                    line = line[:num_fields_NoPctRouted]
                     line.append(None)
-
-            return line, unmarked_desc, None
-
-
-    @element_classes.append
-    class Infiltration(INPElementClass):
-        inp_label = '[INFILTRATION]'
-        def __init__(self, start_lineno=None, end_lineno=None):
-            INPElementClass.__init__(self, start_lineno, end_lineno)
-            self.section = self.__class__.__name__
-            self.inp_label = self.__class__.inp_label
-            self.greenampt_fields = OrderedDict([('SuctionHead', float),
-                                                 ('HydCon', float),
-                                                 ('IMDmax', float)])
-            self.horton_fields = OrderedDict([('MaxRate', float),
-                                              ('MinRate', float),
-                                              ('Decay', float),
-                                              ('DryTime', float),
-                                              ('MaxInfil', float)])
-
-            self.fields = OrderedDict([('Name', str)] + self.greenampt_fields.items() + self.horton_fields.items())
-            self.desc_field = 'InfiltrationDescription'
-            self.defaults = dict([(field, None) for field in self.fields])
-
-            if start_lineno is not None and end_lineno is not None:
-                self.parse()
-
-        def _parse_line(self, line):
-            unmarked_desc = ''
-            line = line.split()
-            if len(line) < len(self.horton_fields):
-                primary_fields = self.greenampt_fields
-                secondary_fields = self.horton_fields
-            else:
-                primary_fields = self.horton_fields
-                secondary_fields = self.greenampt_fields
-                for i in range(1, 6):
-                    try:
-                        _ = float(line[i])
-                    except:
-                        primary_fields = self.greenampt_fields
-                        secondary_fields = self.horton_fields
-
-            primary_length = len(primary_fields) + 1 # fields plus name field
-            if len(line) != primary_length:
-                if len(line) > primary_length and self.long_line_comment:
-                    unmarked_desc = ' '.join(line[primary_length:]).strip()
-                    line = line[:primary_length]
                 else:
-                    raise self._unexpected_line_exc(line)
-
-            defaults = [None for field in secondary_fields.keys()]
-            if primary_fields == self.greenampt_fields:
-                line = line + defaults
+                    unmarked_desc = ' '.join(line[len(self.fields):]).strip()
+                    line = line[:len(self.fields)]
             else:
-                line = line[:1] + defaults + line[1:]
-
-            return line, unmarked_desc, None
-
-    @element_classes.append
-    class Groundwater(INPElementClass):
-        inp_label = '[GROUNDWATER]'
-        def __init__(self, start_lineno=None, end_lineno=None):
-            INPElementClass.__init__(self, start_lineno, end_lineno)
-            self.section = self.__class__.__name__
-            self.inp_label = self.__class__.inp_label
-            self.fields = OrderedDict([('Name', str),
-                                       ('Aquifer', str),
-                                       ('GWReceivingNode', str),
-                                       ('GWSurfaceElev', float),
-                                       ('GWFlowCoeff', float),
-                                       ('GWFlowExpon', float),
-                                       ('SWFlowCoeff', float),
-                                       ('SWFlowExpon', float),
-                                       ('SWGWInteractionCoeff', float),
-                                       ('SWFixedDepth', float),
-                                       ('GWThresholdElevation', float)])
-            self.desc_field = 'GWDescription'
-            default_fields = self.fields.keys()
-            default_fields.remove(self.name_field)
-            self.defaults = dict([(field, None) for field in default_fields])
-
-            
-            if start_lineno is not None and end_lineno is not None:
-                self.parse()
+                raise self._unexpected_line_exc(line)
+        elif self.long_line_comment:
+            try:
+                last_param = float(line[-1])
+                assert last_param <= 100 and last_param >= 0
+            except:
+                unmarked_desc = line[-1]
+                line = line[:-1]
+                line.append(None)
+
+        return line, unmarked_desc
+
+
+@ElementClasses.append
+class Infiltration(INPElementClass):
+    inp_label = '[INFILTRATION]'
+    def __init__(self, start_lineno=None, end_lineno=None, lines=None):
+        INPElementClass.__init__(self, start_lineno, end_lineno, lines)
+        self.section = self.__class__.__name__
+        self.inp_label = self.__class__.inp_label
+        self.greenampt_fields = OrderedDict([('SuctionHead', float),
+                                             ('HydCon', float),
+                                             ('IMDmax', float)])
+        self.horton_fields = OrderedDict([('MaxRate', float),
+                                          ('MinRate', float),
+                                          ('Decay', float),
+                                          ('DryTime', float),
+                                          ('MaxInfil', float)])
+
+        self.fields = OrderedDict([('Name', str)] + self.greenampt_fields.items() + self.horton_fields.items())
+        self.desc_field = 'InfiltrationDescription'
+        self.defaults = dict([(field, None) for field in self.fields])
+        self.references = {'Name' : 'Subcatch'}
+
+    def _parse_line(self, line):
+        unmarked_desc = ''
+        line = line.split()
+        if len(line) < len(self.horton_fields):
+            primary_fields = self.greenampt_fields
+            secondary_fields = self.horton_fields
+        else:
+            primary_fields = self.horton_fields
+            secondary_fields = self.greenampt_fields
+            for i in range(1, 6):
+                try:
+                    _ = float(line[i])
+                except:
+                    primary_fields = self.greenampt_fields
+                    secondary_fields = self.horton_fields
+
+        primary_length = len(primary_fields) + 1 # fields plus name field
+        if len(line) != primary_length:
+            if len(line) > primary_length and self.long_line_comment:
+                unmarked_desc = ' '.join(line[primary_length:]).strip()
+                line = line[:primary_length]
+            else:
+                raise self._unexpected_line_exc(line)
 
-        def _parse_line(self, line):
-            num_fields_NoElev = len(self.fields) - 1
-            line = line.split()
-            unmarked_desc = ''
-            if len(line) != len(self.fields):
-                if len(line) == (num_fields_NoElev):
-                    line.append(None)
-                elif len(line) > len(self.fields) and self.long_line_comment:
-                    last_param = line[len(self.fields)-1]
-                    try:
-                        _ = float(last_param)
-                    except:
-                        unmarked_desc = ' '.join(line[num_fields_NoElev:]).strip()
-                        line = line[:num_fields_NoElev]
-                        line.append(None)
-                    else:
-                        unmarked_desc = ' '.join(line[len(self.fields):]).strip()
-                        line = line[:len(self.fields)]
-                else:
-                    raise self._unexpected_line_exc(line)
-            elif self.long_line_comment:
+        defaults = [None for field in secondary_fields.keys()]
+        if primary_fields == self.greenampt_fields:
+            line = line + defaults
+        else:
+            line = line[:1] + defaults + line[1:]
+
+        return line, unmarked_desc
+
+@ElementClasses.append
+class Groundwater(INPElementClass):
+    inp_label = '[GROUNDWATER]'
+    def __init__(self, start_lineno=None, end_lineno=None, lines=None):
+        INPElementClass.__init__(self, start_lineno, end_lineno, lines)
+        self.section = self.__class__.__name__
+        self.inp_label = self.__class__.inp_label
+        self.fields = OrderedDict([('Name', str),
+                                   ('Aquifer', str),
+                                   ('GWReceivingNode', str),
+                                   ('GWSurfaceElev', float),
+                                   ('GWFlowCoeff', float),
+                                   ('GWFlowExpon', float),
+                                   ('SWFlowCoeff', float),
+                                   ('SWFlowExpon', float),
+                                   ('SWGWInteractionCoeff', float),
+                                   ('SWFixedDepth', float),
+                                   ('GWThresholdElevation', float)])
+        self.desc_field = 'GWDescription'
+        default_fields = self.fields.keys()
+        default_fields.remove(self.name_field)
+        self.defaults = dict([(field, None) for field in default_fields])
+        self.references = {'Name' : 'Subcatch', 'Aquifer' : 'Aquifer', 'GWReceivingNode' : 'Node'}
+
+
+    def _parse_line(self, line):
+        num_fields_NoElev = len(self.fields) - 1
+        line = line.split()
+        unmarked_desc = ''
+        if len(line) != len(self.fields):
+            if len(line) == (num_fields_NoElev):
+                line.append(None)
+            elif len(line) > len(self.fields) and self.long_line_comment:
+                last_param = line[len(self.fields)-1]
                 try:
-                    last_param = float(line[-1])
+                    _ = float(last_param)
                 except:
-                    unmarked_desc = line[-1]
-                    line = line[:-1]
+                    unmarked_desc = ' '.join(line[num_fields_NoElev:]).strip()
+                    line = line[:num_fields_NoElev]
                     line.append(None)
-
-            return line, unmarked_desc, None
-
-    @element_classes.append
-    class Coverages(INPElementClass):
-        inp_label = '[COVERAGES]'
-        def __init__(self, start_lineno=None, end_lineno=None):
-            INPElementClass.__init__(self, start_lineno, end_lineno)
-            self.section = self.__class__.__name__
-            self.inp_label = self.__class__.inp_label
-            self.fields = OrderedDict([('Subcatchment', str),
-                                       ('LandUse', str),
-                                       ('PercentArea', float)])
-            self.composite_name = ['Subcatchment', 'LandUse']
-
-            if start_lineno is not None and end_lineno is not None:
-                self.parse()
-            
-        def _parse_line(self, line):
-            line = line.split()
-            unmarked_desc = ''
-            if len(line) != len(self.fields):
-                if len(line) > len(self.fields) and self.long_line_comment:
-                    unmarked_desc = ' '.join(line[len(self.fields):]).strip()
-                    line = line[:len(self.fields)]
                 else:
-                    raise self._unexpected_line_exc(line)
-            return line, unmarked_desc, None
-
-    @element_classes.append
-    class Loadings(INPElementClass):
-        inp_label = '[LOADINGS]'
-        def __init__(self, start_lineno=None, end_lineno=None):
-            INPElementClass.__init__(self, start_lineno, end_lineno)
-            self.section = self.__class__.__name__
-            self.inp_label = self.__class__.inp_label
-            self.fields = OrderedDict([('Subcatchment', str),
-                                       ('Pollutant', str),
-                                       ('Loading', float)])
-            self.composite_name = ['Subcatchment', 'Pollutant']
-            
-            if start_lineno is not None and end_lineno is not None:
-                self.parse()
-
-        def _parse_line(self, line):
-            unmarked_desc = ''
-            line = line.split()
-            if len(line) != len(self.fields):
-                if len(line) > len(self.fields) and self.long_line_comment:
                     unmarked_desc = ' '.join(line[len(self.fields):]).strip()
                     line = line[:len(self.fields)]
-                else:
-                    raise self._unexpected_line_exc(line)
-
-            return line, unmarked_desc, None
-
-    @element_classes.append
-    class Treatments(INPElementClass):
-        inp_label = '[TREATMENT]'
-        def __init__(self, start_lineno=None, end_lineno=None):
-            INPElementClass.__init__(self, start_lineno, end_lineno)
-            self.section = self.__class__.__name__
-            self.inp_label = self.__class__.inp_label
-            self.fields = OrderedDict([('Node', str),
-                                       ('Pollutant', str),
-                                       ('Formula', str)])
-            self.composite_name = ['Node', 'Pollutant']
-
-            if start_lineno is not None and end_lineno is not None:
-                self.parse()
-
-        def _parse_line(self, line):
-            line = line.split(None, 2)
-            if len(line) != len(self.fields):
+            else:
                 raise self._unexpected_line_exc(line)
-            line[2] = line[2].strip()
-
-            return line, None, None
-
-    @element_classes.append
-    class Vertices(INPElementClass):
-        inp_label = '[VERTICES]'
-        def __init__(self, start_lineno=None, end_lineno=None):
-            INPElementClass.__init__(self, start_lineno, end_lineno)
-            self.section = self.__class__.__name__
-            self.inp_label = self.__class__.inp_label
-            self.fields = OrderedDict([('Link', str),
-                                       ('XCoordinate', float),
-                                       ('YCoordinate', float)])
-            
-            self.ordinal_field = 'Ordinal'
-            self.composite_name = ['Link', 'Ordinal']
-            self.inp_grouping = 'Link'
-            
-            if start_lineno is not None and end_lineno is not None:
-                self.parse()
-
-        def parse(self):
-            prev_link = ""
-            past_header = False
-            element_desc = ''
-            for i in range(self.start_lineno, self.end_lineno):
-                line = self.getline(i)
-                if (re.match(self.pats['header'], line) and not past_header) or re.match(self.pats['blank_or_tag'], line):
-                    continue
-                else:
-                    past_header = True
-                    if re.match(self.pats['desc'], line):
-                        line = line.strip(self.pats['desc_whitespace'])
-                        element_desc = line if not element_desc else element_desc + '\n' + line
-                        continue
-                    else:
-                        line_descs = {'marked' : '', 'unmarked' : ''}
-
-                        if re.search(self.pats['semicolon'], line):
-                            line, line_descs['marked'] = re.split(self.pats['adj_semicolons'], line, maxsplit=1)
-                            line_descs['marked'] = line_descs['marked'].strip(self.pats['desc_whitespace'])
-
-                        line = line.split()
-                        if len(line) != len(self.fields):
-                            if len(line) > len(self.fields) and self.long_line_comment:
-                                line_descs['unmarked'] = ' '.join(line[len(self.fields):]).strip()
-                                line = line[:len(self.fields)]
-                            else:
-                                raise self._unexpected_line_exc(line)
-
-                        if all(line_descs.values()):
-                            line_desc = ' ; '.join([line_descs['unmarked'], line_descs['marked']])
-                        elif line_descs['marked']:
-                            line_desc = line_descs['marked']
-                        elif line_descs['unmarked']:
-                            line_desc = line_descs['unmarked']
-                        else:
-                            line_desc = ''
-
-                        if line_desc:
-                            element_desc = line_desc if not element_desc else '\n'.join([element_desc, line_desc])
-
-                        line = [self.fields.values()[j](value) if value else value for j, value in enumerate(line)]
-                        params = dict(zip(self.fields.keys(), line))
-                        current_link = params['Link']
-                        if current_link != prev_link:
-                            coord_ordinal = 1
-                        else:
-                            coord_ordinal = coord_ordinal + 1
-                        params[self.ordinal_field] = coord_ordinal
-                        params[self.name_field] = ':'.join([str(params[field]) for field in self.composite_name])
-                        element_desc = element_desc.replace('\\n', '\n') 
-                        params[self.desc_field] = element_desc
-                        element_desc = ''
-                        prev_link = current_link
-                        self.elements.append(params)
-
-    @element_classes.append
-    class PolygonPoints(INPElementClass):
-        inp_label = '[POLYGONS]'
-        def __init__(self, start_lineno=None, end_lineno=None):
-            INPElementClass.__init__(self, start_lineno, end_lineno)
-            self.section = self.__class__.__name__
-            self.inp_label = self.__class__.inp_label
-            self.fields = OrderedDict([('Subcatchment', str),
-                                       ('XCoordinate', float),
-                                       ('YCoordinate', float)])
-
-            self.ordinal_field = 'Ordinal'
-            self.composite_name = ['Subcatchment', self.ordinal_field]
-            self.inp_grouping = 'Subcatchment'
-            self.sort_by = ['Subcatchment']
-            
-            if start_lineno is not None and end_lineno is not None:
-                self.parse()
-
-        def parse(self):
-            prev_catch = ""
-            past_header = False
-            element_desc = ''
-            for i in range(self.start_lineno, self.end_lineno):
-                line = self.getline(i)
-                if (re.match(self.pats['header'], line) and not past_header) or re.match(self.pats['blank_or_tag'], line):
-                    continue
-                else:
-                    past_header = True
-                    if re.match(self.pats['desc'], line):
-                        desc = line.strip(self.pats['desc_whitespace'])
-                        element_desc = desc if not element_desc else '\n'.join([element_desc, desc])
-                        continue
-                    else:
-                        line_descs = {'marked' : '', 'unmarked' : ''}
-                        if re.search(self.pats['semicolon'], line):
-                            line, line_descs['marked'] = re.split(self.pats['adj_semicolons'], line, maxsplit=1)
-                            line_descs['marked'] = line_descs['marked'].strip(self.pats['desc_whitespace'])
-
-                        line = line.split()
-
-                        if len(line) != len(self.fields):
-                            if len(line) > len(self.fields) and self.long_line_comment:
-                                line_descs['unmarked'] = ' '.join(line[len(self.fields):]).strip()
-                                line = line[:len(self.fields)]
-                            else:
-                                raise self._unexpected_line_exc(self.section, line)
-
-                        if all(line_descs.values()):
-                            line_desc = ' ; '.join([line_descs['unmarked'], line_descs['marked']])
-                        elif line_descs['marked']:
-                            line_desc = line_descs['marked']
-                        elif line_descs['unmarked']:
-                            line_desc = line_descs['unmarked']
-                        else:
-                            line_desc = ''
+        elif self.long_line_comment:
+            try:
+                last_param = float(line[-1])
+            except:
+                unmarked_desc = line[-1]
+                line = line[:-1]
+                line.append(None)
+
+        return line, unmarked_desc
+
+@ElementClasses.append
+class Coverages(INPElementClass):
+    inp_label = '[COVERAGES]'
+    def __init__(self, start_lineno=None, end_lineno=None, lines=None):
+        INPElementClass.__init__(self, start_lineno, end_lineno, lines)
+        self.section = self.__class__.__name__
+        self.inp_label = self.__class__.inp_label
+        self.fields = OrderedDict([('Subcatchment', str),
+                                   ('LandUse', str),
+                                   ('PercentArea', float)])
+        self.composite_name = ['Subcatchment', 'LandUse']
+        self.references = {'Subcatchment' : 'Subcatch', 'LandUse' : 'LandUse'}
+
+@ElementClasses.append
+class Loadings(INPElementClass):
+    inp_label = '[LOADINGS]'
+    def __init__(self, start_lineno=None, end_lineno=None, lines=None):
+        INPElementClass.__init__(self, start_lineno, end_lineno, lines)
+        self.section = self.__class__.__name__
+        self.inp_label = self.__class__.inp_label
+        self.fields = OrderedDict([('Subcatchment', str),
+                                   ('Pollutant', str),
+                                   ('Loading', float)])
+        self.composite_name = ['Subcatchment', 'Pollutant']
+        self.references = {'Subcatchment' : 'Subcatch', 'Pollutant' : 'Pollutant'}
+
+@ElementClasses.append
+class Treatments(INPElementClass):
+    inp_label = '[TREATMENT]'
+    def __init__(self, start_lineno=None, end_lineno=None, lines=None):
+        INPElementClass.__init__(self, start_lineno, end_lineno, lines)
+        self.section = self.__class__.__name__
+        self.inp_label = self.__class__.inp_label
+        self.fields = OrderedDict([('Node', str),
+                                   ('Pollutant', str),
+                                   ('Formula', str)])
+        self.composite_name = ['Node', 'Pollutant']
+        self.references = {'Node' : 'Node', 'Pollutant' : 'Pollutant'}
+
+    def _parse_line(self, line):
+        line = line.split(None, 2)
+        if len(line) != len(self.fields):
+            raise self._unexpected_line_exc(line)
+        line[2] = line[2].strip()
+
+        return line, None
+
+@ElementClasses.append
+class Vertices(INPElementClass):
+    inp_label = '[VERTICES]'
+    def __init__(self, start_lineno=None, end_lineno=None, lines=None):
+        INPElementClass.__init__(self, start_lineno, end_lineno, lines)
+        self.section = self.__class__.__name__
+        self.inp_label = self.__class__.inp_label
+        self.fields = OrderedDict([('Link', str),
+                                   ('XCoordinate', float),
+                                   ('YCoordinate', float)])
+        
+        self.ordinal_field = 'Ordinal'
+        self.composite_name = ['Link', 'Ordinal']
+        self.inp_grouping = 'Link'
+        self.references = {'Link' : 'Link'}
+
+    def parse(self):
+        prev_link = ""
+        decoder = self.get_row_decoder()
+        for line, element_desc, lineno in self.tokenize():
+            params = decoder.decode(line)
+            current_link = params['Link']
+            if current_link != prev_link:
+                coord_ordinal = 1
+            else:
+                coord_ordinal = coord_ordinal + 1
+            params[self.ordinal_field] = coord_ordinal
+            params[self.name_field] = decoder.get_name(params)
+            params[self.desc_field] = element_desc.replace('\\n', '\n')
+            prev_link = current_link
+            self.append_parsed(params)
+
+@ElementClasses.append
+class PolygonPoints(INPElementClass):
+    inp_label = '[POLYGONS]'
+    def __init__(self, start_lineno=None, end_lineno=None, lines=None):
+        INPElementClass.__init__(self, start_lineno, end_lineno, lines)
+        self.section = self.__class__.__name__
+        self.inp_label = self.__class__.inp_label
+        self.fields = OrderedDict([('Subcatchment', str),
+                                   ('XCoordinate', float),
+                                   ('YCoordinate', float)])
+
+        self.ordinal_field = 'Ordinal'
+        self.composite_name = ['Subcatchment', self.ordinal_field]
+        self.inp_grouping = 'Subcatchment'
+        self.sort_by = ['Subcatchment']
+        self.references = {'Subcatchment' : 'Subcatch'}
+
+    def parse(self):
+        prev_catch = ""
+        decoder = self.get_row_decoder()
+        for line, element_desc, lineno in self.tokenize():
+            params = decoder.decode(line)
+            params[self.desc_field] = element_desc.replace('\\n', '\n')
+            current_catch = params['Subcatchment']
+            if current_catch != prev_catch:
+                coord_ordinal = 1
+            else:
+                coord_ordinal = coord_ordinal + 1
+            params[self.ordinal_field] = coord_ordinal
+            params[self.name_field] = decoder.get_name(params)
+            prev_catch = current_catch
+            self.append_parsed(params)
+
+@ElementClasses.append
+class Tags(INPElementClass):
+    inp_label = '[TAGS]'
+    def __init__(self, start_lineno=None, end_lineno=None, lines=None):
+        INPElementClass.__init__(self, start_lineno, end_lineno, lines)
+        self.section = self.__class__.__name__
+        self.inp_label = self.__class__.inp_label
+        self.fields = OrderedDict([('TagType', str), ('Name', str), ('Tag',  str)])
+        self.defaults = {'TagType' : None, 'Name' : None, 'Tag' : None}
+        self.desc_field = None
+        self.sort_by = ['TagType']
+        self.references = {'Name' : ('TagType', {'Node' : 'Node', 'Link' : 'Link', 'Subcatch' : 'Subcatch', 'Gage' : 'Gage'}, None)}
+
+    def parse(self):
+        decoder = self.get_row_decoder()
+        for i in range(self.start_lineno, self.end_lineno):
+            line = self.getline(i)
+            if self.is_comment_or_blank(line):
+                continue
+            else:
+                line = line.split(None, 2)
+                if len(line) != len(self.fields): 
+                    raise self._unexpected_line_exc(line)
 
-                        if line_desc:
-                            element_desc = line_desc if not element_desc else '\n'.join([element_desc, line_desc])
+                self.elements.append(decoder.decode([value.strip() for value in line]))
+
+@ElementClasses.append
+class PatternMultipliers(INPElementClass):
+    inp_label = '[PATTERNS]'
+    def __init__(self, start_lineno=None, end_lineno=None, lines=None):
+        INPElementClass.__init__(self, start_lineno, end_lineno, lines)
+        self.inp_label = self.__class__.inp_label
+        self.section = self.__class__.__name__
+        self.fields = OrderedDict([('Pattern', str),
+                                   ('Type', str),
+                                   ('Multiplier', float)])
+        self.ordinal_field = 'Ordinal'
+        self.composite_name = ['Pattern', 'Type', self.ordinal_field]
+        self.inp_grouping = self.name_field
+
+        self.fmt_params = {'MONTHLY' : {'count' : 12, 'width' : 6},
+                      'DAILY' : {'count' : 7, 'width' : 7},
+                      'HOURLY' : {'count' : 24, 'width' : 6},
+                      'WEEKEND' : {'count' : 24, 'width' : 6}}
+        self.defines = {'Pattern' : 'Pattern'}
+
+    def parse(self):
+        pattern_descriptions = {}
+        current = {'width' : None} # multipliers per line of the pattern being read
+        decoder = self.get_row_decoder()
+
+        def parse_line(line):
+            line = line.split()
+            try:
+                dummy = float(line[1])
+            except:
+                current['new_pattern'] = True
+                current['width'] = self.fmt_params[line[1]]['width']
+                expected_line_len = current['width'] + 2
+            else:
+                current['new_pattern'] = False
+                expected_line_len = current['width'] + 1
 
-                        line = [self.fields.values()[j](value) if value else value for j, value in enumerate(line)]
-                        params = dict(zip(self.fields.keys(), line))
-                        element_desc = element_desc.replace('\\n', '\n')
-                        params[self.desc_field] = element_desc
-                        current_catch = params['Subcatchment']
-                        if current_catch != prev_catch:
-                            coord_ordinal = 1
-                        else:
-                            coord_ordinal = coord_ordinal + 1
-                        params[self.ordinal_field] = coord_ordinal
-                        name = ':'.join([str(params[field]) for field in self.composite_name])
-                        params[self.name_field] = name
-                        element_desc = ''
-                        prev_catch = current_catch
-                        self.elements.append(params)
+            unmarked_desc = ''
+            if len(line) > expected_line_len:
+                if self.long_line_comment:
+                    unmarked_desc = ' '.join(line[expected_line_len:]).strip()
+                    line = line[:expected_line_len]
+                else:
+                    raise self._unexpected_line_exc(line)
 
-    @element_classes.append
-    class Tags(INPElementClass):
-        inp_label = '[TAGS]'
-        def __init__(self, start_lineno=None, end_lineno=None):
-            INPElementClass.__init__(self, start_lineno, end_lineno)
-            self.section = self.__class__.__name__
-            self.inp_label = self.__class__.inp_label
-            self.fields = OrderedDict([('TagType', str), ('Name', str), ('Tag',  str)])
-            self.defaults = {'TagType' : None, 'Name' : None, 'Tag' : None}
-            self.desc_field = None
-            self.sort_by = ['TagType']
-
-            if start_lineno is not None and end_lineno is not None:
-                self.parse()
+            return line, unmarked_desc
 
-        def parse(self):
-            for i in range(self.start_lineno, self.end_lineno):
-                line = self.getline(i)
-                if re.match(self.pats['desc'], line) or re.match(self.pats['blank_or_tag'], line):
-                    continue
-                else:
-                    line = line.split(None, 2)
-                    if len(line) != len(self.fields): 
+        for line, element_desc, lineno in self.tokenize(parse_line):
+            if current['new_pattern']:
+                pattern = line[0]
+                pattern_descriptions[pattern] = element_desc
+                pat_type = line[1]
+                current_ordinal = 1
+                for multiplier in line[2:]:
+                    try:
+                        multiplier = float(multiplier)
+                    except:
                         raise self._unexpected_line_exc(line)
 
-                    for j, value in enumerate(line):
-                        if value is not None:
-                            line[j] = self.fields.values()[j](value.strip())
+                    params = {'Pattern'     : pattern,
+                              'Type'        : pat_type,
+                              self.ordinal_field : current_ordinal,
+                              'Multiplier'  : float(multiplier)}
 
-                    params = dict(zip(self.fields.keys(), line))
+                    params[self.name_field] = decoder.get_name(params)
                     self.elements.append(params)
+                    current_ordinal += 1
+            else:
+                if element_desc:
+                    current_desc = pattern_descriptions[pattern] 
+                    pattern_descriptions[pattern] = current_desc + '\n' + element_desc if current_desc else element_desc
+                for multiplier in line[1:]:
+                    name = ':'.join([pattern, pat_type, str(current_ordinal)])
+                    params = {self.name_field : name, 
+                              'Pattern'     : pattern,
+                              'Type'        : pat_type,
+                              self.ordinal_field : current_ordinal,
+                              'Multiplier'  : float(multiplier)}
+                    self.elements.append(params)
+                    current_ordinal += 1
+
+        for element in self.elements:
+            desc = pattern_descriptions[element['Pattern']]
+            element[self.desc_field] = desc.replace('\\n', '\n').strip()
+            #element[self.desc_field] = re.sub('\n$', '', desc, count = 1) if desc else None
+
+    def iter_inp_lines(self, **kwargs):
+        pat_key = lambda x: (x['Pattern'], x['Type'])
+        elements = []
+        for pat, mults in itertools.groupby(sorted(self.elements, key=pat_key), pat_key):
+            pat, pat_type = pat
+            pat_type = pat_type.upper()
+            mults = list(mults)
+            mults = sorted(mults, key=lambda x: x[self.ordinal_field])
+
+            if len(mults) != self.fmt_params[pat_type]['count']:
+                raise Exception("Cannot generate [PATTERNS] lines, incorrect number of multipliers for pattern type.")
+            else:
+                rows = itertools.izip_longest(*[iter(mults)]*self.fmt_params[pat_type]['width'], fillvalue=None)
+                for i, row in enumerate(rows):
+                    desc = row[0][self.desc_field] if not i else None
+                    out_type = pat_type if not i else ''
+                    row = filter(None, row)
+                    mult_nums = [str(x['Multiplier']) for x in row]
+                    mult_str = '  '.join(mult_nums)
+                    elements.append({self.name_field : pat,
+                                     self.ordinal_field : i,
+                                     self.desc_field : desc,
+                                     'Pattern' : pat, 
+                                     'Type' : out_type, 
+                                     'Multiplier' : mult_str})
+
+        return super(PatternMultipliers, self).iter_inp_lines(elements=elements, **kwargs)
+
+@ElementClasses.append
+class CurvePoints(INPElementClass):
+    inp_label = '[CURVES]'
+    def __init__(self, start_lineno=None, end_lineno=None, lines=None):
+        INPElementClass.__init__(self, start_lineno, end_lineno, lines)
+        self.section = self.__class__.__name__
+        self.inp_label = self.__class__.inp_label
+        self.fields = OrderedDict([('Curve', str),
+                                   ('Type', str),
+                                   ('XCoordinate', float),
+                                   ('YCoordinate', float)])
+        self.ordinal_field = 'Ordinal' 
+        self.composite_name = ['Curve', self.ordinal_field]
+        self.inp_grouping = 'Curve'
+        self.sort_by = ['Curve', self.ordinal_field]
+        self.defines = {'Curve' : 'Curve'}
+
+    def parse(self):
+        curve_types_by_name = {}
+        curve_points_by_name = {}
+        decoder = self.get_row_decoder()
+
+        def parse_line(line):
+            # the first line of a curve also has its type
+            line = line.split()
+            try:
+                dummy = float(line[1])
+            except:
+                return self._split_fields(line, 4)
+            else:
+                return self._split_fields(line, 3)
 
-    @element_classes.append
-    class PatternMultipliers(INPElementClass):
-        inp_label = '[PATTERNS]'
-        def __init__(self, start_lineno=None, end_lineno=None):
-            INPElementClass.__init__(self, start_lineno, end_lineno)
-            self.inp_label = self.__class__.inp_label
-            self.section = self.__class__.__name__
-            self.fields = OrderedDict([('Pattern', str),
-                                       ('Type', str),
-                                       ('Multiplier', str)])
-            self.ordinal_field = 'Ordinal'
-            self.composite_name = ['Pattern', 'Type', self.ordinal_field]
-            self.inp_grouping = self.name_field
-
-            self.fmt_params = {'MONTHLY' : {'count' : 12, 'width' : 6},
-                          'DAILY' : {'count' : 7, 'width' : 7},
-                          'HOURLY' : {'count' : 24, 'width' : 6},
-                          'WEEKEND' : {'count' : 24, 'width' : 6}}
-
-            if start_lineno is not None and end_lineno is not None:
-                self.parse()
-
-        def parse(self):
-            new_pattern = True
-            element_desc = ''
-            past_header = False
-            pattern_descriptions = {}
-            current_mul_length = None
-            for i in range(self.start_lineno, self.end_lineno):
-                line = self.getline(i)
-                if (re.match(self.pats['header'], line) and not past_header) or re.match(self.pats['blank_or_tag'], line):
-                    continue
-                else:
-                    past_header = True
-                    if re.match(self.pats['desc'], line):
-                        desc = line.strip(self.pats['desc_whitespace'])
-                        element_desc = desc if not element_desc else '\n'.join([element_desc, desc])
-                        continue
+        for line, element_desc, lineno in self.tokenize(parse_line, skip_all_headers=True):
+            new_curve = len(line) == 4
+            if new_curve:
+                #current_ordinal = 1
+                curve_types_by_name[line[0]] = line[1]
+            else:
+                if line[0] not in curve_types_by_name:
+                    raise Exception("Curve type for " + line[0] + " not identified.")
+                line.insert(self.fields.keys().index('Type'), curve_types_by_name[line[0]])
+
+            params = decoder.decode(line)
+            #params[self.ordinal_field] = current_ordinal
+            #name = ':'.join([str(params[field]) for field in self.composite_name])
+            #params[self.name_field] = name
+            params[self.desc_field] = element_desc.replace('\\n', '\n').strip()
+            curve_points_by_name.setdefault(params['Curve'], []).append(params)
+            #self.elements.append(params)
+            #current_ordinal += 1
+
+        for curve, points in curve_points_by_name.items():
+            for i, point in enumerate(points):
+                point[self.ordinal_field] = i + 1
+                point[self.name_field] = decoder.get_name(point)
+
+            self.elements.extend(points)
+
+
+
+    def iter_inp_lines(self, **kwargs):
+        elements = []
+
+        curv_key = lambda x: (x['Curve'], x['Type'])
+        for curv, points in itertools.groupby(sorted(self.elements, key=curv_key), curv_key):
+            curv, curv_type = curv
+            points = sorted(list(points), key=lambda x: x[self.ordinal_field])
+            for i, point in enumerate(points):
+                if i:
+                    point['Type'] = ' '*len(curv_type)
+            elements.extend(points)
+
+        return super(CurvePoints, self).iter_inp_lines(elements=elements, **kwargs)
+
+@ElementClasses.append
+class Hydrographs(INPElementClass):
+    inp_label = '[HYDROGRAPHS]'
+    def __init__(self, start_lineno=None, end_lineno=None, lines=None):
+        INPElementClass.__init__(self, start_lineno, end_lineno, lines)
+        self.section = self.__class__.__name__
+        self.inp_label = self.__class__.inp_label 
+        self.hydro_fields = OrderedDict([('UHGroup', str),
+                                         ('Month', str),
+                                         ('Response', str),
+                                         ('R', float),
+                                         ('T', float),
+                                         ('K', float),
+                                         ('IAmax', float),
+                                         ('IArec', float),
+                                         ('IAini', float)])
+        self.raingage_fields = OrderedDict([('RainGage', str), ('RainGageDescription', str)])
+        self.fields = OrderedDict(self.hydro_fields.items() + self.raingage_fields.items())
+        self.composite_name = ['UHGroup', 'Month', 'Response']
+        self.inp_grouping = 'UHGroup'
+        self.defines = {'UHGroup' : 'UnitHydrograph'}
+        self.references = {'RainGage' : 'Gage'}
+
+    def parse(self):
+        raingages_by_group = {}
+        hydro_decoder = self.get_row_decoder(self.hydro_fields)
+
+        # function for parsing swmm4 format
+        def extract_short_med_long(line):
+            IAnumbers = line[11:14]
+            shortterm = line[:2] + ['Short'] + line[2:5] + IAnumbers
+            mediumterm = line[:2] + ['Medium'] + line[5:8] + IAnumbers
+            longterm = line[:2] + ['Long'] + line[8:11] + IAnumbers
+            return [shortterm, mediumterm, longterm]
+
+        # returns ((True, [group, raingage]), desc) for a raingage line and ((False, element_lines), desc)
+        # for a line of unit hydrograph parameters
+        def parse_line(line):
+            unmarked_desc = ''
+            line = line.split()
+            rg_name_idx = 1
+            response_idx = 2
+            num_params_in_rg_line = 2
+            is_rg_line = len(line) == num_params_in_rg_line
+            if self.long_line_comment and len(line) > num_params_in_rg_line:
+                is_rg_line = line[response_idx].lower() not in ('short', 'medium', 'long')
+
+            if is_rg_line:
+                if len(line) > 2:
+                    if self.long_line_comment:
+                        unmarked_desc = ' '.join(line[rg_name_idx+1:]).strip()
+                        line = line[:rg_name_idx+1]
                     else:
-                        line_descs = {'marked' : '', 'unmarked' : ''}
-
-                        if re.search(self.pats['semicolon'], line):
-                            line, line_descs['marked'] = re.split(self.pats['adj_semicolons'], line, maxsplit=1)
-                            line_descs['marked'] = line_descs['marked'].strip(self.pats['desc_whitespace'])
-
-                        line = line.split()
-                        try:
-                            dummy = float(line[1])
-                        except:
-                            new_pattern = True
-                            current_mult_length = self.fmt_params[line[1]]['width']
-                            expected_line_len = current_mult_length + 2
-                        else:
-                            new_pattern = False
-                            expected_line_len = current_mult_length + 1
-
-                        if len(line) > expected_line_len:
-                            if self.long_line_comment:
-                                line_descs['unmarked'] = ' '.join(line[expected_line_len:]).strip()
-                                line = line[:expected_line_len]
-                            else:
-                                raise self._unexpected_line_exc(line)
-
-                        if all(line_descs.values()):
-                            line_desc = ' ; '.join([line_descs['unmarked'], line_descs['marked']])
-                        elif line_descs['marked']:
-                            line_desc = line_descs['marked']
-                        elif line_descs['unmarked']:
-                            line_desc = line_descs['unmarked']
-                        else:
-                            line_desc = ''
-
-                        if line_desc:
-                            element_desc = line_desc if not element_desc else '\n'.join([element_desc, line_desc])
-
-                        if new_pattern:
-                            pattern = line[0]
-                            pattern_descriptions[pattern] = element_desc
-                            pat_type = line[1]
-                            current_ordinal = 1
-                            for multiplier in line[2:]:
-                                try:
-                                    multiplier = float(multiplier)
-                                except:
-                                    raise self._unexpected_line_exc(line)
-
-                                params = {'Pattern'     : pattern,
-                                          'Type'        : pat_type,
-                                          self.ordinal_field : current_ordinal,
-                                          'Multiplier'  : float(multiplier)}
-
-                                params[self.name_field] = ':'.join([str(params[field]) for field in self.composite_name])
-                                self.elements.append(params)
-                                if current_ordinal == 1:
-                                    element_desc = '' # description only follows first multiplier, so reset description
-                                current_ordinal += 1
-                        else:
-                            if element_desc:
-                                current_desc = pattern_descriptions[pattern] 
-                                pattern_descriptions[pattern] = current_desc + '\n' + element_desc if current_desc else element_desc
-                            for multiplier in line[1:]:
-                                name = ':'.join([pattern, pat_type, str(current_ordinal)])
-                                params = {self.name_field : name, 
-                                          'Pattern'     : pattern,
-                                          'Type'        : pat_type,
-                                          self.ordinal_field : current_ordinal,
-                                          'Multiplier'  : float(multiplier)}
-                                self.elements.append(params)
-                                current_ordinal += 1
-
-                        element_desc = ''
-
-                for element in self.elements:
-                    desc = pattern_descriptions[element['Pattern']]
-                    element[self.desc_field] = desc.replace('\\n', '\n').strip()
-                    #element[self.desc_field] = re.sub('\n$', '', desc, count = 1) if desc else None
-
-        def inp_lines(self, **kwargs):
-            pat_key = lambda x: (x['Pattern'], x['Type'])
-            elements = []
-            for pat, mults in itertools.groupby(sorted(self.elements, key=pat_key), pat_key):
-                pat, pat_type = pat
-                pat_type = pat_type.upper()
-                mults = list(mults)
-                mults = sorted(mults, key=lambda x: x[self.ordinal_field])
-
-                if len(mults) != self.fmt_params[pat_type]['count']:
-                    raise Exception("Cannot generate [PATTERNS] lines, incorrect number of multipliers for pattern type.")
-                else:
-                    rows = itertools.izip_longest(*[iter(mults)]*self.fmt_params[pat_type]['width'], fillvalue=None)
-                    for i, row in enumerate(rows):
-                        desc = row[0][self.desc_field] if not i else None
-                        out_type = pat_type if not i else ''
-                        row = filter(None, row)
-                        mult_nums = [str(x['Multiplier']) for x in row]
-                        mult_str = '  '.join(mult_nums)
-                        elements.append({self.name_field : pat,
-                                         self.ordinal_field : i,
-                                         self.desc_field : desc,
-                                         'Pattern' : pat, 
-                                         'Type' : out_type, 
-                                         'Multiplier' : mult_str})
-
-            return super(PatternMultipliers, self).inp_lines(elements=elements, **kwargs)
-
-    @element_classes.append
-    class CurvePoints(INPElementClass):
-        inp_label = '[CURVES]'
-        def __init__(self, start_lineno=None, end_lineno=None):
-            INPElementClass.__init__(self, start_lineno, end_lineno)
-            self.section = self.__class__.__name__
-            self.inp_label = self.__class__.inp_label
-            self.fields = OrderedDict([('Curve', str),
-                                       ('Type', str),
-                                       ('XCoordinate', float),
-                                       ('YCoordinate', float)])
-            self.ordinal_field = 'Ordinal' 
-            self.composite_name = ['Curve', self.ordinal_field]
-            self.inp_grouping = 'Curve'
-            self.sort_by = ['Curve', self.ordinal_field]
-            if start_lineno is not None and end_lineno is not None:
-                self.parse()
+                        raise self._unexpected_line_exc(line)
 
-        def parse(self):
-            new_curve = True
-            element_desc = ''
-            past_header = False
-            curve_types_by_name = {}
-            curve_points_by_name = {}
-            for i in range(self.start_lineno, self.end_lineno):
-                line = self.getline(i)
-                if re.match(self.pats['header'], line) or re.match(self.pats['blank_or_tag'], line):
-                    continue
-                else:
-                    past_header = True
-                    if re.match(self.pats['desc'], line):
-                        past_header = True
-                        desc = line.strip(self.pats['desc_whitespace'])
-                        element_desc = desc if not element_desc else element_desc + '\n' + desc
+                return (True, line), unmarked_desc
+            else:
+                # first condition applies to SWMMR 4 hydrograph format
+                if len(line) == 14:
+                    element_lines = extract_short_med_long(line)
+                elif len(line) == 9:
+                    element_lines = [line]
+                elif self.long_line_comment and len(line) > 9:
+                    try:
+                        [float(x) for x in line[9:14]]
+                    except:
+                        element_lines = [line[:9]]
+                        unmarked_desc = ' '.join(line[9:]).strip()
                     else:
-                        line_descs = {'marked' : '', 'unmarked' : ''}
-                        if re.search(self.pats['semicolon'], line):
-                            line, line_descs['marked'] = re.split(self.pats['adj_semicolons'], line, maxsplit=1)
-                            line_descs['marked'] = line_descs['marked'].strip(self.pats['desc_whitespace'])
-
-                        line = line.split()
-                        try:
-                            dummy = float(line[1])
-                        except:
-                            new_curve = True
-                            expected_line_length = 4
-                            curve_types_by_name[line[0]] = line[1]
-                        else:
-                            new_curve = False
-                            curve_name = line[0]
-                            expected_line_length = 3
-
-
-                        if len(line) != expected_line_length:
-                            if len(line) > expected_line_length and self.long_line_comment:
-                                line_descs['unmarked'] = ' '.join(line[expected_line_length:]).strip()
-                                line = line[:expected_line_length]
-                            else:
-                                raise self._unexpected_line_exc(line)
-
-                        if all(line_descs.values()):
-                            line_desc = ' ; '.join([line_descs['unmarked'], line_descs['marked']])
-                        elif line_descs['marked']:
-                            line_desc = line_descs['marked']
-                        elif line_descs['unmarked']:
-                            line_desc = line_descs['unmarked']
-                        else:
-                            line_desc = ''
-
-                        if line_desc:
-                            element_desc = line_desc if not element_desc else '\n'.join([element_desc, line_desc])
-
-                        if new_curve:
-                            #current_ordinal = 1
-                            curve_types_by_name[line[0]] = line[1]
-                        else:
-                            if line[0] not in curve_types_by_name.keys():
-                                raise Exception("Curve type for " + line[0] + " not identified.")
-                            line.insert(self.fields.keys().index('Type'), curve_types_by_name[line[0]])
-
+                        element_lines = extract_short_med_long(line[:14])
+                        unmarked_desc = ' '.join(line[14:]).strip()
+                else:
+                    raise self._unexpected_line_exc(line)
 
-                        for j, value in enumerate(line):
-                            line[j] = self.fields.values()[j](value)
+                return (False, element_lines), unmarked_desc
 
-                        params = dict(zip(self.fields.keys(), line))
-                        #params[self.ordinal_field] = current_ordinal
-                        #name = ':'.join([str(params[field]) for field in self.composite_name])
-                        #params[self.name_field] = name
-                        element_desc = element_desc.replace('\\n', '\n').strip()
+        for (is_rg_line, lines), element_desc, lineno in self.tokenize(parse_line):
+            element_desc = element_desc.replace('\\n', '\n').strip()
+            if is_rg_line:
+                group, raingage = lines
+                raingages_by_group[group] = {'RainGage' : raingage, 
+                                             'RainGageDescription' : element_desc}
+            else:
+                for line in lines:
+                    if len(line) == len(self.hydro_fields):
+                        params = hydro_decoder.decode(line)
+                        params[self.name_field] = ':'.join([params['UHGroup'],
+                                                   params['Month'],
+                                                   params['Response']])
                         params[self.desc_field] = element_desc
-                        element_desc = ''
-                        curve_points_by_name.setdefault(params['Curve'], []).append(params)
-                        #self.elements.append(params)
-                        #current_ordinal += 1
-
-            for curve, points in curve_points_by_name.items():
-                for i, point in enumerate(points):
-                    point[self.ordinal_field] = i + 1
-                    name = ':'.join([str(point[field]) for field in self.composite_name])
-                    point[self.name_field] = name
-
-                self.elements.extend(points)
-
-
-
-        def inp_lines(self, **kwargs):
-            elements = []
-
-            curv_key = lambda x: (x['Curve'], x['Type'])
-            for curv, points in itertools.groupby(sorted(self.elements, key=curv_key), curv_key):
-                curv, curv_type = curv
-                points = sorted(list(points), key=lambda x: x[self.ordinal_field])
-                for i, point in enumerate(points):
-                    if i:
-                        point['Type'] = ' '*len(curv_type)
-                elements.extend(points)
-
-            return super(CurvePoints, self).inp_lines(elements=elements, **kwargs)
-
-    @element_classes.append
-    class Hydrographs(INPElementClass):
-        inp_label = '[HYDROGRAPHS]'
-        def __init__(self, start_lineno=None, end_lineno=None):
-            INPElementClass.__init__(self, start_lineno, end_lineno)
-            self.section = self.__class__.__name__
-            self.inp_label = self.__class__.inp_label 
-            self.hydro_fields = OrderedDict([('UHGroup', str),
-                                             ('Month', str),
-                                             ('Response', str),
-                                             ('R', float),
-                                             ('T', float),
-                                             ('K', float),
-                                             ('IAmax', float),
-                                             ('IArec', float),
-                                             ('IAini', float)])
-            self.raingage_fields = OrderedDict([('RainGage', str), ('RainGageDescription', str)])
-            self.fields = OrderedDict(self.hydro_fields.items() + self.raingage_fields.items())
-            self.composite_name = ['UHGroup', 'Month', 'Response']
-            self.inp_grouping = 'UHGroup'
-
-            if start_lineno is not None and end_lineno is not None:
-                self.parse()
-
-        def parse(self):
-            raingages_by_group = {}
-            raingage = None
-            past_header = False
-            element_desc = ''
-
-            # function for parsing swmm4 format
-            def extract_short_med_long(line):
-                IAnumbers = line[11:14]
-                shortterm = line[:2] + ['Short'] + line[2:5] + IAnumbers
-                mediumterm = line[:2] + ['Medium'] + line[5:8] + IAnumbers
-                longterm = line[:2] + ['Long'] + line[8:11] + IAnumbers
-                return [shortterm, mediumterm, longterm]
-
-            for i in range(self.start_lineno, self.end_lineno):
-                line = self.getline(i)
-                if (re.match(self.pats['header'], line) and not past_header) or re.match(self.pats['blank_or_tag'], line):
-                    continue
-                else:
-                    past_header = True
-                    if re.match(self.pats['desc'], line):
-                        desc = line.strip(self.pats['desc_whitespace'])
-                        element_desc = desc if not element_desc else '\n'.join([element_desc, desc])
-                        continue
+                        #params[self.desc_field] = re.sub('\n$', '', element_desc, count = 1) \
+                        #       if element_desc else None
+                        self.elements.append(params)
                     else:
-                        line_descs = {'marked' : '', 'unmarked' : ''}
-
-                        if re.search(self.pats['semicolon'], line):
-                            line, line_descs['marked'] = re.split(self.pats['adj_semicolons'], line, maxsplit=1)
-                            line_descs['marked'] = line_descs['marked'].strip(self.pats['desc_whitespace'])
-
-                        line = line.split()
-                        group = line[0]
-                        rg_name_idx = 1
-                        response_idx = 2
-                        num_params_in_rg_line = 2
-                        is_rg_line = len(line) == num_params_in_rg_line
-                        if self.long_line_comment and len(line) > num_params_in_rg_line:
-                            is_rg_line = line[response_idx].lower() not in ('short', 'medium', 'long')
-
-                        if is_rg_line:
-                            if len(line) > 2:
-                                if self.long_line_comment:
-                                    line_descs['unmarked'] = ' '.join(line[rg_name_idx+1:]).strip()
-                                    line = line[:rg_name_idx+1]
-                                else:
-                                    raise self._unexpected_line_exc(line)
-
-                            if all(line_descs.values()):
-                                line_desc = ' ; '.join([line_descs['unmarked'], line_descs['marked']])
-                            elif line_descs['marked']:
-                                line_desc = line_descs['marked']
-                            elif line_descs['unmarked']:
-                                line_desc = line_descs['unmarked']
-                            else:
-                                line_desc = ''
-
-                            if line_desc:
-                                element_desc = line_desc if not element_desc else '\n'.join([element_desc, line_desc])
-
-                            element_desc = element_desc.replace('\\n', '\n').strip()
-                            raingages_by_group[group] = {'RainGage' : line[rg_name_idx], 
-                                                         'RainGageDescription' : element_desc}
+                        raise self._unexpected_line_exc(line)
+
+        for element in self.elements:
+            if element['UHGroup'] in raingages_by_group:
+                raingage = raingages_by_group[element['UHGroup']]
+                for field in self.raingage_fields.keys():
+                    element[field] = raingage[field]
+            else:
+                raise Exception('get_Hydrographs: Missing raingage for ' + element['UHGroup'])
+
+    def iter_inp_lines(self, **kwargs):
+        months_ordering = ['All', 'Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']
+        response_ordering = ['Short', 'Medium', 'Long']
+        key = lambda x: (x['UHGroup'], months_ordering.index(x['Month'].title()), response_ordering.index(x['Response']))
+        current_uh_group = None
+        remove_fields = ['RainGage', 'RainGageDescription']
+        alt_fields = [name for name in self.fields.keys() if name not in remove_fields]
+        alt_fields[alt_fields.index('Month')] = 'Month/RG'
+        elements = []
+
+        sorted_elements = sorted(self.elements, key=key)
+
+        for element in sorted_elements:
+            element = copy.deepcopy(element)
+            uh_group = element['UHGroup']
+            if uh_group != current_uh_group:
+                rg_row = dict((name, None) for name in alt_fields)
+                rg_row = {'UHGroup' : element['UHGroup'], 
+                          'Month/RG' : element['RainGage'],
+                          self.desc_field : element['RainGageDescription'],
+                          self.name_field : element['UHGroup']}
+                for name in alt_fields:
+                    if name not in rg_row.keys():
+                        rg_row[name] = None
+                elements.append(rg_row)
+                current_uh_group = uh_group
+            element['Month/RG'] = element['Month']
+            for name in remove_fields + ['Month']:
+                del element[name]
+            elements.append(element)
+
+        return super(Hydrographs, self).iter_inp_lines(elements=elements, fieldnames=alt_fields, **kwargs)
+
+@ElementClasses.append
+class SnowPacks(INPElementClass):
+    inp_label = '[SNOWPACKS]' 
+    def __init__(self, start_lineno=None, end_lineno=None, lines=None):
+        INPElementClass.__init__(self, start_lineno, end_lineno, lines)
+        self.section = self.__class__.__name__
+        self.inp_label = self.__class__.inp_label
+        self.fields = OrderedDict([('Name', str),
+                                   ('PlowMinCoeff', float),
+                                   ('PlowMaxCoeff', float),
+                                   ('PlowBaseTemp', float),
+                                   ('PlowFFH2OCap', float),
+                                   ('PlowInitDepth', float),
+                                   ('PlowInitFreeH2O', float),
+                                   ('PlowImpAreaFrac', float),
+                                   ('ImpvMinCoeff', float),
+                                   ('ImpvMaxCoeff', float),
+                                   ('ImpvBaseTemp', float),
+                                   ('ImpvFFH2OCap', float),
+                                   ('ImpvInitDepth', float),
+                                   ('ImpvInitFreeH2O', float),
+                                   ('ImpvTCDepth', float),
+                                   ('PervMinCoeff', float),
+                                   ('PervMaxCoeff', float),
+                                   ('PervBaseTemp', float),
+                                   ('PervFFH2OCap', float),
+                                   ('PervInitDepth', float),
+                                   ('PervInitFreeH2O', float),
+                                   ('PervTCDepth', float),
+                                   ('RmvlStartDepth', float),
+                                   ('H2OshedExitFrac', float),
+                                   ('Trans_to_ImpvFrac', float),
+                                   ('Trans_to_PervFrac', float),
+                                   ('MeltFrac', float),
+                                   ('Trans_to_SubctchFrac', float),
+                                   ('RmvlName', str)])
+
+        self.inp_grouping = self.name_field
+        self.defines = {'Name' : 'SnowPack'}
+        self.references = {'RmvlName' : 'Subcatch'}
+
+    def parse(self):
+        fields = self.fields.keys()
+        dtypes = self.fields.values()
+        fields_by_catchtype = {'PLOWABLE' : fields[1:8], 'IMPERVIOUS' : fields[8:15], 
+            'PERVIOUS' : fields[15:22], 'REMOVAL' : fields[22:29]}
+        dtypes_by_catchtype = {'PLOWABLE' : dtypes[1:8], 'IMPERVIOUS' : dtypes[8:15], 
+            'PERVIOUS' : dtypes[15:22], 'REMOVAL' : dtypes[22:29]}
+        def parse_line(line):
+            line = line.split()
+            unmarked_desc = ''
+            min_params_in_removal_line = 8
+            category_idx = 1
+            if len(line) != 9:
+                if line[category_idx] == 'REMOVAL':
+                    if len(line) == min_params_in_removal_line:
+                        line.append('')
+                    if len(line) >= min_params_in_removal_line:
+                        if self.long_line_comment:
+                            raise self._ambiguous_line_exc(line)
                         else:
-                            # first condition applies to SWMMR 4 hydrograph format
-                            if len(line) == 14:
-                                element_lines = extract_short_med_long(line)
-                            elif len(line) == 9:
-                                element_lines = [line]
-                            elif self.long_line_comment and len(line) > 9:
-                                try:
-                                    [float(x) for x in line[9:14]]
-                                except:
-                                    element_lines = [line[:9]]
-                                    line_descs['unmarked'] = ' '.join(line[9:]).strip()
-                                else:
-                                    element_lines = extract_short_med_long(line[:14])
-                                    line_descs['unmarked'] = ' '.join(line[14:]).strip()
-                            else:
-                                raise self._unexpected_line_exc(line)
-
-                            if all(line_descs.values()):
-                                line_desc = ' ; '.join([line_descs['unmarked'], line_descs['marked']])
-                            elif line_descs['marked']:
-                                line_desc = line_descs['marked']
-                            elif line_descs['unmarked']:
-                                line_desc = line_descs['unmarked']
-                            else:
-                                line_desc = ''
-
-                            if line_desc:
-                                element_desc = line_desc if not element_desc else '\n'.join([element_desc, line_desc])
-
-                            element_desc = element_desc.replace('\\n', '\n').strip()
-
-                            for line in element_lines:
-                                if len(line) == len(self.hydro_fields):
-                                    for j, value in enumerate(line):
-                                        if value is not None:
-                                            line[j] = self.hydro_fields.values()[j](value)
-
-                                    params = dict(zip(self.hydro_fields.keys(), line))
-                                    params[self.name_field] = ':'.join([params['UHGroup'],
-                                                               params['Month'],
-                                                               params['Response']])
-                                    params[self.desc_field] = element_desc
-                                    #params[self.desc_field] = re.sub('\n$', '', element_desc, count = 1) \
-                                    #       if element_desc else None
-                                    self.elements.append(params)
-                                else:
-                                    raise self._unexpected_line_exc(line)
-
-                        element_desc = ''
-
-            for element in self.elements:
-                if element['UHGroup'] in raingages_by_group.keys():
-                    raingage = raingages_by_group[element['UHGroup']]
-                    for field in self.raingage_fields.keys():
-                        element[field] = raingage[field]
+                            raise self._unexpected_line_exc(line)
+                    elif len(line) == min_params_in_removal_line:
+                        line.append('')
+                    else:
+                        raise self._unexpected_line_exc(line)
+                elif len(line) > 9 and self.long_line_comment:
+                    unmarked_desc = ' '.join(line[9:]).strip()
+                    line = line[:9]
                 else:
-                    raise Exception('get_Hydrographs: Missing raingage for ' + element['UHGroup'])
-
-        def inp_lines(self, **kwargs):
-            months_ordering = ['All', 'Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']
-            response_ordering = ['Short', 'Medium', 'Long']
-            key = lambda x: (x['UHGroup'], months_ordering.index(x['Month'].title()), response_ordering.index(x['Response']))
-            current_uh_group = None
-            remove_fields = ['RainGage', 'RainGageDescription']
-            alt_fields = [name for name in self.fields.keys() if name not in remove_fields]
-            alt_fields[alt_fields.index('Month')] = 'Month/RG'
-            elements = []
-
-            sorted_elements = sorted(self.elements, key=key)
-
-            for element in sorted_elements:
-                element = copy.deepcopy(element)
-                uh_group = element['UHGroup']
-                if uh_group != current_uh_group:
-                    rg_row = dict((name, None) for name in alt_fields)
-                    rg_row = {'UHGroup' : element['UHGroup'], 
-                              'Month/RG' : element['RainGage'],
-                              self.desc_field : element['RainGageDescription'],
-                              self.name_field : element['UHGroup']}
-                    for name in alt_fields:
-                        if name not in rg_row.keys():
-                            rg_row[name] = None
-                    elements.append(rg_row)
-                    current_uh_group = uh_group
-                element['Month/RG'] = element['Month']
-                for name in remove_fields + ['Month']:
-                    del element[name]
-                elements.append(element)
-
-            return super(Hydrographs, self).inp_lines(elements=elements, fieldnames=alt_fields, **kwargs)
-
-    @element_classes.append
-    class SnowPacks(INPElementClass):
-        inp_label = '[SNOWPACKS]' 
-        def __init__(self, start_lineno=None, end_lineno=None):
-            INPElementClass.__init__(self, start_lineno, end_lineno)
-            self.section = self.__class__.__name__
-            self.inp_label = self.__class__.inp_label
-            self.fields = OrderedDict([('Name', str),
-                                       ('PlowMinCoeff', float),
-                                       ('PlowMaxCoeff', float),
-                                       ('PlowBaseTemp', float),
-                                       ('PlowFFH2OCap', float),
-                                       ('PlowInitDepth', float),
-                                       ('PlowInitFreeH2O', float),
-                                       ('PlowImpAreaFrac', float),
-                                       ('ImpvMinCoeff', float),
-                                       ('ImpvMaxCoeff', float),
-                                       ('ImpvBaseTemp', float),
-                                       ('ImpvFFH2OCap', float),
-                                       ('ImpvInitDepth', float),
-                                       ('ImpvInitFreeH2O', float),
-                                       ('ImpvTCDepth', float),
-                                       ('PervMinCoeff', float),
-                                       ('PervMaxCoeff', float),
-                                       ('PervBaseTemp', float),
-                                       ('PervFFH2OCap', float),
-                                       ('PervInitDepth', float),
-                                       ('PervInitFreeH2O', float),
-                                       ('PervTCDepth', float),
-                                       ('RmvlStartDepth', float),
-                                       ('H2OshedExitFrac', float),
-                                       ('Trans_to_ImpvFrac', float),
-                                       ('Trans_to_PervFrac', float),
-                                       ('MeltFrac', float),
-                                       ('Trans_to_SubctchFrac', float),
-                                       ('RmvlName', str)])
-
-            self.inp_grouping = self.name_field
-            
-            if start_lineno is not None and end_lineno is not None:
-                self.parse()
+                    raise self._unexpected_line_exc(line)
+            return line, unmarked_desc
+
+        elements_by_name = {}
+        for line, element_desc, lineno in self.tokenize(parse_line):
+            catchtype_colnum = 1
+            current_catchtype = line[catchtype_colnum]
+
+            current_fields = fields_by_catchtype[current_catchtype]
+            current_dtypes = dtypes_by_catchtype[current_catchtype]
+
+            current_parameters = line[(catchtype_colnum + 1):]
+            current_parameters = [dtype(current_parameters[j]) for j, dtype in enumerate(current_dtypes)]
+
+            name_colnum = 0
+            current_name = line[name_colnum]
+
+            element_desc = element_desc.replace('\\n', '\n')
+            element = elements_by_name.get(current_name)
+            if element is not None:
+                for j, field in enumerate(current_fields):
+                    element[field] = current_parameters[j]
+                if element['Description'] and element_desc:
+                    element['Description'] = element['Description'] + '\n' + element_desc
+                elif element_desc:
+                    element['Description'] = element_desc
+            else:
+                element = dict(zip(fields, [None for j in range(len(fields))]))
+                element[self.name_field] = current_name
+                for j, field in enumerate(current_fields):
+                    element[field] = current_parameters[j]
+                element[self.desc_field] = element_desc
+                self.elements.append(element)
+                elements_by_name[current_name] = element
+
+    def iter_inp_lines(self, **kwargs):
+        alt_fields = ['Name', 'CatchmentType', 'Param1', 'Param2', 'Param3', 'Param4', 'Param5', 'Param6', 'Param7']
+
+        elements = []
+        prefixes = ['Plow', 'Impv', 'Perv', 'Rmvl']
+        fieldnames = self.fields.keys()
+        sp_dict = {0:'PLOWABLE', 1:'IMPERVIOUS', 2:'PERVIOUS', 3:'REMOVAL'}
+        for element in self.elements:
+            desc_added = False
+            for i in range(4):
+                new_element = []
+                for field in fieldnames[i*7+1:(i+1)*7+1]:
+                    new_element.append(element[field])
+                if any(new_element):
+                    new_row = tuple([element[self.name_field]] + [sp_dict[i]] + new_element) 
+                    if not desc_added:
+                        new_row = new_row + (element[self.desc_field].strip('\\n'), )
+                        desc_added = True
+                    else:
+                        new_row = new_row + (None, )
+                    elements.append(dict(zip(alt_fields + [self.desc_field], new_row)))
 
-        def parse(self):
-            fields = self.fields.keys()
-            dtypes = self.fields.values()
-            fields_by_catchtype = {'PLOWABLE' : fields[1:8], 'IMPERVIOUS' : fields[8:15], 
-                'PERVIOUS' : fields[15:22], 'REMOVAL' : fields[22:29]}
-            dtypes_by_catchtype = {'PLOWABLE' : dtypes[1:8], 'IMPERVIOUS' : dtypes[8:15], 
-                'PERVIOUS' : dtypes[15:22], 'REMOVAL' : dtypes[22:29]}
-            element_desc = ''
-            past_header = False
-            for i in range(self.start_lineno, self.end_lineno):
-                line = self.getline(i)
-                if (re.match(self.pats['header'], line) and not past_header) or re.match(self.pats['blank_or_tag'], line):
-                    continue
+        return super(SnowPacks, self).iter_inp_lines(elements=elements, fieldnames=alt_fields, **kwargs)
+        
+def parse_datetime(text):
+    # 'MM/DD/YYYY HH:MM[:SS]', the time may also be given in decimal hours
+    if isinstance(text, datetime.datetime):
+        return text
+    try:
+        date, time = text.split()
+        month, day, year = date.split('/')
+        if ':' in time:
+            hms = [int(value) for value in time.split(':')]
+            offset = datetime.timedelta(hours=hms[0], minutes=hms[1], seconds=hms[2] if len(hms) > 2 else 0)
+        else:
+            offset = datetime.timedelta(hours=float(time))
+        return datetime.datetime(int(year), int(month), int(day)) + offset
+    except (ValueError, IndexError):
+        raise Exception("Can't parse date and time: " + text)
+
+def format_datetime(dtime, seconds=True):
+    # 'MM/DD/YYYY HH:MM:SS', or 'MM/DD/YYYY HH:MM' for whole minutes unless seconds. see format_datetimes
+    text = '%02d/%02d/%04d %02d:%02d' % (dtime.month, dtime.day, dtime.year, dtime.hour, dtime.minute)
+    return text + ':%02d' % dtime.second if seconds or dtime.second else text
+
+def parse_hours(text):
+    # decimal hours or 'HH:MM[:SS]'
+    if ':' in text:
+        hms = [float(value) for value in text.split(':')]
+        return hms[0] + hms[1] / 60 + (hms[2] / 3600 if len(hms) > 2 else 0)
+    return float(text)
+
+def assemble_datetimes(year, month, day, seconds):
+    # datetime64 array from integer arrays of the date and the seconds into the day, and a mask of the
+    # dates that exist and are within the range of datetime
+    months = (year - 1970).astype('datetime64[Y]').astype('datetime64[M]') + (month - 1)
+    days = months.astype('datetime64[D]') + (day - 1)
+    datetimes = days.astype('datetime64[s]') + seconds.astype('timedelta64[s]')
+    valid = (month >= 1) & (month <= 12) & (day >= 1) & (year >= 1) & (year <= 9999) & \
+            (days.astype('datetime64[M]') == months) & (datetimes <= numpy.datetime64(datetime.datetime.max, 's'))
+    return datetimes, valid
+
+def parse_datetimes(texts):
+    # datetime64 array of the parsed dates and times, NaT where there is none. 'MM/DD/YYYY HH:MM[:SS]'
+    # strings are decoded together from their joined bytes, anything else is left to parse_datetime
+    strings = [text if isinstance(text, str) else '' for text in texts]
+    result = numpy.empty(len(strings), dtype='datetime64[s]')
+    result[:] = numpy.datetime64('NaT')
+    if not len(strings):
+        return result
+
+    data = numpy.frombuffer('\n'.join(strings) + '\n', dtype=numpy.uint8)
+    line_ends = numpy.flatnonzero(data == ord('\n'))
+    line_starts = numpy.concatenate([[0], line_ends[:-1] + 1])
+    line_ids = numpy.cumsum(data == ord('\n')) - (data == ord('\n'))
+
+    # runs of digits and their values
+    is_digit = (data >= ord('0')) & (data <= ord('9'))
+    previous_is_digit = numpy.concatenate([[False], is_digit[:-1]])
+    next_is_digit = numpy.concatenate([is_digit[1:], [False]])
+    run_starts = numpy.flatnonzero(is_digit & ~previous_is_digit)
+    run_ends = numpy.flatnonzero(is_digit & ~next_is_digit)
+    digit_positions = numpy.flatnonzero(is_digit)
+    digit_runs = numpy.cumsum(is_digit & ~previous_is_digit)[digit_positions] - 1
+    powers = run_ends[digit_runs] - digit_positions
+    run_values = numpy.bincount(digit_runs, weights=(data[digit_positions] - ord('0')) * 10.0 ** powers,
+                                minlength=len(run_starts))
+
+    # a regular line is 5 or 6 runs: month/day/year, whitespace, hour:minute[:second]
+    run_lines = line_ids[run_starts]
+    run_counts = numpy.bincount(run_lines, minlength=len(strings))
+    first_runs = numpy.cumsum(run_counts) - run_counts
+    run_indices = numpy.arange(len(run_starts)) - first_runs[run_lines]
+    separators = data[numpy.maximum(run_starts - 1, 0)]
+    gaps = run_starts - numpy.concatenate([[0], run_ends[:-1]]) - 1
+    run_ok = numpy.where(run_indices == 0, run_starts == line_starts[run_lines],
+             numpy.where(run_indices <= 2, (separators == ord('/')) & (gaps == 1),
+             numpy.where(run_indices == 3, (separators == ord(' ')) | (separators == ord('\t')),
+                         (separators == ord(':')) & (gaps == 1))))
+    other = ~is_digit & (data != ord('/')) & (data != ord(':')) & (data != ord(' ')) & (data != ord('\t')) & \
+            (data != ord('\n'))
+    regular = ((run_counts == 5) | (run_counts == 6)) & \
+              (numpy.bincount(run_lines[~run_ok], minlength=len(strings)) == 0) & \
+              (numpy.bincount(line_ids[other], minlength=len(strings)) == 0) & \
+              (numpy.bincount(line_ids[data == ord('/')], minlength=len(strings)) == 2) & \
+              (numpy.bincount(line_ids[data == ord(':')], minlength=len(strings)) == run_counts - 4)
+    regular[regular] = run_ends[first_runs[regular] + run_counts[regular] - 1] == line_ends[regular] - 1
+
+    lines = numpy.flatnonzero(regular)
+    first = first_runs[lines]
+    month, day, year, hour, minute = [run_values[first + k].astype(numpy.int64) for k in range(5)]
+    second = numpy.where(run_counts[lines] == 6, run_values[numpy.minimum(first + 5, len(run_values) - 1)], 0)
+    second = second.astype(numpy.int64)
+    datetimes, valid = assemble_datetimes(year, month, day, hour * 3600 + minute * 60 + second)
+    # dates that don't exist are left to parse_datetime to report
+    result[lines[valid]] = datetimes[valid]
+    regular[lines[~valid]] = False
+
+    for i in numpy.flatnonzero(~regular):
+        if texts[i]:
+            result[i] = parse_datetime(texts[i])
+    return result
+
+def has_seconds(texts):
+    # mask of the date and time strings that give the seconds, 'MM/DD/YYYY HH:MM:SS'
+    return numpy.array([isinstance(text, str) and text.count(':') > 1 for text in texts], dtype=bool)
+
+def format_datetimes(datetimes, seconds=None):
+    # 'MM/DD/YYYY HH:MM:SS' strings of a datetime64 array, built together as bytes. None for NaT. where the
+    # mask seconds is given and False, whole minutes are written 'MM/DD/YYYY HH:MM' as they were read
+    datetimes = numpy.asarray(datetimes, dtype='datetime64[s]')
+    days = datetimes.astype('datetime64[D]')
+    months = datetimes.astype('datetime64[M]')
+    years = datetimes.astype('datetime64[Y]')
+    seconds_of_day = (datetimes - days).astype(numpy.int64)
+    chars = numpy.empty((len(datetimes), 19), dtype=numpy.uint8)
+    chars[:, [2, 5]] = ord('/')
+    chars[:, 10] = ord(' ')
+    chars[:, [13, 16]] = ord(':')
+    for column, values, width in [(0, (months - years.astype('datetime64[M]')).astype(numpy.int64) + 1, 2),
+                                  (3, (days - months.astype('datetime64[D]')).astype(numpy.int64) + 1, 2),
+                                  (6, years.astype(numpy.int64) + 1970, 4),
+                                  (11, seconds_of_day // 3600, 2),
+                                  (14, seconds_of_day // 60 % 60, 2),
+                                  (17, seconds_of_day % 60, 2)]:
+        for k in range(width):
+            chars[:, column + width - 1 - k] = ord('0') + values // 10 ** k % 10
+    strings = chars.view('S19').ravel()
+    if seconds is not None:
+        minutes = chars[:, :16].copy().view('S16').ravel()
+        strings = numpy.where(numpy.asarray(seconds, dtype=bool) | (seconds_of_day % 60 != 0), strings, minutes)
+    strings = strings.tolist()
+    for i in numpy.flatnonzero(numpy.isnat(datetimes)):
+        strings[i] = None
+    return strings
+
+class TimeSeriesColumns(object):
+    # the points of one [TIMESERIES] series as arrays. a point has either a date and time or a duration in
+    # hours, the other is NaT or nan. seconds marks the dates and times that were read with seconds, they're
+    # written back the way they were. descriptions and FILE references are rare and kept by point index
+    point_fields = ('TimeSeries', 'FileName', 'DateTime', 'Duration', 'Value', 'Ordinal', 'Name', 'Description',
+                    'FileMD5')
+
+    def __init__(self, name):
+        self.name = name
+        self.datetimes = numpy.array([], dtype='datetime64[s]')
+        self.seconds = numpy.array([], dtype=bool)
+        self.durations = numpy.array([], dtype='float64')
+        self.values = numpy.array([], dtype='float64')
+        self.descs = {}
+        self.files = {}
+
+    def __len__(self):
+        return len(self.values)
+
+    def extend(self, datetimes, durations, values, descs=None, files=None):
+        # datetimes are strings as read from the *.inp, missing durations and values are None
+        offset = len(self)
+        to_float = lambda values: numpy.array([numpy.nan if value is None else value for value in values], dtype='float64')
+        self.datetimes = numpy.concatenate([self.datetimes, parse_datetimes(datetimes)])
+        self.seconds = numpy.concatenate([self.seconds, has_seconds(datetimes)])
+        self.durations = numpy.concatenate([self.durations, to_float(durations)])
+        self.values = numpy.concatenate([self.values, to_float(values)])
+        for i, desc in (descs or {}).items():
+            self.descs[offset + i] = desc
+        for i, file_ref in (files or {}).items():
+            self.files[offset + i] = file_ref
+
+    def window(self, start=None, end=None):
+        # the points dated start <= date and time < end, as a new series
+        keep = numpy.ones(len(self), dtype=bool)
+        if start is not None:
+            keep &= self.datetimes >= numpy.datetime64(start, 's')
+        if end is not None:
+            keep &= self.datetimes < numpy.datetime64(end, 's')
+
+        series = TimeSeriesColumns(self.name)
+        series.datetimes = self.datetimes[keep]
+        series.seconds = self.seconds[keep]
+        series.durations = self.durations[keep]
+        series.values = self.values[keep]
+        new_indices = numpy.cumsum(keep) - 1
+        series.descs = dict((new_indices[i], desc) for i, desc in self.descs.items() if keep[i])
+        series.files = dict((new_indices[i], file_ref) for i, file_ref in self.files.items() if keep[i])
+        return series
+
+    def get_datetimes(self, start):
+        # date and time of every point, the points given in hours counted from start
+        offsets = numpy.round(self.durations * 3600).astype('timedelta64[s]')
+        return numpy.where(numpy.isnat(self.datetimes), numpy.datetime64(start, 's') + offsets, self.datetimes)
+
+    def get_element(self, i, dtime, duration, value, for_inp=False):
+        # the element of point i as parsed in dict mode, with the same keys in the same order. for_inp, a series
+        # read from a file is given as written to the *.inp
+        file_name, md5 = self.files.get(i, (None, None))
+        if for_inp and file_name is not None and len(self) == 1:
+            file_name = 'FILE  ' + file_name
+        return ReadOnlyElement(zip(self.point_fields,
+                                   [self.name,
+                                    file_name,
+                                    dtime,
+                                    duration if duration == duration else None,
+                                    value if value == value else None,
+                                    i + 1,
+                                    self.name + ':' + str(i + 1),
+                                    self.descs.get(i, ''),
+                                    md5]))
+
+    def get_point(self, i, for_inp=False):
+        dtime = self.datetimes[i].astype(object)
+        dtime = format_datetime(dtime, self.seconds[i]) if dtime is not None else None
+        return self.get_element(i, dtime, float(self.durations[i]), float(self.values[i]), for_inp)
+
+    def iter_elements(self, for_inp=False, start=0, stop=None):
+        # the elements of the points start <= index < stop. dates and times are the strings dict mode keeps,
+        # the datetime64 values are in datetimes
+        stop = len(self) if stop is None else stop
+        datetimes = format_datetimes(self.datetimes[start:stop], self.seconds[start:stop])
+        durations = self.durations[start:stop].tolist()
+        values = self.values[start:stop].tolist()
+        for i in xrange(len(values)):
+            yield self.get_element(start + i, datetimes[i], durations[i], values[i], for_inp)
+
+class ReadOnlyElement(dict):
+    # the points of columnar time series are made into elements when they're accessed, a change to one
+    # wouldn't be kept and is refused instead. dict() makes a copy that can be changed
+    def refuse(self, *args, **kwargs):
+        raise Exception("Points of columnar time series are read-only, add points with add_elements.")
+
+    __setitem__ = __delitem__ = clear = pop = popitem = setdefault = update = refuse
+
+    def __reduce__(self):
+        # copies and pickles are plain dicts
+        return dict, (dict(self),)
+
+class TimeSeriesElements(object):
+    # read-only sequence of the points of columnar time series as elements, created when accessed
+    def __init__(self, series, for_inp=False):
+        self.series = series
+        self.for_inp = for_inp
+
+    def __len__(self):
+        return sum(len(series) for series in self.series)
+
+    def __iter__(self):
+        for series in self.series:
+            for element in series.iter_elements(self.for_inp):
+                yield element
+
+    def iter_points(self, start, stop):
+        # the points start <= index < stop, counted over all the series
+        for series in self.series:
+            if start < len(series) and stop > 0:
+                for element in series.iter_elements(self.for_inp, max(start, 0), min(stop, len(series))):
+                    yield element
+            start -= len(series)
+            stop -= len(series)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            # a list, as slicing the elements of dict mode gives
+            start, stop, step = i.indices(len(self))
+            indices = xrange(start, stop, step)
+            if not indices:
+                return []
+            first, last = min(indices[0], indices[-1]), max(indices[0], indices[-1])
+            return list(self.iter_points(first, last + 1))[::step]
+        if i < 0:
+            i += len(self)
+        for series in self.series:
+            if 0 <= i < len(series):
+                return series.get_point(i, self.for_inp)
+            i -= len(series)
+        raise IndexError('time series point index out of range')
+
+class TimeSeriesIndex(object):
+    # read-only index of the points of columnar time series by name, 'series:ordinal'
+    def __init__(self, series):
+        self.series = series
+
+    def __getitem__(self, name):
+        series_name, _, ordinal = name.rpartition(':')
+        series = self.series.get(series_name)
+        if series is None or not ordinal.isdigit() or not 0 < int(ordinal) <= len(series):
+            raise KeyError(name)
+        return series.get_point(int(ordinal) - 1)
+
+    def __contains__(self, name):
+        try:
+            self[name]
+        except KeyError:
+            return False
+        return True
+
+class SupportFile(object):
+    # a support file referenced from the *.inp. the file is memory-mapped when first read and its records are
+    # parsed into TimeSeriesColumns a chunk at a time, so that files larger than memory can be queried by
+    # time window. record_format is 'TIMESERIES' for '[date] time value' lines, 'RAINFALL' for the SWMM rain
+    # gage format 'station year month day hour minute value', limited to station if it's given, or None for
+    # files that are only read as bytes. records are expected in time order
+    def __init__(self, path, record_format=None, station=None):
+        self.path = path
+        self.record_format = record_format
+        self.station = station
+        self.data = None
+        self.station_lines = None
+
+    def open(self):
+        if self.data is None:
+            with open(self.path, 'rb') as f:
+                # empty files can't be mapped
+                if os.fstat(f.fileno()).st_size:
+                    self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
                 else:
-                    past_header = True
-                    if re.match(self.pats['desc'], line):
-                        desc = line.strip(self.pats['desc_whitespace'])
-                        element_desc = desc if not element_desc else '\n'.join([element_desc, desc])
-                        continue
-                    else:
-                        line_descs = {'marked' : '', 'unmarked' : ''}
-
-                        if re.search(self.pats['semicolon'], line):
-                            line, line_descs['marked'] = re.split(self.pats['adj_semicolons'], line, maxsplit=1)
-                            line_descs['marked'] = line_descs['marked'].strip(self.pats['desc_whitespace'])
-
-                        line = line.split()
-
-                        min_params_in_removal_line = 8
-                        category_idx = 1
-                        if len(line) != 9:
-                            if line[category_idx] == 'REMOVAL':
-                                if len(line) == min_params_in_removal_line:
-                                    line.append('')
-                                if len(line) >= min_params_in_removal_line:
-                                    if self.long_line_comment:
-                                        raise self._ambiguous_line_exc(line)
-                                    else:
-                                        raise self._unexpected_line_exc(line)
-                                elif len(line) == min_params_in_removal_line:
-                                    line.append('')
-                                else:
-                                    raise self._unexpected_line_exc(line)
-                            elif len(line) > 9 and self.long_line_comment:
-                                line_descs['unmarked'] = ' '.join(line[9:]).strip()
-                                line = line[:9]
-                            else:
-                                raise self._unexpected_line_exc(line)
-
-                        if all(line_descs.values()):
-                            line_desc = ' ; '.join([line_descs['unmarked'], line_descs['marked']])
-                        elif line_descs['marked']:
-                            line_desc = line_descs['marked']
-                        elif line_descs['unmarked']:
-                            line_desc = line_descs['unmarked']
+                    self.data = ''
+        return self.data
+
+    def close(self):
+        if isinstance(self.data, mmap.mmap):
+            self.data.close()
+        self.data = None
+        self.station_lines = None
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def _unexpected_line_exc(self, line):
+        return Exception(self.path + ': Unexpected line format encountered.' + '\n' + str(line))
+
+    def parse_records(self, text):
+        # the records in text, a run of whole lines, as arrays
+        if numpy is None:
+            raise Exception("Support file records require numpy.")
+        columns = TimeSeriesColumns(self.station or os.path.basename(self.path))
+        lines = [line.split(';', 1)[0].split() for line in text.splitlines()]
+        lines = [line for line in lines if line]
+        if self.record_format == 'TIMESERIES':
+            datetimes, durations, values = [], [], []
+            for line in lines:
+                if len(line) == 3:
+                    datetimes.append(line[0] + ' ' + line[1])
+                    durations.append(None)
+                elif len(line) == 2:
+                    datetimes.append(None)
+                    durations.append(parse_hours(line[0]))
+                else:
+                    raise self._unexpected_line_exc(line)
+                values.append(float(line[-1]))
+            columns.extend(datetimes, durations, values)
+        elif self.record_format == 'RAINFALL':
+            if self.station is not None:
+                lines = [line for line in lines if line[0] == self.station]
+            for line in lines:
+                if len(line) != 7:
+                    raise self._unexpected_line_exc(line)
+            parts = numpy.array([line[1:] for line in lines], dtype='float64').reshape(-1, 6)
+            year, month, day, hour, minute = parts[:, :5].astype(numpy.int64).T
+            datetimes, valid = assemble_datetimes(year, month, day, hour * 3600 + minute * 60)
+            if not valid.all():
+                raise self._unexpected_line_exc(lines[numpy.flatnonzero(~valid)[0]])
+            columns.datetimes = datetimes
+            columns.seconds = numpy.zeros(len(datetimes), dtype=bool)
+            columns.durations = numpy.empty(len(datetimes))
+            columns.durations[:] = numpy.nan
+            columns.values = parts[:, 5].copy()
+        else:
+            raise Exception("The records of support file " + self.path + " have no known format.")
+        return columns
+
+    def get_line_end(self, offset):
+        # offset just past the end of the line that offset is in
+        end = self.open().find('\n', offset)
+        return len(self.data) if end < 0 else end + 1
+
+    def first_datetime(self, offset, end, block_size=1 << 12):
+        # date and time of the first record between offset and end, None if there's none or it isn't dated
+        while offset < end:
+            block_end = min(self.get_line_end(offset + block_size), end)
+            columns = self.parse_records(self.data[offset:block_end])
+            if len(columns):
+                return None if numpy.isnat(columns.datetimes[0]) else columns.datetimes[0]
+            offset = block_end
+        return None
+
+    def find_station_lines(self):
+        # offsets of the first line of station and of the end of its last line, the whole file if there's
+        # no station. in rainfall files the lines of a station usually follow one another
+        data = self.open()
+        if self.station_lines is not None:
+            return self.station_lines
+        if self.station is None:
+            return 0, len(data)
+        pattern = re.compile(re.escape(self.station) + '[ \t]')
+        first = 0
+        while not pattern.match(data, first):
+            first = data.find('\n' + self.station, first)
+            if first < 0:
+                self.station_lines = (0, 0)
+                return self.station_lines
+            first += 1
+        last = len(data)
+        while True:
+            last = data.rfind('\n' + self.station, first, last)
+            if last < 0:
+                last = first
+                break
+            if pattern.match(data, last + 1):
+                last += 1
+                break
+        self.station_lines = (first, self.get_line_end(last))
+        return self.station_lines
+
+    def find_offset(self, start):
+        # offset of a line start before which all records are dated earlier than start, found by
+        # bisecting the lines of the station
+        start = numpy.datetime64(start, 's')
+        lo, hi = self.find_station_lines()
+        while hi - lo > 1 << 16:
+            mid = self.get_line_end((lo + hi) // 2)
+            if mid >= hi:
+                break
+            dtime = self.first_datetime(mid, hi)
+            if dtime is None:
+                break
+            if dtime < start:
+                lo = mid
+            else:
+                hi = mid
+        return lo
+
+    def iter_chunks(self, start=None, end=None, chunk_size=1 << 22):
+        # the records dated start <= date and time < end as TimeSeriesColumns, one per chunk of up to about
+        # chunk_size bytes. chunks start small so that short windows are quick. records without a date are
+        # only included when neither start nor end is given
+        data = self.open()
+        first, last = self.find_station_lines()
+        offset = self.find_offset(start) if start is not None else first
+        end_datetime = numpy.datetime64(end, 's') if end is not None else None
+        size = min(chunk_size, 1 << 16)
+        while offset < last:
+            chunk_end = min(self.get_line_end(offset + size), last)
+            columns = self.parse_records(data[offset:chunk_end])
+            offset = chunk_end
+            size = min(size * 2, chunk_size)
+            past_end = end_datetime is not None and len(columns) and columns.datetimes[-1] >= end_datetime
+            if start is not None or end is not None:
+                columns = columns.window(start, end)
+            if len(columns):
+                yield columns
+            if past_end:
+                break
+
+    def window(self, start=None, end=None, chunk_size=1 << 22):
+        # the records dated start <= date and time < end as one TimeSeriesColumns
+        columns = TimeSeriesColumns(self.station or os.path.basename(self.path))
+        chunks = list(self.iter_chunks(start, end, chunk_size))
+        if chunks:
+            columns.datetimes = numpy.concatenate([chunk.datetimes for chunk in chunks])
+            columns.seconds = numpy.concatenate([chunk.seconds for chunk in chunks])
+            columns.durations = numpy.concatenate([chunk.durations for chunk in chunks])
+            columns.values = numpy.concatenate([chunk.values for chunk in chunks])
+        return columns
+
+@ElementClasses.append
+class TimeSeriesPoints(INPElementClass):
+    inp_label = '[TIMESERIES]'
+    def __init__(self, start_lineno=None, end_lineno=None, lines=None):
+        INPElementClass.__init__(self, start_lineno, end_lineno, lines)
+        self.section = self.__class__.__name__
+        self.inp_label = self.__class__.inp_label
+        self.fields = OrderedDict([('TimeSeries', str),
+                                   ('FileName', str),
+                                   ('DateTime', str),
+                                   ('Duration', parse_hours),
+                                   ('Value', float)])
+        self.files = {}
+        self.md5_field = 'FileMD5'
+        self.ordinal_field = 'Ordinal'
+        self.inp_grouping = 'TimeSeries'
+        self.composite_name = ['TimeSeries', self.ordinal_field]
+        self.sort_by = ['TimeSeries']
+        # TimeSeriesColumns by series name when the points are stored as arrays, see columnar_timeseries
+        self.series = None
+        self.defines = {'TimeSeries' : 'TimeSeries'}
+
+    @property
+    def elements(self):
+        elements = INPElementClass.elements.fget(self)
+        if self.series is not None:
+            return TimeSeriesElements(self.series.values())
+        return elements
+
+    @elements.setter
+    def elements(self, elements):
+        self._elements = elements
+
+    def add_elements(self, elements, ignore_fields=[]):
+        if self.series is None:
+            INPElementClass.add_elements(self, elements, ignore_fields=ignore_fields)
+        else:
+            self.add_points(elements)
+
+    def get_index(self):
+        if self.series is None:
+            return INPElementClass.get_index(self)
+        return TimeSeriesIndex(self.series)
+
+    def lookup(self, element_name, refresh=False):
+        if self.series is None:
+            return INPElementClass.lookup(self, element_name, refresh)
+        return TimeSeriesIndex(self.series)[element_name]
+
+    def get_reference_index(self, refresh=False):
+        if self.series is None:
+            return INPElementClass.get_reference_index(self, refresh)
+        # series stored as arrays are indexed by name, their points aren't elements
+        return dict((name, [(series, 'TimeSeries', 'TimeSeries')]) for name, series in self.series.items())
+
+    def get_defined_names(self):
+        if self.series is None:
+            return INPElementClass.get_defined_names(self)
+        return {'TimeSeries' : set(self.series)}
+
+    def add_points(self, elements):
+        # appends points given as elements to the arrays of their series
+        for name, points in itertools.groupby(elements, lambda x: x['TimeSeries']):
+            points = list(points)
+            if name not in self.series:
+                self.series[name] = TimeSeriesColumns(name)
+            descs = dict((i, point[self.desc_field]) for i, point in enumerate(points) if point[self.desc_field])
+            files = dict((i, (point['FileName'], point.get(self.md5_field))) for i, point in enumerate(points)
+                         if point['FileName'] is not None)
+            self.series[name].extend([point['DateTime'] for point in points], [point['Duration'] for point in points],
+                                     [point['Value'] for point in points], descs, files)
+
+    def get_support_file(self, name):
+        # the external file of a FILE series, see SupportFile
+        if self.series is not None:
+            file_names = [file_name for file_name, md5 in self.series[name].files.values()] if name in self.series else []
+        else:
+            file_names = [element['FileName'] for element in self.elements
+                          if element['TimeSeries'] == name and element['FileName'] is not None]
+        if not file_names:
+            raise Exception("Time series " + name + " isn't read from a file.")
+        return SupportFile(self._find_support_file(file_names[0]), 'TIMESERIES')
+
+    def get_series(self, name):
+        # the points of a series as arrays, also when they are stored as elements
+        if self.series is not None:
+            return self.series[name]
+        if numpy is None:
+            raise Exception("Time series arrays require numpy.")
+        points = sorted([element for element in self.elements if element['TimeSeries'] == name],
+                        key=lambda x: x[self.ordinal_field])
+        if not points:
+            raise KeyError(name)
+        series = TimeSeriesColumns(name)
+        series.extend([point['DateTime'] for point in points], [point['Duration'] for point in points],
+                      [point['Value'] for point in points],
+                      dict((i, point[self.desc_field]) for i, point in enumerate(points) if point[self.desc_field]),
+                      dict((i, (point['FileName'], point[self.md5_field])) for i, point in enumerate(points)
+                           if point['FileName'] is not None))
+        return series
+
+    def parse(self):
+        current_series = None
+        decoder = self.get_row_decoder()
+        fields = self.fields.keys()
+        # in columnar mode points are collected briefly as elements and then added to the arrays
+        pending = None
+        if self.columnar_timeseries:
+            if numpy is None:
+                raise Exception("Columnar time series require numpy.")
+            self.series = OrderedDict()
+            pending = []
+
+        def parse_line(original_line):
+            unmarked_desc = ''
+            line = original_line.split()
+            if line[1] == 'FILE' and len(line) > 3:
+                if self.long_line_comment:
+                    has_quote = False
+                    comment_start = False
+                    for j in range(2, len(line)):
+                        val = line[j]
+                        if j == 2:
+                            found_first_quote = re.match('^\'|"', val)
+                            if found_first_quote:
+                                has_quote = True
+                                quote_char = found_first_quote.group()
+                                found_second_quote = re.search("'|\"$", val)
+                                if found_second_quote:
+                                    comment_start = j + 1
+                                    break
                         else:
-                            line_desc = ''
-
-                        if line_desc:
-                            element_desc = line_desc if not element_desc else '\n'.join([element_desc, line_desc])
-
-                        catchtype_colnum = 1
-                        current_catchtype = line[catchtype_colnum]
-
-                        current_fields = fields_by_catchtype[current_catchtype]
-                        current_dtypes = dtypes_by_catchtype[current_catchtype]
-
-                        current_parameters = line[(catchtype_colnum + 1):]
-                        current_parameters = [dtype(current_parameters[j]) for j, dtype in enumerate(current_dtypes)]
-
-                        name_colnum = 0
-                        current_name = line[name_colnum]
-
-                        has_element = False
-                        element_desc = element_desc.replace('\\n', '\n')
-                        for element in self.elements:
-                            if element[self.name_field] == current_name:
-                                has_element = True
-                                for j, field in enumerate(current_fields):
-                                    element[field] = current_parameters[j]
-                                if element['Description'] and element_desc:
-                                    element['Description'] = element['Description'] + '\n' + element_desc
-                                elif element_desc:
-                                    element['Description'] = element_desc
-                                element_desc = ''
+                            if has_quote and re.search('\'|"$', val):
+                                comment_start = j + 1
                                 break
 
-                        if not has_element:
-                            element = dict(zip(fields, [None for j in range(len(fields))]))
-                            element[self.name_field] = current_name
-                            for j, field in enumerate(current_fields):
-                                element[field] = current_parameters[j]
-                            element[self.desc_field] = element_desc
-                            self.elements.append(element)
-                            element_desc = ''
-
-        def inp_lines(self, **kwargs):
-            alt_fields = ['Name', 'CatchmentType', 'Param1', 'Param2', 'Param3', 'Param4', 'Param5', 'Param6', 'Param7']
-
-            elements = []
-            prefixes = ['Plow', 'Impv', 'Perv', 'Rmvl']
-            fieldnames = self.fields.keys()
-            sp_dict = {0:'PLOWABLE', 1:'IMPERVIOUS', 2:'PERVIOUS', 3:'REMOVAL'}
-            for element in self.elements:
-                desc_added = False
-                for i in range(4):
-                    new_element = []
-                    for field in fieldnames[i*7+1:(i+1)*7+1]:
-                        new_element.append(element[field])
-                    if any(new_element):
-                        new_row = tuple([element[self.name_field]] + [sp_dict[i]] + new_element) 
-                        if not desc_added:
-                            new_row = new_row + (element[self.desc_field].strip('\\n'), )
-                            desc_added = True
-                        else:
-                            new_row = new_row + (None, )
-                        elements.append(dict(zip(alt_fields + [self.desc_field], new_row)))
-
-            return super(SnowPacks, self).inp_lines(elements=elements, fieldnames=alt_fields, **kwargs)
-            
-    @element_classes.append
-    class TimeSeriesPoints(INPElementClass):
-        inp_label = '[TIMESERIES]'
-        def __init__(self, start_lineno=None, end_lineno=None):
-            INPElementClass.__init__(self, start_lineno, end_lineno)
-            self.section = self.__class__.__name__
-            self.inp_label = self.__class__.inp_label
-            self.fields = OrderedDict([('TimeSeries', str),
-                                       ('FileName', str),
-                                       ('DateTime', str),
-                                       ('Duration', float),
-                                       ('Value', float)])
-            self.files = {}
-            self.md5_field = 'FileMD5'
-            self.ordinal_field = 'Ordinal'
-            self.inp_grouping = 'TimeSeries'
-            self.composite_name = ['TimeSeries', self.ordinal_field]
-            self.sort_by = ['TimeSeries']
-
-            if start_lineno is not None and end_lineno is not None:
-                self.parse()
+                    if comment_start:
+                        unmarked_desc = ' '.join(line[comment_start:]).strip()
+                        line = line[:2]
+                        line.append(quote_char + original_line.split(quote_char)[1] + quote_char)
+                else:
+                    quote_char = re.match('^"|\'', line[2]).group()
+                    line = line[:2]
+                    line.append(quote_char + original_line.split(quote_char)[1] + quote_char)
+
+            if len(line) == 3:
+                if 'FILE' in line:
+                    line.remove('FILE')
+                    line.extend([None, None, None])
+                else:
+                    line.insert(fields.index('FileName'), None)
+                    line.insert(fields.index('DateTime'), None)
+            else:
+                dtime = ' '.join(line[1:3])
+                line[1] = dtime
+                line = line[:2] + line[3:]
+                line.insert(fields.index('FileName'), None)
+                line.insert(fields.index('Duration'), None)
+
+            line, long_line_desc = self._split_fields(line, len(fields))
+            return line, long_line_desc or unmarked_desc
+
+        for line, element_desc, lineno in self.tokenize(parse_line):
+            series = line[0]
+            if series != current_series:
+                current_series = series
+                current_ordinal = 1
+
+            params = decoder.decode(line)
+            params[self.ordinal_field] = current_ordinal
+            params[self.name_field] = decoder.get_name(params)
+            params[self.desc_field] = element_desc.replace('\\n', '\n').strip()
+            if params['FileName'] is not None and self.require_support_files:
+                filepath = params['FileName'].strip(' \t\n"\'')
+                if not os.path.exists(filepath):
+                    filepath = os.path.join(os.path.dirname(self.inp_path), filepath)
 
-        def parse(self):
-            element_desc = ''
-            current_series = None
-            past_header = False
-            for i in range(self.start_lineno, self.end_lineno):
-                line = self.getline(i)
-                if (re.match(self.pats['header'], line) and not past_header) or re.match(self.pats['blank_or_tag'], line):
-                    continue
+                if not os.path.exists(filepath):
+                    fname = params['FileName']
+                    raise Exception("Can't find support file '" + fname + "' referenced in [TIMESERIES]")
                 else:
-                    past_header = True
-                    if re.match(self.pats['desc'], line):
-                        line = line.strip(self.pats['desc_whitespace'])
-                        element_desc = line if not element_desc else element_desc + '\n' + line
-                        continue
-                    else:
-                        line_descs = {'marked' : '', 'unmarked' : ''}
-
-                        if re.search(self.pats['semicolon'], line):
-                            line, line_descs['marked'] = re.split(self.pats['adj_semicolons'], line, maxsplit=1)
-                            line_descs['marked'] = line_descs['marked'].strip(self.pats['desc_whitespace'])
-
-                        original_line = line
-                        line = line.split()
-                        series = line[0]
-                        if series != current_series:
-                            new_series = True
-                            current_series = series
-                            current_ordinal = 1
-
-                        if line[1] == 'FILE' and len(line) > 3:
-                            if self.long_line_comment:
-                                has_quote = False
-                                comment_start = False
-                                for j in range(2, len(line)):
-                                    val = line[j]
-                                    if j == 2:
-                                        found_first_quote = re.match('^\'|"', val)
-                                        if found_first_quote:
-                                            has_quote = True
-                                            quote_char = found_first_quote.group()
-                                            found_second_quote = re.search("'|\"$", val)
-                                            if found_second_quote:
-                                                comment_start = j + 1
-                                                break
-                                    else:
-                                        if has_quote and re.search('\'|"$', val):
-                                            comment_start = j + 1
-                                            break
-
-                                if comment_start:
-                                    line_descs['unmarked'] = ' '.join(line[comment_start:]).strip()
-                                    line = line[:2]
-                                    line.append(quote_char + original_line.split(quote_char)[1] + quote_char)
-                            else:
-                                quote_char = re.match('^"|\'', line[2]).group()
-                                line = line[:2]
-                                line.append(quote_char + original_line.split(quote_char)[1] + quote_char)
-
-                        fields = self.fields.keys()
-                        if len(line) == 3:
-                            if 'FILE' in line:
-                                line.remove('FILE')
-                                line.extend([None, None, None])
-                            else:
-                                line.insert(fields.index('FileName'), None)
-                                line.insert(fields.index('DateTime'), None)
-                        else:
-                            dtime = ' '.join(line[1:3])
-                            line[1] = dtime
-                            line = line[:2] + line[3:]
-                            line.insert(fields.index('FileName'), None)
-                            line.insert(fields.index('Duration'), None)
-
-                        if len(line) != len(self.fields):
-                            if len(line) > len(self.fields) and self.long_line_comment:
-                                line_descs['unmarked'] = ' '.join(line[len(self.fields):]).strip()
-                                line = line[:len(self.fields)]
-                            else:
-                                raise self._unexpected_line_exc(line)
-
-                        if all(line_descs.values()):
-                            line_desc = ' ; '.join([line_descs['unmarked'], line_descs['marked']])
-                        elif line_descs['marked']:
-                            line_desc = line_descs['marked']
-                        elif line_descs['unmarked']:
-                            line_desc = line_descs['unmarked']
-                        else:
-                            line_desc = ''
-
-                        if line_desc:
-                            element_desc = line_desc if not element_desc else '\n'.join([element_desc, line_desc])
-
-                        line = [self.fields.values()[j](value) if value else value for j, value in enumerate(line)]
-                        params = dict(zip(fields, line))
-                        params[self.ordinal_field] = current_ordinal
-                        params[self.name_field] = ':'.join([str(params[field]) for field in self.composite_name])
-                        params[self.desc_field] = element_desc.replace('\\n', '\n').strip()
-                        if params['FileName'] is not None and self.require_support_files:
-                            filepath = params['FileName'].strip(' \t\n"\'')
-                            if not os.path.exists(filepath):
-                                filepath = os.path.join(os.path.dirname(self.inp_path), filepath)
-
-                            if not os.path.exists(filepath):
-                                fname = params['FileName']
-                                raise Exception("Can't find support file '" + fname + "' referenced in [TIMESERIES]")
-                            else:
-                                params['FileName'] = '"' + os.path.basename(filepath) + '"'
-                                with open(filepath, 'rb') as f:
-                                    fcontents = f.read()
-                                md5 = hashlib.md5(fcontents).hexdigest()
-                                params['FileMD5'] = md5
-                                self.files[filepath] = md5
-                        else:
-                            params['FileMD5'] = None
+                    params['FileName'] = '"' + os.path.basename(filepath) + '"'
+                    md5 = request_file_md5(filepath)
+                    params['FileMD5'] = md5
+                    self.files[filepath] = md5
+            else:
+                params['FileMD5'] = None
 
-                        element_desc = ''
-                        self.elements.append(params)
-                        current_ordinal += 1
-
-        def inp_lines(self, **kwargs):
-            elements = [] 
-            key = lambda x: (x['TimeSeries'], x[self.ordinal_field])
-            for ts, points in itertools.groupby(sorted(self.elements, key=key), lambda x: x['TimeSeries']):
-                points = copy.deepcopy(list(points))
-                if len(points) == 1 and points[0]['FileName']:
-                    point = points[0]
-                    point['FileName'] = 'FILE  ' + point['FileName']
-                    elements.append(point)
+            if pending is None:
+                self.elements.append(params)
+            else:
+                pending.append(params)
+                if len(pending) >= 1 << 16:
+                    self.add_points(pending)
+                    pending = []
+            current_ordinal += 1
+
+        if pending:
+            self.add_points(pending)
+        self._resolve_file_md5s()
+
+    def _resolve_file_md5s(self):
+        INPElementClass._resolve_file_md5s(self)
+        for series in (self.series or {}).values():
+            for i, (file_name, md5) in series.files.items():
+                series.files[i] = (file_name, get_md5(md5))
+
+    def iter_inp_lines(self, **kwargs):
+        alt_fields = self.fields.keys()
+        del alt_fields[alt_fields.index('FileName')]
+        alt_fields.append('FileName')
+        if self.series is not None:
+            elements = TimeSeriesElements([self.series[name] for name in sorted(self.series)], for_inp=True)
+            return super(TimeSeriesPoints, self).iter_inp_lines(elements=elements, fieldnames=alt_fields,
+                                                                presorted=True, **kwargs)
+
+        elements = [] 
+        key = get_row_getter(['TimeSeries', self.ordinal_field], self.elements)
+        for ts, points in itertools.groupby(sorted(self.elements, key=key), lambda x: x['TimeSeries']):
+            points = [dict(point.items()) for point in points]
+            if len(points) == 1 and points[0]['FileName']:
+                point = points[0]
+                point['FileName'] = 'FILE  ' + point['FileName']
+                elements.append(point)
+            else:
+                dated = [point for point in points if isinstance(point['DateTime'], datetime.datetime)]
+                if dated:
+                    if numpy is not None:
+                        texts = format_datetimes([point['DateTime'] for point in dated])
+                    else:
+                        texts = [point['DateTime'].strftime(format='%m/%d/%Y %H:%M:%S') for point in dated]
+                    for point, text in zip(dated, texts):
+                        point['DateTime'] = text
+                elements.extend(points)
+        return super(TimeSeriesPoints, self).iter_inp_lines(elements=elements, fieldnames=alt_fields, **kwargs)
+
+@ElementClasses.append
+class Controls(INPElementClass):
+    inp_label = '[CONTROLS]'
+    def __init__(self, start_lineno=None, end_lineno=None, lines=None):
+        INPElementClass.__init__(self, start_lineno, end_lineno, lines)
+        self.section = self.__class__.__name__
+        self.inp_label = self.__class__.inp_label
+        self.fields = OrderedDict([('RuleName', str),
+                                   ('RuleText', str)])
+
+        self.ordinal_field = 'Ordinal'
+        self.composite_name = [self.ordinal_field, 'RuleName']
+        self.sort_by = [self.ordinal_field]
+
+    def parse(self):
+        current_rule = None
+        last_description = ''
+        current_description = ''
+        current_ordinal = 0
+        
+        def normalize_rule_text(rule_text):
+            rule = re.sub(' +', ' ', re.sub('\n|\t', ' ', rule_text)).strip()
+            object_names = ['pump', 'node', 'orifice', 'weir', 'outlet', 'link', 'simulation']
+            parameter_names = ['status', 'setting', 'on', 'off', 'depth', 'head', 'inflow', 'flow',
+                               'time', 'date', 'month', 'day', 'clocktime']
+            logical_names = ['if', 'then', 'and', 'or', 'priority']
+            modulated_names = ['curve', 'timeseries', 'pid']
+            words_to_cap = object_names + parameter_names + logical_names + modulated_names
+            cap_pat = re.compile(r'\b(' + '|'.join(words_to_cap) + r')\b', re.IGNORECASE)
+            return re.sub(cap_pat, lambda m: m.group(1).upper(), rule)
+
+        for i in range(self.start_lineno, self.end_lineno):
+            line = self.getline(i)
+            if i == (self.end_lineno - 1) and current_rule is not None:
+                desc = current_description.replace('\\n', '\n').strip()
+                element = {'RuleName' : current_rule_name,
+                           self.ordinal_field: current_ordinal,
+                           'RuleText' : normalize_rule_text(current_rule),
+                           self.desc_field : desc
+                          }
+                          # self.desc_field : re.sub('\n$', '', current_description, count = 1) \
+                          #                 if current_description else ''
+                element[self.name_field] = ':'.join([str(element[field]) for field in self.composite_name])
+                self.elements.append(element)
+            elif not line.strip() or line.lstrip()[0] == '[':
+                continue
+            else:
+                line_split = line.split(None, 2)
+                if re.match('rule', line_split[0].strip(), re.IGNORECASE):
+                    if current_rule is not None:
+                        name = ':'.join([str(current_ordinal), current_rule_name])
+                        desc = current_description.replace('\\n', '\n').strip()
+                        self.elements.append({self.name_field: name,
+                                         'RuleName' : current_rule_name,
+                                         'Ordinal' : current_ordinal,
+                                         'RuleText' : normalize_rule_text(current_rule),
+                                         self.desc_field : desc})
+                                         #self.desc_field : re.sub('\n$', '', current_description, count=1) \
+                                         #                if current_description else ''})
+                    current_ordinal += 1
+                    current_rule_name = line_split[1]
+                    current_rule = '' if len(line_split) == 2 else line_split[2]
+                    if last_description != '':
+                        current_description = last_description
+                        current_description = filter(lambda c: c not in ";", current_description)
+                        last_description = ''
+                    else:
+                        current_description = ''
+                elif line.lstrip()[0] == ';':
+                    last_description += line
                 else:
-                    for point in points:
-                        if isinstance(point['DateTime'], datetime.datetime):
-                            point['DateTime'] = point['DateTime'].strftime(format='%m/%d/%Y %H:%M:%S')
-                        elements.append(point)
-            alt_fields = self.fields.keys()
-            del alt_fields[alt_fields.index('FileName')]
-            alt_fields.append('FileName')
-            return super(TimeSeriesPoints, self).inp_lines(elements=elements, fieldnames=alt_fields, **kwargs)
-
-    @element_classes.append
-    class Controls(INPElementClass):
-        inp_label = '[CONTROLS]'
-        def __init__(self, start_lineno=None, end_lineno=None):
-            INPElementClass.__init__(self, start_lineno, end_lineno)
-            self.section = self.__class__.__name__
-            self.inp_label = self.__class__.inp_label
-            self.fields = OrderedDict([('RuleName', str),
-                                       ('RuleText', str)])
-
-            self.ordinal_field = 'Ordinal'
-            self.composite_name = [self.ordinal_field, 'RuleName']
-            self.sort_by = [self.ordinal_field]
-
-            if start_lineno is not None and end_lineno is not None:
-                self.parse()
+                    if last_description != '':
+                        current_description += last_description.strip(';')
+                        last_description = ''
+
+                    current_rule += line
+
+    def iter_inp_lines(self, **kwargs):
+        elements = sorted(self.elements, key=lambda x: x[self.ordinal_field])
+        yield self.inp_label
+        for row in elements:
+            rule_name = row['RuleName']
+            description = row[self.desc_field]
+            if description and not kwargs.get('exclude_descs', False):
+                description = description.decode('string-escape')
+                #description = description.strip('\n')
+                description = description.split('\n')
+                for line in description:
+                    yield ';' + line
+
+            yield '{:<9}'.format('RULE') + rule_name
+            rule_text = row['RuleText']
+            logical_names = ['IF', 'THEN', 'AND', 'OR', 'PRIORITY']
+
+            rule_text = re.sub(r'\b(' + '|'.join(logical_names) + r')\b', lambda m: '\n' + m.group(1), rule_text).strip()
+            rule_text = rule_text.decode('string-escape')
+            rule_text = rule_text.split('\n')
+            rule_text = [line.split(None, 1) for line in rule_text]
+            andorpat = re.compile('and|or', re.IGNORECASE)
+            rule_text = ['{:>8} {}'.format(*line) if re.match(andorpat, line[0]) else '{:<9}{}'.format(*line) 
+                         for line in rule_text]
+            for line in rule_text:
+                yield line
+            yield ''
+
+@ElementClasses.append
+class TransectPoints(INPElementClass):
+    inp_label = '[TRANSECTS]'
+    def __init__(self, start_lineno=None, end_lineno=None, lines=None):
+        INPElementClass.__init__(self, start_lineno, end_lineno, lines)
+        self.section = self.__class__.__name__
+        self.inp_label = self.__class__.inp_label
+        self.fields = OrderedDict([('TransectName', str),
+                                   ('StationCount', int),
+                                   ('LeftBankRoughness', float),
+                                   ('RightBankRoughness', float),
+                                   ('ChannelRoughness', float),
+                                   ('LeftBankStation', float),
+                                   ('RightBankStation', float),
+                                   ('StationsModifier', float),
+                                   ('ElevationsModifier', float),
+                                   ('MeanderModifier', float),
+                                   ('Description', str),
+                                   ('Station_ft', float),
+                                   ('Elevation_ft', float)])
+        self.ordinal_field = 'Ordinal' 
+        self.composite_name = ['TransectName', self.ordinal_field]
+        self.defines = {'TransectName' : 'Transect'}
+
+    def parse(self):
+        current_elements = []
+
+        def parse_line(line):
+            line = line.split()
+            line_marker = line[0]
+            if line_marker == 'NC':
+                return self._split_fields(line, 4)
+            elif line_marker == 'X1':
+                return self._split_fields(line, 10)
+            elif line_marker == 'GR':
+                unmarked_desc = ''
+                if self.long_line_comment:
+                    end_of_parameters = len(line)
+                    for i, x in enumerate(line):
+                        if i:
+                            try:
+                                _ = float(x)
+                            except:
+                                end_of_parameters = i
+                                break
 
-        def parse(self):
-            current_rule = None
-            last_description = ''
-            current_description = ''
-            current_ordinal = 0
-            
-            def normalize_rule_text(rule_text):
-                rule = re.sub(' +', ' ', re.sub('\n|\t', ' ', rule_text)).strip()
-                object_names = ['pump', 'node', 'orifice', 'weir', 'outlet', 'link', 'simulation']
-                parameter_names = ['status', 'setting', 'on', 'off', 'depth', 'head', 'inflow', 'flow',
-                                   'time', 'date', 'month', 'day', 'clocktime']
-                logical_names = ['if', 'then', 'and', 'or', 'priority']
-                modulated_names = ['curve', 'timeseries', 'pid']
-                words_to_cap = object_names + parameter_names + logical_names + modulated_names
-                cap_pat = re.compile(r'\b(' + '|'.join(words_to_cap) + r')\b', re.IGNORECASE)
-                return re.sub(cap_pat, lambda m: m.group(1).upper(), rule)
+                    if end_of_parameters != len(line):
+                        unmarked_desc = ' '.join(line[end_of_parameters:]).strip()
+                        line = line[:end_of_parameters]
 
-            for i in range(self.start_lineno, self.end_lineno):
-                line = self.getline(i)
-                if i == (self.end_lineno - 1) and current_rule is not None:
+                if (len(line) % 2) != 1:
+                    raise self._unexpected_line_exc(line)
+
+                return line, unmarked_desc
+            else:
+                return line, ''
+
+        for line, element_desc, lineno in self.tokenize(parse_line):
+            line_marker = line[0]
+            if line_marker == 'NC':
+                if current_elements:
+                    self.elements.extend(current_elements)
+                    del current_elements[:]
+
+                current_description = element_desc
+                leftroughness = float(line[1])
+                rightroughness = float(line[2])
+                channelroughness = float(line[3])
+                current_ordinal = 1
+            elif line_marker == 'X1':
+                if element_desc:
+                    current_description = element_desc if not current_description  \
+                                          else current_description +'\n'+ element_desc
+                transectname = line[1]
+                numstations = int(line[2])
+                left_bankstation = float(line[3])
+                right_bankstation = float(line[4])
+                meander_mod = float(line[7])
+                station_mod = float(line[8])
+                elev_mod = float(line[9])
+            elif line_marker == 'GR':
+                if element_desc:
+                    current_description = element_desc if not current_description \
+                                          else current_description + '\n' + element_desc
+
+                line = line[1:]
+                if line:
                     desc = current_description.replace('\\n', '\n').strip()
-                    element = {'RuleName' : current_rule_name,
-                               self.ordinal_field: current_ordinal,
-                               'RuleText' : normalize_rule_text(current_rule),
-                               self.desc_field : desc
-                              }
-                              # self.desc_field : re.sub('\n$', '', current_description, count = 1) \
-                              #                 if current_description else ''
-                    element[self.name_field] = ':'.join([str(element[field]) for field in self.composite_name])
-                    self.elements.append(element)
-                elif re.match(self.pats['blank_or_tag'], line):
-                    continue
+                    for element in current_elements:
+                        element['Description'] = desc
+
+                for i in range(0, len(line), 2):
+                    element = {'Name'               : ':'.join([transectname, str(current_ordinal)]),
+                               'TransectName'       : transectname,
+                               self.ordinal_field   : current_ordinal,
+                               'StationCount'       : numstations,
+                               'LeftBankRoughness'  : leftroughness,
+                               'RightBankRoughness' : rightroughness,
+                               'ChannelRoughness'   : channelroughness,
+                               'LeftBankStation'    : left_bankstation,
+                               'RightBankStation'   : right_bankstation,
+                               'StationsModifier'   : station_mod,
+                               'ElevationsModifier' : elev_mod,
+                               'MeanderModifier'    : meander_mod,
+                               self.desc_field      : desc,
+                               'Elevation_ft'       : float(line[i]),
+                               'Station_ft'         : float(line[i+1])
+                               }
+                    current_ordinal += 1
+                    current_elements.append(element)
+
+        if current_elements:
+            self.elements.extend(current_elements)
+
+    def iter_inp_lines(self, **kwargs):
+        yield self.inp_label
+        
+        nc_names = ['LeftBankRoughness', 'RightBankRoughness', 'ChannelRoughness']
+        x1_left_names = ['TransectName', 'StationCount', 'LeftBankStation', 'RightBankStation']
+        x1_right_names = ['MeanderModifier', 'StationsModifier', 'ElevationsModifier']
+        x1_num_filler_zeros = 2
+        
+        currentline_point_count = 0
+        stations_written = 0
+        total_station_count = 0
+
+        col_fwf = '{:<7}'
+        for i, (transect, gr_points) in enumerate(itertools.groupby(self.elements, lambda x: x['TransectName'])):
+            gr_points = sorted(list(gr_points), key=lambda x: x[self.ordinal_field])
+            if i:
+                yield ''
+
+            gr_point = gr_points[0]
+            desc = gr_point[self.desc_field]
+            if desc and not kwargs.get('exclude_descs', False):
+                desc = desc.decode('string-escape')
+                desc = desc.split('\n')
+                for line in desc:
+                    yield '; ' + line
+
+            nc_line = ['NC'] + [col_fwf.format(str(gr_point[name])) for name in nc_names]
+            spacer = ' ' * 5
+            nc_line = spacer.join(nc_line)
+            yield nc_line
+
+            x1_line = ['X1'] + [col_fwf.format(str(gr_point[x1_left_names[0]])), col_fwf.format('')] + \
+                      [col_fwf.format(str(gr_point[name])) for name in x1_left_names[1:]] + \
+                      [col_fwf.format('0') for i in xrange(x1_num_filler_zeros)] + \
+                      [col_fwf.format(str(gr_point[name])) for name in x1_right_names]
+            x1_line = spacer.join(x1_line)
+            yield x1_line
+
+            num_tpoints_per_line = 5
+            point_rows = itertools.izip_longest(*[iter(gr_points)]*num_tpoints_per_line, fillvalue=None)
+
+            for row in point_rows:
+                row = filter(None, row)
+                pnts = [[col_fwf.format(str(x)) for x in [point['Elevation_ft'], point['Station_ft']]] for point in row]
+                yield spacer.join(reduce(lambda x,y: x+y, pnts, ['GR']))
+
+@ElementClasses.append
+class Report(INPElementClass):
+    inp_label = '[REPORT]'
+    def __init__(self, start_lineno=None, end_lineno=None, lines=None):
+        INPElementClass.__init__(self, start_lineno, end_lineno, lines)
+        self.section = self.__class__.__name__
+        self.inp_label = self.__class__.inp_label
+        self.fields = OrderedDict([('INPUT', str),
+                                   ('CONTROLS', str),
+                                   ('SUBCATCHMENTS', str),
+                                   ('NODES', str),
+                                   ('LINKS', str)])
+        self.name_field = None
+        self.desc_field = None
+
+    def parse(self):
+        report = {} 
+        links = []
+        nodes = []
+        catchments = []
+        for i in range(self.start_lineno, self.end_lineno):
+            line = self.getline(i)
+            if self.is_comment_or_blank(line):
+                continue
+            else:
+                line = line.split(None, 1)
+                if len(line) != 2:
+                    raise self._unexpected_line_exc(line)
+                param = line[0].strip().upper()
+                value = line[1].strip()
+                link_pat = re.compile('^link', re.IGNORECASE)
+                node_pat = re.compile('^node', re.IGNORECASE)
+                catch_pat = re.compile('^subcatchments', re.IGNORECASE)
+
+                if re.search(link_pat, param):
+                    links.extend(value.split())
+                elif re.search(node_pat, param):
+                    nodes.extend(value.split())
+                elif re.search(catch_pat, param):
+                    catchments.extend(value.split())
                 else:
-                    line_split = line.split(None, 2)
-                    if re.match('rule', line_split[0].strip(), re.IGNORECASE):
-                        if current_rule is not None:
-                            name = ':'.join([str(current_ordinal), current_rule_name])
-                            desc = current_description.replace('\\n', '\n').strip()
-                            self.elements.append({self.name_field: name,
-                                             'RuleName' : current_rule_name,
-                                             'Ordinal' : current_ordinal,
-                                             'RuleText' : normalize_rule_text(current_rule),
-                                             self.desc_field : desc})
-                                             #self.desc_field : re.sub('\n$', '', current_description, count=1) \
-                                             #                if current_description else ''})
-                        current_ordinal += 1
-                        current_rule_name = line_split[1]
-                        current_rule = '' if len(line_split) == 2 else line_split[2]
-                        if last_description != '':
-                            current_description = last_description
-                            current_description = filter(lambda c: c not in ";", current_description)
-                            last_description = ''
-                        else:
-                            current_description = ''
-                    elif re.match(self.pats['desc'], line):
-                        last_description += line
-                    else:
-                        if last_description != '':
-                            current_description += last_description.strip(';')
-                            last_description = ''
-
-                        current_rule += line
-
-        def inp_lines(self, **kwargs):
-            elements = sorted(self.elements, key=lambda x: x[self.ordinal_field])
-            lines = [self.inp_label]
-            for row in elements:
-                rule_name = row['RuleName']
-                description = row[self.desc_field]
-                if description and not kwargs.get('exclude_descs', False):
-                    description = description.decode('string-escape')
-                    #description = description.strip('\n')
-                    description = description.split('\n')
-                    description = [';' + line for line in description]
-                    lines.extend(description)
-
-                lines.append('{:<9}'.format('RULE') + rule_name)
-                rule_text = row['RuleText']
-                logical_names = ['IF', 'THEN', 'AND', 'OR', 'PRIORITY']
-
-                rule_text = re.sub(r'\b(' + '|'.join(logical_names) + r')\b', lambda m: '\n' + m.group(1), rule_text).strip()
-                rule_text = rule_text.decode('string-escape')
-                rule_text = rule_text.split('\n')
-                rule_text = [line.split(None, 1) for line in rule_text]
-                andorpat = re.compile('and|or', re.IGNORECASE)
-                rule_text = ['{:>8} {}'.format(*line) if re.match(andorpat, line[0]) else '{:<9}{}'.format(*line) 
-                             for line in rule_text]
-                for line in rule_text:
-                    lines.append(line)
-                lines.append('')
-
-            return lines    
-    
-    @element_classes.append
-    class TransectPoints(INPElementClass):
-        inp_label = '[TRANSECTS]'
-        def __init__(self, start_lineno=None, end_lineno=None):
-            INPElementClass.__init__(self, start_lineno, end_lineno)
-            self.section = self.__class__.__name__
-            self.inp_label = self.__class__.inp_label
-            self.fields = OrderedDict([('TransectName', str),
-                                       ('StationCount', int),
-                                       ('LeftBankRoughness', float),
-                                       ('RightBankRoughness', float),
-                                       ('ChannelRoughness', float),
-                                       ('LeftBankStation', float),
-                                       ('RightBankStation', float),
-                                       ('StationsModifier', float),
-                                       ('ElevationsModifier', float),
-                                       ('MeanderModifier', float),
-                                       ('Description', str),
-                                       ('Station_ft', float),
-                                       ('Elevation_ft', float)])
-            self.ordinal_field = 'Ordinal' 
-            if start_lineno is not None and end_lineno is not None:
-                self.parse()
+                    report[param] = self.fields[param](value)
 
-        def parse(self):
-            element_desc = ''
-            current_leftroughness = None
-            past_header = False
-            current_elements = []
-            count = 0
-            for i in range(self.start_lineno, self.end_lineno):
-                line = self.getline(i)
-                if (re.match(self.pats['header'], line) and not past_header) or re.match(self.pats['blank_or_tag'], line):
-                    continue
-                else:
-                    past_header=True
-                    if re.match(self.pats['desc'], line):
-                        line = line.strip(self.pats['desc_whitespace'])
-                        element_desc = line if not element_desc else element_desc + '\n' + line
-                        continue
-                    else:
-                        line_descs = {'marked' : '', 'unmarked' : ''}
-                        if re.search(self.pats['semicolon'], line):
-                            line, line_descs['marked'] = re.split(self.pats['adj_semicolons'], line, maxsplit=1)
-                            line_descs['marked'] = line_descs['marked'].strip(self.pats['desc_whitespace'])
-
-                        line = line.split()
-
-                        line_marker = line[0]
-                        if line_marker == 'NC':
-                            if current_elements:
-                                self.elements.extend(current_elements)
-                                del current_elements[:]
-
-                            num_fields_NC = 4
-                            if len(line) != num_fields_NC:
-                                if len(line) > num_fields_NC and self.long_line_comment:
-                                    line_descs['unmarked'] = ' '.join(line[num_fields_NC:]).strip()
-                                    line = line[:num_fields_NC]
-                                else:
-                                    raise self._unexpected_line_exc(line)
-
-                            if all(line_descs.values()):
-                                line_desc = ' ; '.join([line_descs['unmarked'], line_descs['marked']])
-                            elif line_descs['marked']:
-                                line_desc = line_descs['marked']
-                            elif line_descs['unmarked']:
-                                line_desc = line_descs['unmarked']
-                            else:
-                                line_desc = ''
-
-                            if line_desc:
-                                element_desc = line_desc if not element_desc else '\n'.join([element_desc, line_desc])
-
-                            current_description = element_desc
-                            element_desc = ''
-                            leftroughness = float(line[1])
-                            rightroughness = float(line[2])
-                            channelroughness = float(line[3])
-                            current_ordinal = 1
-                        elif line_marker == 'X1':
-                            num_fields_X1 = 10
-                            if len(line) != num_fields_X1:
-                                if len(line) > num_fields_X1 and self.long_line_comment:
-                                    line_descs['unmarked'] = ' '.join(line[num_fields_X1:]).strip()
-                                    line = line[:num_fields_X1]
-                                else:
-                                    raise self._unexpected_line_exc(line)
-
-                            if all(line_descs.values()):
-                                line_desc = ' ; '.join([line_descs['unmarked'], line_descs['marked']])
-                            elif line_descs['marked']:
-                                line_desc = line_descs['marked']
-                            elif line_descs['unmarked']:
-                                line_desc = line_descs['unmarked']
-                            else:
-                                line_desc = ''
-
-                            if line_desc:
-                                element_desc = line_desc if not element_desc else '\n'.join([element_desc, line_desc])
-
-                            if element_desc:
-                                current_description = element_desc if not current_description  \
-                                                      else current_description +'\n'+ element_desc
-                                element_desc = ''
-                            transectname = line[1]
-                            numstations = int(line[2])
-                            left_bankstation = float(line[3])
-                            right_bankstation = float(line[4])
-                            meander_mod = float(line[7])
-                            station_mod = float(line[8])
-                            elev_mod = float(line[9])
-                        elif line_marker == 'GR':
-                            if self.long_line_comment:
-                                end_of_parameters = len(line)
-                                for i, x in enumerate(line):
-                                    if i:
-                                        try:
-                                            _ = float(x)
-                                        except:
-                                            end_of_parameters = i
-                                            break
-
-                                if end_of_parameters != len(line):
-                                    line_descs['unmarked'] = ' '.join(line[end_of_parameters:]).strip()
-                                    line = line[:end_of_parameters]
-
-                            if (len(line) % 2) != 1:
-                                raise self._unexpected_line_exc(line)
-
-                            if all(line_descs.values()):
-                                line_desc = ' ; '.join([line_descs['unmarked'], line_descs['marked']])
-                            elif line_descs['marked']:
-                                line_desc = line_descs['marked']
-                            elif line_descs['unmarked']:
-                                line_desc = line_descs['unmarked']
-                            else:
-                                line_desc = ''
-
-                            if line_desc:
-                                element_desc = line_desc if not element_desc else '\n'.join([element_desc, line_desc])
-
-                            if element_desc:
-                                current_description = element_desc if not current_description \
-                                                      else current_description + '\n' + element_desc
-                                element_desc = ''
-
-                            line = line[1:]
-                            for i in range(0, len(line), 2):
-                                desc = current_description.replace('\\n', '\n').strip()
-                                if current_elements:
-                                    for element in current_elements:
-                                        element['Description'] = desc
-
-                                element = {'Name'               : ':'.join([transectname, str(current_ordinal)]),
-                                           'TransectName'       : transectname,
-                                           self.ordinal_field   : current_ordinal,
-                                           'StationCount'       : numstations,
-                                           'LeftBankRoughness'  : leftroughness,
-                                           'RightBankRoughness' : rightroughness,
-                                           'ChannelRoughness'   : channelroughness,
-                                           'LeftBankStation'    : left_bankstation,
-                                           'RightBankStation'   : right_bankstation,
-                                           'StationsModifier'   : station_mod,
-                                           'ElevationsModifier' : elev_mod,
-                                           'MeanderModifier'    : meander_mod,
-                                           self.desc_field      : desc,
-                                           'Elevation_ft'       : float(line[i]),
-                                           'Station_ft'         : float(line[i+1])
-                                           }
-                                current_ordinal += 1
-                                current_elements.append(element)
-
-            if current_elements:
-                self.elements.extend(current_elements)
-    
-        def inp_lines(self, **kwargs):
-            lines = [self.inp_label]
-            
-            nc_names = ['LeftBankRoughness', 'RightBankRoughness', 'ChannelRoughness']
-            x1_left_names = ['TransectName', 'StationCount', 'LeftBankStation', 'RightBankStation']
-            x1_right_names = ['MeanderModifier', 'StationsModifier', 'ElevationsModifier']
-            x1_num_filler_zeros = 2
-            
-            currentline_point_count = 0
-            stations_written = 0
-            total_station_count = 0
-
-            col_fwf = '{:<7}'
-            for transect, gr_points in itertools.groupby(self.elements, lambda x: x['TransectName']):
-                gr_points = sorted(list(gr_points), key=lambda x: x[self.ordinal_field])
-                if len(lines) > 1:
-                    lines.append('')
-
-                gr_point = gr_points[0]
-                desc = gr_point[self.desc_field]
-                if desc and not kwargs.get('exclude_descs', False):
-                    desc = desc.decode('string-escape')
-                    desc = desc.split('\n')
-                    desc = ['; ' + line for line in desc]
-                    lines.extend(desc)
-
-                nc_line = ['NC'] + [col_fwf.format(str(gr_point[name])) for name in nc_names]
-                spacer = ' ' * 5
-                nc_line = spacer.join(nc_line)
-                lines.append(nc_line)
-
-                x1_line = ['X1'] + [col_fwf.format(str(gr_point[x1_left_names[0]])), col_fwf.format('')] + \
-                          [col_fwf.format(str(gr_point[name])) for name in x1_left_names[1:]] + \
-                          [col_fwf.format('0') for i in xrange(x1_num_filler_zeros)] + \
-                          [col_fwf.format(str(gr_point[name])) for name in x1_right_names]
-                x1_line = spacer.join(x1_line)
-                lines.append(x1_line)
-
-                num_tpoints_per_line = 5
-                point_rows = itertools.izip_longest(*[iter(gr_points)]*num_tpoints_per_line, fillvalue=None)
-
-                for row in point_rows:
-                    row = filter(None, row)
-                    pnts = [[col_fwf.format(str(x)) for x in [point['Elevation_ft'], point['Station_ft']]] for point in row]
-                    lines.append(spacer.join(reduce(lambda x,y: x+y, pnts, ['GR'])))
-
-            return lines
-
-    @element_classes.append
-    class Report(INPElementClass):
-        inp_label = '[REPORT]'
-        def __init__(self, start_lineno=None, end_lineno=None):
-            INPElementClass.__init__(self, start_lineno, end_lineno)
-            self.section = self.__class__.__name__
-            self.inp_label = self.__class__.inp_label
-            self.fields = OrderedDict([('INPUT', str),
-                                       ('CONTROLS', str),
-                                       ('SUBCATCHMENTS', str),
-                                       ('NODES', str),
-                                       ('LINKS', str)])
-            self.name_field = None
-            self.desc_field = None
-
-            if start_lineno is not None and end_lineno is not None:
-                self.parse()
+        report['LINKS'] = ' '.join(links) if links else None
+        report['NODES'] = ' '.join(nodes) if nodes else None
+        report['SUBCATCHMENTS'] = ' '.join(catchments) if catchments else None
 
-        def parse(self):
-            report = {} 
-            links = []
-            nodes = []
-            catchments = []
-            for i in range(self.start_lineno, self.end_lineno):
-                line = self.getline(i)
-                if re.match(self.pats['desc'], line) or re.match(self.pats['blank_or_tag'], line):
-                    continue
-                else:
-                    line = line.split(None, 1)
-                    if len(line) != 2:
+        if all([value is None for value in report.values()]):
+            self.elements = []
+        else:
+            self.elements = [report]
+
+    def iter_inp_lines(self, **kwargs):
+        row = self.elements[0]
+        lines = ['' for i in xrange(len(self.fields) + 1)]
+        label_col_width = max([len(field) for field in self.fields.keys()])
+        format_str = '{:<' + str(label_col_width) + '}'
+        lines[0] = self.inp_label
+        for i, field in enumerate(self.fields.keys()):
+            value = row[field]
+            line = format_str.format(field) + ' ' * 7 + str(value)
+            lines[i + 1] = line
+        return lines 
+
+@ElementClasses.append
+class Maps(INPElementClass):
+    inp_label = '[MAP]'
+    def __init__(self, start_lineno=None, end_lineno=None, lines=None):
+        INPElementClass.__init__(self, start_lineno, end_lineno, lines)
+        self.section = self.__class__.__name__
+        self.inp_label = self.__class__.inp_label
+        self.fields = OrderedDict([('LLXCoordinate', float),
+                                   ('LLYCoordinate', float),
+                                   ('URXCoordinate', float), 
+                                   ('URYCoordinate', float),
+                                   ('Units', str)])
+
+        self.name_field = None
+        self.desc_field = None
+
+    def parse(self):
+        map_opts = {}
+        for i in range(self.start_lineno, self.end_lineno):
+            line = self.getline(i)
+            if self.is_comment_or_blank(line):
+                continue
+            else:
+                line = line.split(None, 1)
+                if len(line) != 2:
+                    raise self._unexpected_line_exc(line)
+                elif re.match('dimensions', line[0], re.IGNORECASE):
+                    dims = line[1].split()
+                    if len(dims) != 4:
                         raise self._unexpected_line_exc(line)
-                    param = line[0].strip().upper()
-                    value = line[1].strip()
-                    link_pat = re.compile('^link', re.IGNORECASE)
-                    node_pat = re.compile('^node', re.IGNORECASE)
-                    catch_pat = re.compile('^subcatchments', re.IGNORECASE)
-
-                    if re.search(link_pat, param):
-                        links.extend(value.split())
-                    elif re.search(node_pat, param):
-                        nodes.extend(value.split())
-                    elif re.search(catch_pat, param):
-                        catchments.extend(value.split())
                     else:
-                        report[param] = self.fields[param](value)
-
-            report['LINKS'] = ' '.join(links) if links else None
-            report['NODES'] = ' '.join(nodes) if nodes else None
-            report['SUBCATCHMENTS'] = ' '.join(catchments) if catchments else None
+                        dims = [float(dim) for dim in dims]
+                        map_opts['LLXCoordinate'] = dims[0]
+                        map_opts['LLYCoordinate'] = dims[1]
+                        map_opts['URXCoordinate'] = dims[2]
+                        map_opts['URYCoordinate'] = dims[3]
+                elif re.match('units', line[0], re.IGNORECASE):
+                    map_opts['Units'] = line[1].strip()
+                else:
+                    raise self._unexpected_line_exc(line)
 
-            if all([value is None for value in report.values()]):
-                self.elements = []
+        if not map_opts:
+            self.elements = []
+        else:
+            self.elements = [map_opts]
+
+    def iter_inp_lines(self, **kwargs):
+        row = self.elements[0]
+        lines = ['' for i in xrange(3)]
+        lines[0] = self.inp_label
+        dim_names = ['LLXCoordinate', 'LLYCoordinate', 'URXCoordinate', 'URYCoordinate']
+        dims = [str(row[dim_name]) for dim_name in dim_names]
+        dims_line = ' '.join(['DIMENSIONS'] + dims)
+        lines[1] = dims_line
+        lines[2] = 'Units      ' + row['Units']
+        return lines
+
+@ElementClasses.append
+class Profiles(INPElementClass):
+    inp_label = '[PROFILES]'
+    def __init__(self, start_lineno=None, end_lineno=None, lines=None):
+        INPElementClass.__init__(self, start_lineno, end_lineno, lines)
+        self.section = self.__class__.__name__
+        self.inp_label = self.__class__.inp_label
+        self.fields = OrderedDict([('Profile', str), ('Link', str)])
+        self.desc_field = None
+        self.ordinal_field = 'Ordinal'
+        self.inp_grouping = 'Profile'
+        self.references = {'Link' : 'Link'}
+        self.deleted_with = ['Link']
+
+    def parse(self):
+        last_profile = ''
+        for i in range(self.start_lineno, self.end_lineno):
+            line = self.getline(i)
+            if self.is_comment_or_blank(line):
+                continue
             else:
-                self.elements = [report]
-
-        def inp_lines(self, **kwargs):
-            row = self.elements[0]
-            lines = ['' for i in xrange(len(self.fields) + 1)]
-            label_col_width = max([len(field) for field in self.fields.keys()])
-            format_str = '{:<' + str(label_col_width) + '}'
-            lines[0] = self.inp_label
-            for i, field in enumerate(self.fields.keys()):
-                value = row[field]
-                line = format_str.format(field) + ' ' * 7 + str(value)
-                lines[i + 1] = line
-            return lines 
-
-    @element_classes.append
-    class Maps(INPElementClass):
-        inp_label = '[MAP]'
-        def __init__(self, start_lineno=None, end_lineno=None):
-            INPElementClass.__init__(self, start_lineno, end_lineno)
-            self.section = self.__class__.__name__
-            self.inp_label = self.__class__.inp_label
-            self.fields = OrderedDict([('LLXCoordinate', float),
-                                       ('LLYCoordinate', float),
-                                       ('URXCoordinate', float), 
-                                       ('URYCoordinate', float),
-                                       ('Units', str)])
-
-            self.name_field = None
-            self.desc_field = None
-
-            if start_lineno is not None and end_lineno is not None:
-                self.parse()
+                line = line.split()
+                if line[0].strip()[0] == '"':
+                    item_indx = 1
+                    name = ''
+                    for j, item in enumerate(line):
+                        name += item + ' '
+                        if re.search('"$', item):
+                            second_quote_index = j
+                            break
 
-        def parse(self):
-            map_opts = {}
-            for i in range(self.start_lineno, self.end_lineno):
-                line = self.getline(i)
-                if re.match(self.pats['desc'], line) or re.match(self.pats['blank_or_tag'], line):
-                    continue
+                    new_line = [name.strip()] + line[(second_quote_index + 1):]
+                    line = new_line
                 else:
-                    line = line.split(None, 1)
-                    if len(line) != 2:
-                        raise self._unexpected_line_exc(line)
-                    elif re.match('dimensions', line[0], re.IGNORECASE):
-                        dims = line[1].split()
-                        if len(dims) != 4:
-                            raise self._unexpected_line_exc(line)
-                        else:
-                            dims = [float(dim) for dim in dims]
-                            map_opts['LLXCoordinate'] = dims[0]
-                            map_opts['LLYCoordinate'] = dims[1]
-                            map_opts['URXCoordinate'] = dims[2]
-                            map_opts['URYCoordinate'] = dims[3]
-                    elif re.match('units', line[0], re.IGNORECASE):
-                        map_opts['Units'] = line[1].strip()
-                    else:
+                    line[0] = '"' + line[0] + '"'
+
+                if len(line) != 6:
+                    if len(line) < 2 or len(line) > 6:
                         raise self._unexpected_line_exc(line)
 
-            if not map_opts:
-                self.elements = []
-            else:
-                self.elements = [map_opts]
-
-        def inp_lines(self, **kwargs):
-            row = self.elements[0]
-            lines = ['' for i in xrange(3)]
-            lines[0] = self.inp_label
-            dim_names = ['LLXCoordinate', 'LLYCoordinate', 'URXCoordinate', 'URYCoordinate']
-            dims = [str(row[dim_name]) for dim_name in dim_names]
-            dims_line = ' '.join(['DIMENSIONS'] + dims)
-            lines[1] = dims_line
-            lines[2] = 'Units      ' + row['Units']
-            return lines
-
-    @element_classes.append
-    class Profiles(INPElementClass):
-        inp_label = '[PROFILES]'
-        def __init__(self, start_lineno=None, end_lineno=None):
-            INPElementClass.__init__(self, start_lineno, end_lineno)
-            self.section = self.__class__.__name__
-            self.inp_label = self.__class__.inp_label
-            self.fields = OrderedDict([('Profile', str), ('Link', str)])
-            self.desc_field = None
-            self.ordinal_field = 'Ordinal'
-            self.inp_grouping = 'Profile'
-            
-            if start_lineno is not None and end_lineno is not None:
-                self.parse()
+                current_profile = line[0]
+                if current_profile != last_profile:
+                    last_profile = current_profile
+                    current_ordinal = 1
+
+                for link in line[1:]:
+                    element = {self.name_field       : ':'.join([current_profile, str(current_ordinal)]),
+                               'Profile'    : current_profile,
+                               'Link'       : link,
+                               self.ordinal_field : current_ordinal}
+                    current_ordinal += 1
+                    self.elements.append(element)
 
-        def parse(self):
-            last_profile = ''
-            for i in range(self.start_lineno, self.end_lineno):
-                line = self.getline(i)
-                if re.match(self.pats['desc'], line) or re.match(self.pats['blank_or_tag'], line):
-                    continue
-                else:
-                    line = line.split()
-                    if line[0].strip()[0] == '"':
-                        item_indx = 1
-                        name = ''
-                        for j, item in enumerate(line):
-                            name += item + ' '
-                            if re.search('"$', item):
-                                second_quote_index = j
-                                break
+    def iter_inp_lines(self, **kwargs):
+        key = lambda x: (x['Profile'], x[self.ordinal_field])
+        elements = sorted(self.elements, key=key)
 
-                        new_line = [name.strip()] + line[(second_quote_index + 1):]
-                        line = new_line
-                    else:
-                        line[0] = '"' + line[0] + '"'
+        profile_names = [row['Profile'] for row in self.elements]
+        profile_names = sorted(list(set(profile_names)))
 
-                    if len(line) != 6:
-                        if len(line) < 2 or len(line) > 6:
-                            raise self._unexpected_line_exc(line)
+        formatted_table = []
+        for profile in profile_names:
+            sub_table = [row for row in elements if row['Profile'] == profile]
+            sub_table = sorted(sub_table, key = lambda x: x[self.ordinal_field])
 
-                    current_profile = line[0]
-                    if current_profile != last_profile:
-                        last_profile = current_profile
-                        current_ordinal = 1
-
-                    for link in line[1:]:
-                        element = {self.name_field       : ':'.join([current_profile, str(current_ordinal)]),
-                                   'Profile'    : current_profile,
-                                   'Link'       : link,
-                                   self.ordinal_field : current_ordinal}
-                        current_ordinal += 1
-                        self.elements.append(element)
-
-        def inp_lines(self, **kwargs):
-            key = lambda x: (x['Profile'], x[self.ordinal_field])
-            elements = sorted(self.elements, key=key)
-
-            profile_names = [row['Profile'] for row in self.elements]
-            profile_names = sorted(list(set(profile_names)))
-
-            formatted_table = []
-            for profile in profile_names:
-                sub_table = [row for row in elements if row['Profile'] == profile]
-                sub_table = sorted(sub_table, key = lambda x: x[self.ordinal_field])
-
-                current_link_str = ''
-                num_links_per_line = 5
-                subtable_len = len(sub_table)
-                for i, row in enumerate(sub_table):
-                    if not re.search('^"', profile):
-                        profile_name = '"' + profile + '"'
-                    else:
-                        profile_name = profile
+            current_link_str = ''
+            num_links_per_line = 5
+            subtable_len = len(sub_table)
+            for i, row in enumerate(sub_table):
+                if not re.search('^"', profile):
+                    profile_name = '"' + profile + '"'
+                else:
+                    profile_name = profile
 
-                    if i > 0 and (i % num_links_per_line) == 0:
+                if i > 0 and (i % num_links_per_line) == 0:
+                    formatted_table.append([profile_name, current_link_str])
+                    current_link_str = row['Link'] + ' '
+                    if i == (subtable_len -1):
                         formatted_table.append([profile_name, current_link_str])
-                        current_link_str = row['Link'] + ' '
-                        if i == (subtable_len -1):
-                            formatted_table.append([profile_name, current_link_str])
-                    elif i == (subtable_len - 1):
-                        current_link_str += row['Link']
-                        formatted_table.append([profile_name, current_link_str])
-                    else:
-                        current_link_str += row['Link'] + ' '
-
-            new_colnames = ['Profile', 'Links']
-            formatted_table = [dict((col, val) for col, val in zip(new_colnames, row)) for row in formatted_table]
-            for i, row in enumerate(formatted_table):
-                row[self.name_field] = row['Profile']
-                row[self.ordinal_field] = i
-
-            return super(Profiles, self).inp_lines(elements=formatted_table, fieldnames=new_colnames, **kwargs)
-
-    @element_classes.append
-    class NodeInflows(CompositeElementClass):
-        inp_label = None
-        def __init__(self, Inflows=Inflows(), DWF=DWF()):
-            CompositeElementClass.__init__(self, Inflows=Inflows, DWF=DWF)
-            self.section = self.__class__.__name__
-            self.inp_label = self.__class__.inp_label
-                
-    return element_classes
+                elif i == (subtable_len - 1):
+                    current_link_str += row['Link']
+                    formatted_table.append([profile_name, current_link_str])
+                else:
+                    current_link_str += row['Link'] + ' '
+
+        new_colnames = ['Profile', 'Links']
+        formatted_table = [dict((col, val) for col, val in zip(new_colnames, row)) for row in formatted_table]
+        for i, row in enumerate(formatted_table):
+            row[self.name_field] = row['Profile']
+            row[self.ordinal_field] = i
+
+        return super(Profiles, self).iter_inp_lines(elements=formatted_table, fieldnames=new_colnames, **kwargs)
+
+@ElementClasses.append
+class NodeInflows(CompositeElementClass):
+    inp_label = None
+    def __init__(self, Inflows=None, DWF=None):
+        if Inflows is None:
+            Inflows = ElementClasses.classes_by_name['Inflows']()
+        if DWF is None:
+            DWF = ElementClasses.classes_by_name['DWF']()
+        CompositeElementClass.__init__(self, Inflows=Inflows, DWF=DWF)
+        self.section = self.__class__.__name__
+        self.inp_label = self.__class__.inp_label
+
+def get_csr(ends, num_nodes):
+    # the links sorted by the node at one end, and where each node's run of links starts
+    links = numpy.argsort(ends, kind='mergesort').astype(numpy.int32)
+    offsets = numpy.zeros(num_nodes + 1, dtype=numpy.int32)
+    numpy.cumsum(numpy.bincount(ends, minlength=num_nodes), out=offsets[1:])
+    return offsets, links
+
+def get_csr_positions(offsets, nodes):
+    # the positions of the runs of several nodes, concatenated
+    starts = offsets[nodes]
+    counts = offsets[nodes + 1] - starts
+    return numpy.arange(counts.sum()) + numpy.repeat(starts - (numpy.cumsum(counts) - counts), counts)
+
+class Network(object):
+    # integer ids for the nodes and links of a model, and the links leaving and entering each node in
+    # compressed sparse row form, see INP.network
+    node_sections = ['Junctions', 'Outfalls', 'Dividers', 'Storage']
+    link_sections = ['Conduits', 'Pumps', 'Orifices', 'Weirs', 'Outlets']
+    # frontiers smaller than this are traversed in python, see traverse
+    small_frontier = 64
+
+    def __init__(self, objects):
+        if numpy is None:
+            raise Exception("The network graph requires numpy.")
+        self.signature = self.get_signature(objects)
+
+        # nodes are numbered in section order, the first entry of a name wins. link ends that aren't
+        # in any node section are numbered after them and have no section
+        self.node_names = []
+        self.node_ids = {}
+        node_section_ids = []
+        for i, section in enumerate(self.node_sections):
+            if section in objects:
+                name_field = objects[section].name_field
+                for element in objects[section].get_elements():
+                    name = element[name_field]
+                    if name not in self.node_ids:
+                        self.node_ids[name] = len(self.node_names)
+                        self.node_names.append(name)
+                        node_section_ids.append(i)
+
+        self.link_names = []
+        self.link_ids = {}
+        self.link_elements = []
+        link_section_ids = []
+        link_ends = []
+        for i, section in enumerate(self.link_sections):
+            if section in objects:
+                name_field = objects[section].name_field
+                for element in objects[section].get_elements():
+                    name = element[name_field]
+                    if name not in self.link_ids:
+                        self.link_ids[name] = len(self.link_names)
+                        self.link_names.append(name)
+                        self.link_elements.append(element)
+                        link_section_ids.append(i)
+                        link_ends.append(element['InletNode'])
+                        link_ends.append(element['OutletNode'])
+
+        for name in link_ends:
+            if name not in self.node_ids:
+                self.node_ids[name] = len(self.node_names)
+                self.node_names.append(name)
+                node_section_ids.append(-1)
+
+        self.num_nodes = len(self.node_names)
+        self.num_links = len(self.link_names)
+        self.node_section_ids = numpy.array(node_section_ids, dtype=numpy.int8)
+        self.link_section_ids = numpy.array(link_section_ids, dtype=numpy.int8)
+        node_ids = self.node_ids
+        link_ends = numpy.array([node_ids[name] for name in link_ends], dtype=numpy.int32).reshape(-1, 2)
+        self.link_from = link_ends[:, 0].copy()
+        self.link_to = link_ends[:, 1].copy()
+        self.out_offsets, self.out_links = get_csr(self.link_from, self.num_nodes)
+        self.in_offsets, self.in_links = get_csr(self.link_to, self.num_nodes)
+        self.adjacency = {'out' : (self.out_offsets, self.out_links, self.link_to),
+                          'in'  : (self.in_offsets, self.in_links, self.link_from)}
+        self.adjacency_lists = {}
+
+    @classmethod
+    def get_signature(cls, objects):
+        # the node and link sections with their element lists, compared by identity, and lengths
+        signature = []
+        for section in cls.node_sections + cls.link_sections:
+            if section in objects:
+                elements = objects[section].get_elements()
+                signature.append((objects[section], elements, len(elements)))
+        return signature
+
+    def is_current(self, objects):
+        signature = self.get_signature(objects)
+        return len(signature) == len(self.signature) and \
+            all(obj is other_obj and elements is other_elements and length == other_length
+                for (obj, elements, length), (other_obj, other_elements, other_length) in zip(signature, self.signature))
+
+    def get_node_ids(self, names):
+        if isinstance(names, basestring):
+            names = [names]
+        try:
+            return numpy.array([self.node_ids[name] for name in names], dtype=numpy.int32)
+        except KeyError as e:
+            raise Exception("No node " + str(e.args[0]) + " in the network.")
+
+    def get_link_id(self, name):
+        try:
+            return self.link_ids[name]
+        except KeyError:
+            raise Exception("No link " + str(name) + " in the network.")
+
+    def get_adjacency(self, upstream=False, directed=True, as_lists=False):
+        # (offsets, links, far ends) for each direction the links are followed in
+        directions = []
+        if upstream or not directed:
+            directions.append('in')
+        if not upstream or not directed:
+            directions.append('out')
+        if as_lists:
+            for direction in directions:
+                if direction not in self.adjacency_lists:
+                    self.adjacency_lists[direction] = tuple(array.tolist() for array in self.adjacency[direction])
+            return [self.adjacency_lists[direction] for direction in directions]
+        return [self.adjacency[direction] for direction in directions]
+
+    def traverse(self, node_ids, upstream=False, directed=True, target=None):
+        # breadth first, a whole frontier of nodes at a time. returns the reached nodes, the links that
+        # were followed and the link each node was first reached by (-1 for the start nodes). frontiers of
+        # a few nodes, as along a chain of links, are cheaper to step through in python
+        visited_bytes = bytearray(self.num_nodes)
+        visited = numpy.frombuffer(visited_bytes, dtype=numpy.bool_)
+        followed = numpy.zeros(self.num_links, dtype=bool)
+        reached_by = numpy.empty(self.num_nodes, dtype=numpy.int32)
+        reached_by[:] = -1
+        adjacency = self.get_adjacency(upstream, directed)
+        adjacency_lists = self.get_adjacency(upstream, directed, as_lists=True)
+        followed_links, reached_nodes, reached_links = [], [], []
+        follow, reach_node, reach_link = followed_links.append, reached_nodes.append, reached_links.append
+        frontier = numpy.unique(node_ids)
+        visited[frontier] = True
+        while len(frontier) and (target is None or not visited_bytes[target]):
+            if len(frontier) < self.small_frontier:
+                if not isinstance(frontier, list):
+                    frontier = frontier.tolist()
+                while frontier and len(frontier) < self.small_frontier and (target is None or not visited_bytes[target]):
+                    reached = []
+                    for offsets, links, ends in adjacency_lists:
+                        for node in frontier:
+                            for link in links[offsets[node]:offsets[node + 1]]:
+                                follow(link)
+                                end = ends[link]
+                                if not visited_bytes[end]:
+                                    visited_bytes[end] = 1
+                                    reach_node(end)
+                                    reach_link(link)
+                                    reached.append(end)
+                    frontier = reached
+            else:
+                frontier = numpy.asarray(frontier, dtype=numpy.int32)
+                reached = []
+                for offsets, links, ends in adjacency:
+                    links = links[get_csr_positions(offsets, frontier)]
+                    followed[links] = True
+                    ends = ends[links]
+                    new = ~visited[ends]
+                    reached_by[ends[new]] = links[new]
+                    reached.append(ends[new])
+                frontier = numpy.unique(numpy.concatenate(reached))
+                visited[frontier] = True
+
+        followed[followed_links] = True
+        reached_by[reached_nodes] = reached_links
+        return numpy.flatnonzero(visited), numpy.flatnonzero(followed), reached_by
+
+    def trace(self, names, upstream=False):
+        # the names of the nodes and links upstream or downstream of the given nodes, including them
+        nodes, links, reached_by = self.traverse(self.get_node_ids(names), upstream)
+        return [self.node_names[i] for i in nodes.tolist()], [self.link_names[i] for i in links.tolist()]
+
+    def upstream(self, names):
+        return self.trace(names, upstream=True)
+
+    def downstream(self, names):
+        return self.trace(names, upstream=False)
+
+    def shortest_path(self, source, target, directed=True, weight=None):
+        # the names of the links on a path with the fewest links, or the least total of a link field such
+        # as 'Length' (links without it count 0). None when there is no path
+        source, target = self.get_node_ids([source, target]).tolist()
+        if weight is None:
+            reached_by = self.traverse([source], directed=directed, target=target)[2]
+            if source != target and reached_by[target] < 0:
+                return None
+        else:
+            reached_by = self.get_least_weight_links(source, target, directed, weight)
+            if reached_by is None:
+                return None
+
+        if not isinstance(reached_by, dict):
+            reached_by = reached_by.tolist()
+        path = []
+        node = target
+        while node != source:
+            link = reached_by[node]
+            path.append(self.link_names[link])
+            node = self.link_from.item(link) if self.link_to.item(link) == node else self.link_to.item(link)
+        path.reverse()
+        return path
+
+    def get_least_weight_links(self, source, target, directed, weight):
+        # dijkstra, with the link each node is reached by
+        weights = [element.get(weight) or 0.0 for element in self.link_elements]
+        adjacency = self.get_adjacency(False, directed, as_lists=True)
+        distances = {source : 0.0}
+        reached_by = {}
+        done = set()
+        heap = [(0.0, source)]
+        while heap:
+            distance, node = heapq.heappop(heap)
+            if node in done:
+                continue
+            if node == target:
+                return reached_by
+            done.add(node)
+            for offsets, links, ends in adjacency:
+                for link in links[offsets[node]:offsets[node + 1]]:
+                    end = ends[link]
+                    new_distance = distance + weights[link]
+                    if end not in distances or new_distance < distances[end]:
+                        distances[end] = new_distance
+                        reached_by[end] = link
+                        heapq.heappush(heap, (new_distance, end))
+        return None
+
+    def component_labels(self):
+        # weakly connected components, numbered by their lowest node id. links between different
+        # components hook the higher component onto the lower one, then every label is pointed at its root
+        labels = numpy.arange(self.num_nodes, dtype=numpy.int32)
+        while True:
+            link_from = labels[self.link_from]
+            link_to = labels[self.link_to]
+            apart = link_from != link_to
+            if not apart.any():
+                break
+            low = numpy.minimum(link_from[apart], link_to[apart])
+            high = numpy.maximum(link_from[apart], link_to[apart])
+            labels[high] = low
+            while True:
+                roots = labels[labels]
+                if (roots == labels).all():
+                    break
+                labels = roots
+        return numpy.unique(labels, return_inverse=True)[1]
+
+    def components(self):
+        # the node names of each connected component, largest first
+        if not self.num_nodes:
+            return []
+        labels = self.component_labels()
+        order = numpy.argsort(labels, kind='mergesort')
+        bounds = numpy.cumsum(numpy.bincount(labels))[:-1]
+        components = [[self.node_names[i] for i in nodes] for nodes in numpy.split(order, bounds)]
+        components.sort(key=len, reverse=True)
+        return components
+
+    def orphan_nodes(self):
+        # the names of the nodes no link starts or ends at
+        degrees = numpy.bincount(self.link_from, minlength=self.num_nodes) + \
+            numpy.bincount(self.link_to, minlength=self.num_nodes)
+        return [self.node_names[i] for i in numpy.flatnonzero((degrees == 0) & (self.node_section_ids >= 0)).tolist()]
+
+    def missing_nodes(self):
+        # (link name, node name) for the link ends that aren't in any node section
+        missing = []
+        for ends in [self.link_from, self.link_to]:
+            links = numpy.flatnonzero(self.node_section_ids[ends] < 0)
+            missing.extend(zip(links.tolist(), ends[links].tolist()))
+        missing.sort()
+        return [(self.link_names[link], self.node_names[node]) for link, node in missing]
+
+    def nodes_without_outfall(self):
+        # the names of the nodes no path of links in their direction leads from to an outfall
+        outfalls = numpy.flatnonzero(self.node_section_ids == self.node_sections.index('Outfalls'))
+        drained = numpy.zeros(self.num_nodes, dtype=bool)
+        drained[self.traverse(outfalls, upstream=True)[0]] = True
+        return [self.node_names[i] for i in numpy.flatnonzero(~drained & (self.node_section_ids >= 0)).tolist()]
+
+    def peel(self, upstream=False):
+        # removes the nodes no link enters, then those whose entering links all come from removed nodes, and
+        # so on. upstream, the links leaving the nodes count instead. returns whether each node is left,
+        # which it is when it's on a directed cycle or downstream (upstream) of one. the counts of links
+        # left are shared by an array and a numpy view of it, small frontiers are stepped through in
+        # python as in traverse
+        [(offsets, links, ends)] = self.get_adjacency(upstream)
+        [(offsets_list, links_list, ends_list)] = self.get_adjacency(upstream, as_lists=True)
+        degrees_array = array.array('i')
+        degrees_array.fromstring(numpy.bincount(ends, minlength=self.num_nodes).astype(numpy.int32).tostring())
+        degrees = numpy.frombuffer(degrees_array, dtype=numpy.int32)
+        left = numpy.ones(self.num_nodes, dtype=bool)
+        removed_nodes = []
+        remove = removed_nodes.extend
+        frontier = numpy.flatnonzero(degrees == 0)
+        while len(frontier):
+            if len(frontier) < self.small_frontier:
+                if not isinstance(frontier, list):
+                    frontier = frontier.tolist()
+                while frontier and len(frontier) < self.small_frontier:
+                    remove(frontier)
+                    reached = []
+                    for node in frontier:
+                        for link in links_list[offsets_list[node]:offsets_list[node + 1]]:
+                            end = ends_list[link]
+                            degrees_array[end] -= 1
+                            if not degrees_array[end]:
+                                reached.append(end)
+                    frontier = reached
+            else:
+                frontier = numpy.asarray(frontier, dtype=numpy.int32)
+                left[frontier] = False
+                reached, counts = numpy.unique(ends[links[get_csr_positions(offsets, frontier)]], return_counts=True)
+                degrees[reached] -= counts.astype(numpy.int32)
+                frontier = reached[degrees[reached] == 0]
+        left[removed_nodes] = False
+        return left
+
+    def cycles(self):
+        # the node names of each group of nodes that directed cycles join, largest first. peeling from both
+        # ends leaves the nodes on cycles and between them, which are split into strongly connected
+        # components by tarjan's algorithm with an explicit stack
+        core = self.peel() & self.peel(upstream=True)
+        if not core.any():
+            return []
+        in_core = bytearray(core.astype(numpy.uint8).tostring())
+        self_loops = set(self.link_from[self.link_from == self.link_to].tolist())
+        [(offsets, links, ends)] = self.get_adjacency(as_lists=True)
+        order = {}
+        lowest = {}
+        stack = []
+        on_stack = set()
+        cycles = []
+        for root in numpy.flatnonzero(core).tolist():
+            if root in order:
+                continue
+            order[root] = lowest[root] = len(order)
+            stack.append(root)
+            on_stack.add(root)
+            work = [(root, offsets[root])]
+            while work:
+                node, position = work[-1]
+                if position < offsets[node + 1]:
+                    work[-1] = (node, position + 1)
+                    end = ends[links[position]]
+                    if not in_core[end]:
+                        continue
+                    if end not in order:
+                        order[end] = lowest[end] = len(order)
+                        stack.append(end)
+                        on_stack.add(end)
+                        work.append((end, offsets[end]))
+                    elif end in on_stack and order[end] < lowest[node]:
+                        lowest[node] = order[end]
+                else:
+                    work.pop()
+                    if work and lowest[node] < lowest[work[-1][0]]:
+                        lowest[work[-1][0]] = lowest[node]
+                    if lowest[node] == order[node]:
+                        component = []
+                        while True:
+                            member = stack.pop()
+                            on_stack.discard(member)
+                            component.append(member)
+                            if member == node:
+                                break
+                        if len(component) > 1 or node in self_loops:
+                            cycles.append([self.node_names[i] for i in sorted(component)])
+        cycles.sort(key=len, reverse=True)
+        return cycles
+
+    def check(self):
+        # the topology problems of the network by kind, empty lists when there are none. components are
+        # listed when there's more than one
+        components = self.components()
+        report = OrderedDict()
+        report['orphan_nodes'] = self.orphan_nodes()
+        report['missing_nodes'] = self.missing_nodes()
+        report['components'] = components if len(components) > 1 else []
+        report['nodes_without_outfall'] = self.nodes_without_outfall()
+        report['cycles'] = self.cycles()
+        return report
+
+def get_element_classes(inp_path=None, long_line_comment=False, require_support_files=False,
+                        columnar_timeseries=False, compact_elements=False):
+    return ElementClasses(inp_path, long_line_comment, require_support_files, columnar_timeseries, compact_elements)
 
 class INP(object):
     def __init__(self, inp_path=None, new=False, require_support_files=False, long_line_comment=False, 
-            recognize_subclasses=False, recognize_composite_classes=False):
+            recognize_subclasses=False, recognize_composite_classes=False, lazy=False, sections=None,
+            exclude_sections=None, index=False, cache_dir=None, cache_size=1 << 30, columnar_timeseries=False,
+            store_support_files=False, support_file_dir=None, compact_elements=False):
 
         self.inp_path = inp_path
         if inp_path:
@@ -3480,36 +5505,93 @@ class INP(object):
         self.new = new
         self.long_line_comment = long_line_comment
         self.require_support_files = require_support_files
+        self.lazy = lazy
 
-        inp_path_exists = os.path.isfile(self.inp_path)
+        inp_path_exists = self.inp_path is not None and os.path.isfile(self.inp_path)
         if not new and not inp_path_exists:
             raise Exception("No such INP file: " + self.inp_path)
 
         self.element_classes = get_element_classes(inp_path=inp_path,
                                                    long_line_comment=long_line_comment, 
-                                                   require_support_files=require_support_files)
+                                                   require_support_files=require_support_files,
+                                                   columnar_timeseries=columnar_timeseries,
+                                                   compact_elements=compact_elements)
+        self.sections = None
+        if sections is not None or exclude_sections is not None:
+            self.sections = self.element_classes.select_sections(sections, exclude_sections, recognize_subclasses)
+
+        self.section_index = None
+        self._network = None
         if not self.new:
-            current_label = None
-            current_label_lineno = 0
-            label_pattern = re.compile('^[\s]*\[')
-            current_lineno = 0
-            with open(self.inp_path, 'r') as f:
-                for current_lineno, line in enumerate(f.readlines()):
-                    if re.match(label_pattern, line):
-                        if current_label:
-                            # note, line numbers are +1 because linecache.getline counts from 1
-                            self.element_classes.initialize_class(current_label, current_label_lineno+1, current_lineno+1)
-                        current_label_lineno = current_lineno
-                        current_label = line
-
-            if current_label:
-                self.element_classes.initialize_class(current_label, current_label_lineno+1, current_lineno + 2)
-
-            if recognize_subclasses:
-                self.element_classes.merge_subclasses()
-
-            if recognize_composite_classes:
-                self.element_classes.merge_composite_classes()
+            # parsed objects are cached by content, the options they were parsed with and the support
+            # files they reference. lazy loads are never cached since nothing is parsed up front
+            cache_key = None
+            cache_entry = None
+            if cache_dir is not None and not lazy:
+                if index:
+                    self.section_index = get_inp_index(self.inp_path)
+                    inp_md5 = self.section_index['md5']
+                else:
+                    inp_md5 = get_file_md5(self.inp_path)
+                options = (long_line_comment, require_support_files, recognize_subclasses, recognize_composite_classes,
+                           sorted(self.sections) if self.sections is not None else None, columnar_timeseries,
+                           compact_elements)
+                cache_key = get_cache_key(inp_md5, self.inp_path, options)
+                cache_entry = load_cache_entry(cache_dir, cache_key)
+
+            if cache_entry is not None:
+                self.element_classes.set_state(cache_entry['state'])
+            else:
+                # merging adds keys to the elements, they're made into records once it's done so that the
+                # records have their keys in the order the dicts do
+                compact_after_merging = compact_elements and (recognize_subclasses or recognize_composite_classes)
+                if compact_after_merging:
+                    self.element_classes.compact_elements = False
+
+                if lazy or self.sections is not None or index:
+                    # only section boundaries are recorded here, unselected sections are never read and
+                    # lazy sections are parsed when first needed
+                    if index:
+                        if self.section_index is None:
+                            self.section_index = get_inp_index(self.inp_path)
+                        boundaries = self.section_index['sections']
+                    else:
+                        boundaries = scan_inp_sections(self.inp_path)
+
+                    for label, start_lineno, end_lineno, start_offset, end_offset in boundaries:
+                        if self.sections is not None and self.element_classes.get_class(label).__name__ not in self.sections:
+                            continue
+                        read_lines = functools.partial(read_inp_section, self.inp_path, start_offset, end_offset)
+                        if lazy:
+                            self.element_classes.initialize_class(label, start_lineno, end_lineno, read_lines=read_lines)
+                        else:
+                            self.element_classes.initialize_class(label, start_lineno, end_lineno, read_lines())
+                else:
+                    for label, start_lineno, lines in read_inp_sections(self.inp_path):
+                        self.element_classes.initialize_class(label, start_lineno, start_lineno + len(lines), lines)
+
+                if recognize_subclasses:
+                    self.element_classes.merge_subclasses()
+
+                if recognize_composite_classes:
+                    self.element_classes.merge_composite_classes()
+
+                if compact_after_merging:
+                    self.element_classes.compact()
+
+                if cache_key is not None:
+                    cache_entry = {'files' : self.element_classes.get_files(), 
+                                   'state' : self.element_classes.get_state()}
+                    save_cache_entry(cache_dir, cache_key, cache_entry, cache_size)
+
+        # support files are stored by md5, see SupportFileStore. sections that reference files are loaded
+        self.support_files = None
+        if store_support_files:
+            if not require_support_files:
+                raise Exception("Storing support files requires require_support_files.")
+            self.support_files = SupportFileStore(support_file_dir)
+            for path, md5 in self.get_files().items():
+                self.support_files.add(path, md5)
         
     def set_path(self, path):
         if self.new:
@@ -3524,21 +5606,48 @@ class INP(object):
 
     def get_files(self):
         return self.element_classes.get_files()
+
+    def get_stored_files(self):
+        # stored copies of the support files by their original paths
+        if self.support_files is None:
+            raise Exception("Support files aren't stored, see store_support_files.")
+        return dict((path, self.support_files.get_path(md5)) for path, md5 in self.get_files().items())
+
+    def close(self):
+        if self.support_files is not None:
+            self.support_files.close()
     
     def get_inp_text(self, exclude_descs=False, eol_descs=False):
         return self.element_classes.get_inp_text(exclude_descs=exclude_descs, eol_descs=eol_descs)
 
+    def write_inp_text(self, f, exclude_descs=False, eol_descs=False):
+        self.element_classes.write_inp_text(f, exclude_descs=exclude_descs, eol_descs=eol_descs)
+
     def write_inp(self, exclude_descs=False, eol_descs=False):
         if self.new:
             self.element_classes.write_inp(exclude_descs=exclude_descs, eol_descs=eol_descs)
 
-    def as_xml(self):
-        xml = '<?xml version="1.0"?>\n<INP>\n'
+    def iter_xml(self):
+        yield '<?xml version="1.0"?>\n<INP>\n'
         for obj in self.element_classes.get_all_objects().values():
-            xml += obj.as_xml()
-        xml += '</INP>'
+            for xml in obj.iter_xml():
+                yield xml
+        yield '</INP>'
+
+    def write_xml(self, f):
+        f.writelines(self.iter_xml())
+
+    @classmethod
+    def from_xml(cls, xml, inp_path=None):
+        # rebuilds a model from the output of as_xml, read from a path or file object. sections that were
+        # exported with their subclasses merged in are merged again
+        inp = cls(inp_path, new=True)
+        if inp.element_classes.read_xml(xml):
+            inp.merge_subclasses()
+        return inp
 
-        return xml
+    def as_xml(self):
+        return ''.join(self.iter_xml())
 
     def add_elements(self, name, elements, recognize_subclasses=False):
         self.element_classes.add_elements(name, elements, recognize_subclasses=recognize_subclasses)
@@ -3546,9 +5655,43 @@ class INP(object):
     def get_elements(self, name):
         return self.element_classes.get_elements(name)
 
+    def get_element(self, name, element_name, refresh=False):
+        return self.element_classes.get_element(name, element_name, refresh)
+
+    def has(self, name, element_name, refresh=False):
+        return self.element_classes.has(name, element_name, refresh)
+
+    def get_series(self, name):
+        # the points of a time series as TimeSeriesColumns, its dates and times are datetime64 in datetimes
+        return self.element_classes.get_series(name)
+
+    def find(self, element_name, refresh=False):
+        return self.element_classes.find(element_name, refresh)
+
+    def references_to(self, element_name, element_type=None):
+        return self.element_classes.references_to(element_name, element_type)
+
+    def rename(self, element_type, names, refresh=False):
+        self.element_classes.rename(element_type, names, refresh)
+        self._network = None
+
+    def delete(self, element_type, element_names, refresh=False):
+        return self.element_classes.delete(element_type, element_names, refresh)
+
+    def validate(self):
+        return self.element_classes.validate()
+
     def get_object_names(self):
         return self.element_classes.get_object_names()
 
+    def network(self, rebuild=False):
+        # the graph of the node and link sections. it is built again when one of them was added, replaced,
+        # grown or shrunk since; edits to the ends of existing links need rebuild
+        objects = self.element_classes.get_all_objects()
+        if rebuild or self._network is None or not self._network.is_current(objects):
+            self._network = Network(objects)
+        return self._network
+
     def merge_subclasses(self):
         self.element_classes.merge_subclasses()
 